@@ -4,7 +4,8 @@ import pandas as pd
 import plotly.express as px
 import numpy as np
 
-from constants import BASE_YEAR_HOURLY_INDEX
+import profile_store
+from constants import BASE_YEAR_HOURLY_INDEX, PROFILES_PATH, BASE_DEMAND_PROFILE_NAME
 
 # Read in profiles and reformat ready to wrangle into a year of data
 # https://www.elexon.co.uk/operations-settlement/profiling/
@@ -65,4 +66,7 @@ assert (hourly_kwh_series_normalized.sum() == 1.0)
 fig = px.line(hourly_kwh_series_normalized)
 fig.show()
 
-pd.to_pickle(hourly_kwh_series_normalized, "../data/normalized_hourly_base_electricity_demand_profile_2013.pkl")
+profile_store.save_profile(directory=PROFILES_PATH, name=BASE_DEMAND_PROFILE_NAME,
+                           values=hourly_kwh_series_normalized.to_numpy(),
+                           start=str(hourly_kwh_series_normalized.index[0]),
+                           series_name=hourly_kwh_series_normalized.name)
@@ -0,0 +1,43 @@
+import pandas as pd
+import plotly.express as px
+import requests
+
+import profile_store
+from constants import BASE_YEAR_HOURLY_INDEX, ELEC_HOURLY_TCO2_PER_KWH_FILE
+
+# Half hourly national carbon intensity of GB grid electricity, in gCO2/kWh
+# https://carbon-intensity.github.io/api-definitions/
+# The API only goes back to 2018, so a recent year is mapped onto the 2013 calendar used for everything else
+CARBON_INTENSITY_API = 'https://api.carbonintensity.org.uk/intensity'
+SOURCE_YEAR = 2022
+
+half_hourly = []
+# The API returns at most 14 days per request
+for start in pd.date_range(f"{SOURCE_YEAR}-01-01", f"{SOURCE_YEAR}-12-31", freq='14D', tz='UTC'):
+    end = min(start + pd.Timedelta(days=14), pd.Timestamp(f"{SOURCE_YEAR + 1}-01-01", tz='UTC'))
+    response = requests.get(f"{CARBON_INTENSITY_API}/{start:%Y-%m-%dT%H:%MZ}/{end:%Y-%m-%dT%H:%MZ}", timeout=60)
+    response.raise_for_status()
+    for period in response.json()['data']:
+        # actual isn't always filled in, the forecast is close enough when it isn't
+        intensity = period['intensity']['actual'] or period['intensity']['forecast']
+        half_hourly.append((pd.Timestamp(period['from']), intensity))
+
+series_half_hourly = pd.Series(dict(half_hourly)).sort_index()
+series_half_hourly = series_half_hourly[series_half_hourly.index.year == SOURCE_YEAR]
+series_hourly = series_half_hourly.resample('1H').mean().interpolate()
+assert series_hourly.notna().all()
+
+# Match up on position in the year so the 2013 profiles (which start on a Tuesday) line up with the grid
+# week by week and not just day by day
+series_hourly = series_hourly.iloc[:len(BASE_YEAR_HOURLY_INDEX)]
+hourly_tco2_per_kwh = pd.Series(series_hourly.to_numpy() / 10 ** 6, index=BASE_YEAR_HOURLY_INDEX,
+                                name='tco2_per_kwh')
+print(f"Average intensity: {hourly_tco2_per_kwh.mean() * 10 ** 6:.0f} gCO2/kWh")
+
+fig = px.line(hourly_tco2_per_kwh)
+fig.show()
+
+profile_store.save_profile(directory=ELEC_HOURLY_TCO2_PER_KWH_FILE.parent, name=ELEC_HOURLY_TCO2_PER_KWH_FILE.stem,
+                           values=hourly_tco2_per_kwh.to_numpy(),
+                           start=str(hourly_tco2_per_kwh.index[0]),
+                           series_name=hourly_tco2_per_kwh.name)
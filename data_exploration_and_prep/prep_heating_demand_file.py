@@ -1,6 +1,9 @@
 import pandas as pd
 import numpy as np
 
+import profile_store
+from constants import PROFILES_PATH, HEAT_DEMAND_PROFILE_NAME
+
 HEATING_PROFILES_CSV = '../data_exploration_and_prep/Half-hourly_profiles_of_heating_technologies.csv'
 COLS_TO_KEEP = ['Normalised_ASHP_heat', 'Normalised_Resistance_heater_heat', 'Normalised_Gas_boiler_heat']
 
@@ -14,4 +17,5 @@ assert len(df_hourly) == 8760
 df_hourly = df_hourly/df_hourly.sum()  # normalize so demand profile sums to 1
 assert (df_hourly.sum().sum() == 3.0)
 
-pd.to_pickle(df_hourly, "../data/hourly_heating_demand_profiles_2013.pkl")
\ No newline at end of file
+profile_store.save_profile(directory=PROFILES_PATH, name=HEAT_DEMAND_PROFILE_NAME, values=df_hourly.to_numpy(),
+                           start=str(df_hourly.index[0]), columns=df_hourly.columns.tolist())
\ No newline at end of file
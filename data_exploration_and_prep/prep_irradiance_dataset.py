@@ -0,0 +1,58 @@
+""" Build the gridded irradiance dataset used by the local PV model (src/pv_model.py) from PVGIS hourly radiation.
+
+Slow: makes one API call per grid cell, at the PVGIS rate limit. Only needs running again to change the grid or year"""
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+import profile_store
+from constants import SolarConstants
+
+YEAR = 2013  # same as SolarConstants.API_YEAR
+GRID_STEP_DEGREES = 0.25
+LATITUDES = np.arange(49.75, 61.0, GRID_STEP_DEGREES)  # UK
+LONGITUDES = np.arange(-8.25, 2.0, GRID_STEP_DEGREES)
+API_URL = 'https://re.jrc.ec.europa.eu/api/v5_2/seriescalc'
+
+
+def get_horizontal_radiation(latitude: float, longitude: float) -> pd.DataFrame:
+    params = {'lat': latitude, 'lon': longitude, 'startyear': YEAR, 'endyear': YEAR,
+              'angle': 0, 'components': 1, 'outputformat': 'json'}
+    response = requests.get(API_URL, params=params)
+    response.raise_for_status()
+    df = pd.DataFrame(response.json()['outputs']['hourly'])
+    assert len(df) == 8760
+    return df
+
+
+def main():
+    shape = (len(LATITUDES), len(LONGITUDES), 8760)
+    ghi, dni, dhi, temp_air = np.zeros(shape), np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    for i, latitude in enumerate(LATITUDES):
+        for j, longitude in enumerate(LONGITUDES):
+            try:
+                df = get_horizontal_radiation(latitude=latitude, longitude=longitude)
+            except requests.HTTPError:
+                print(f"No data for {latitude}, {longitude} - probably sea")
+                continue
+            sun_height = np.radians(df['H_sun'].to_numpy())
+            # On a horizontal plane the beam component is DNI * sin(sun height)
+            beam_horizontal = df['Gb(i)'].to_numpy()
+            dni[i, j] = np.where(sun_height > np.radians(1), beam_horizontal / np.sin(sun_height), 0)
+            dhi[i, j] = df['Gd(i)'].to_numpy()
+            ghi[i, j] = beam_horizontal + dhi[i, j]
+            temp_air[i, j] = df['T2m'].to_numpy()
+            time.sleep(1 / 25)  # stay under the 30 calls per second limit
+
+    # Uncompressed .npy so the app can memory map it. Hours last, so each cell's year is contiguous on disk
+    start = f'{YEAR}-01-01 00:00'
+    arrays = dict(latitudes=LATITUDES, longitudes=LONGITUDES, ghi=ghi, dni=dni, dhi=dhi, temp_air=temp_air)
+    for name, values in arrays.items():
+        profile_store.save_profile(directory=SolarConstants.IRRADIANCE_DATASET_DIRECTORY, name=name, values=values,
+                                   start=start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import pandas as pd
+import numpy as np
+
+import profile_store
+from constants import BASE_YEAR_HOURLY_INDEX, PROFILES_PATH, OUTDOOR_TEMPERATURE_PROFILE_NAME
+
+# UK daily average outside air temperature for 2013, the year the heating demand profiles are based on. From the same
+# UKERC dataset: https://data.ukedc.rl.ac.uk/browse/edc/efficiency/residential/Buildings/heat_demand_by_local_area/
+HEATING_PROFILES_XLSX = '../data_exploration_and_prep/Half-hourly_profiles_of_heating_technologies.xlsx'
+TEMPERATURE_COLUMN = 'UK_daily_average_OAT_[degrees_C]'
+
+df_half_hourly = pd.read_excel(io=HEATING_PROFILES_XLSX, sheet_name='Half-hourly_profiles_of_heating', header=2,
+                               index_col='index', usecols=['index', TEMPERATURE_COLUMN])
+df_half_hourly.index = pd.to_datetime(df_half_hourly.index)
+# Daily values, so every hour of a day gets that day's average
+series_hourly = df_half_hourly[TEMPERATURE_COLUMN].resample('1H').mean()
+assert (series_hourly.index == BASE_YEAR_HOURLY_INDEX).all()
+assert series_hourly.notna().all()
+np.testing.assert_almost_equal(series_hourly.mean(), df_half_hourly[TEMPERATURE_COLUMN].mean())
+
+series_hourly.name = 'outdoor_air_temperature_c'
+profile_store.save_profile(directory=PROFILES_PATH, name=OUTDOOR_TEMPERATURE_PROFILE_NAME,
+                           values=series_hourly.to_numpy(), start=str(series_hourly.index[0]),
+                           series_name=series_hourly.name)
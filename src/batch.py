@@ -0,0 +1,287 @@
+""" Evaluate solar and heat pump retrofits for a whole portfolio of homes from the command line.
+
+Reads homes from a CSV or JSONL file, one per row, and writes one row of results per home in the same order. Homes
+are evaluated across a pool of worker processes. Only a bounded window of homes is in flight at once and results
+are written as soon as they are ready, so memory use doesn't grow with the size of the portfolio.
+
+Optionally also adds up the hourly imports, exports and heating fuel use of every home in each scenario, for the
+portfolio peak and load duration curves. Each chunk of homes is summed in its worker and only the totals are sent back.
+
+Example:
+    python batch.py homes.csv --output results.csv --workers 8 --aggregate portfolio_results/
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, fields
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import constants
+import pv_cache
+import pvgis
+import retrofit
+import scenarios
+from building_model import BuildingEnvelope, HeatingSystem, House, Tariff
+from constants import SolarConstants
+from portfolio import PortfolioAggregator
+from solar import Solar
+
+SCENARIO_NAMES = {'current': "Current", 'solar': "Solar panels", 'heat_pump': "Heat pump", 'both': "Both"}
+
+
+@dataclass
+class HomeSpec:
+    """ One row of the input file. Anything left blank takes the same default as the app"""
+    id: str
+    latitude: float
+    longitude: float
+    house_type: str = 'Terrace'
+    heating_system: str = 'Gas boiler'
+    upgrade_heating_system: str = 'Heat pump'
+    annual_base_electricity_demand_kwh: Optional[float] = None
+    annual_heat_demand_kwh: Optional[float] = None
+    number_of_panels: int = 0
+    orientation: str = 'South'
+    pitch: float = SolarConstants.ROOF_PITCH_DEGREES
+    p_per_kwh_elec_import: Optional[float] = None
+    p_per_kwh_elec_export: Optional[float] = None
+    p_per_day_elec: Optional[float] = None
+    p_per_unit_heating_fuel_import: Optional[float] = None
+    p_per_day_heating_fuel: Optional[float] = None
+
+    @classmethod
+    def from_dict(cls, row: Dict[str, Any]) -> 'HomeSpec':
+        """ Values from CSV files are all strings, so convert them to the type of each field. Unknown columns are
+        ignored"""
+        values = {}
+        for field in fields(cls):
+            value = row.get(field.name)
+            if value is None or value == '':
+                continue
+            if field.type in ('float', 'Optional[float]', float, Optional[float]):
+                value = float(value)
+            elif field.type in ('int', int):
+                value = int(float(value))
+            else:
+                value = str(value)
+            values[field.name] = value
+        return cls(**values)
+
+
+def set_up_house(home: HomeSpec) -> House:
+    building_type_constants = constants.BUILDING_TYPE_OPTIONS[home.house_type]
+    envelope = BuildingEnvelope.from_building_type_constants(building_type_constants)
+    if home.annual_heat_demand_kwh is not None:
+        envelope.annual_heating_demand = home.annual_heat_demand_kwh
+    if home.annual_base_electricity_demand_kwh is not None:
+        envelope.base_demand = (home.annual_base_electricity_demand_kwh
+                                * building_type_constants.normalized_base_electricity_demand_profile_kWh)
+
+    house = House.set_up_from_heating_name(envelope=envelope, heating_name=home.heating_system)
+    set_up_tariffs(tariffs=house.tariffs, home=home)
+    return house
+
+
+def set_up_tariffs(tariffs: Dict[str, Tariff], home: HomeSpec):
+    elec_tariff = tariffs['electricity']
+    if home.p_per_kwh_elec_import is not None:
+        elec_tariff.p_per_unit_import = home.p_per_kwh_elec_import
+    if home.p_per_kwh_elec_export is not None:
+        elec_tariff.p_per_unit_export = home.p_per_kwh_elec_export
+    if home.p_per_day_elec is not None:
+        elec_tariff.p_per_day = home.p_per_day_elec
+
+    heating_fuel = constants.DEFAULT_HEATING_CONSTANTS[home.heating_system].fuel
+    if heating_fuel.name in tariffs:
+        heating_tariff = tariffs[heating_fuel.name]
+        if home.p_per_unit_heating_fuel_import is not None:
+            heating_tariff.p_per_unit_import = home.p_per_unit_heating_fuel_import
+        if home.p_per_day_heating_fuel is not None:
+            heating_tariff.p_per_day = home.p_per_day_heating_fuel
+
+
+def evaluate_home(home: HomeSpec, aggregator: Optional[PortfolioAggregator] = None) -> Dict[str, Any]:
+    """ Results for the current house and each of the upgrade options, as one flat row. If an aggregator is passed,
+    the hourly profiles of each option are added to its totals"""
+    house = set_up_house(home)
+    solar_install = Solar.from_location(latitude=home.latitude, longitude=home.longitude,
+                                        orientation=SolarConstants.ORIENTATIONS[home.orientation],
+                                        number_of_panels=home.number_of_panels, pitch=home.pitch)
+    upgrade_heating = HeatingSystem.from_constants(
+        name=home.upgrade_heating_system, parameters=constants.DEFAULT_HEATING_CONSTANTS[home.upgrade_heating_system])
+    solar_house, hp_house, both_house = retrofit.upgrade_buildings(baseline_house=house, solar_install=solar_install,
+                                                                   upgrade_heating=upgrade_heating)
+    houses = {'current': house, 'solar': solar_house, 'heat_pump': hp_house, 'both': both_house}
+    houses = {SCENARIO_NAMES[key]: house for key, house in houses.items()}
+    results = scenarios.evaluate_scenarios(houses)
+    if aggregator is not None:
+        aggregator.add_houses(houses)
+
+    row = {'id': home.id, 'error': ''}
+    for key, name in SCENARIO_NAMES.items():
+        result = results[name]
+        row[f'{key}_annual_bill'] = round(result.total_annual_bill, 2)
+        row[f'{key}_annual_tco2'] = round(result.total_annual_tco2, 3)
+        row[f'{key}_electricity_imported_kwh'] = round(result.electricity_imported_kwh, 1)
+        row[f'{key}_electricity_exported_kwh'] = round(result.electricity_exported_kwh, 1)
+        row[f'{key}_upfront_cost'] = result.upfront_cost_after_grants
+    upgrades = dict(zip(['solar', 'heat_pump', 'both'], retrofit.generate_all_retrofit_cases(
+        *[results[SCENARIO_NAMES[key]] for key in ['current', 'solar', 'heat_pump', 'both']])))
+    finances = retrofit.calculate_lifetime_finances(list(upgrades.values()))
+    for i, (key, upgrade) in enumerate(upgrades.items()):
+        row[f'{key}_bill_savings'] = round(upgrade.bill_savings_absolute, 2)
+        row[f'{key}_carbon_savings_tco2'] = round(upgrade.carbon_savings_absolute, 3)
+        row[f'{key}_simple_payback_years'] = round(upgrade.simple_payback, 1)
+        row[f'{key}_npv'] = round(float(finances.npv[i]), 2)
+        row[f'{key}_irr'] = round(float(finances.irr[i]), 4)
+        row[f'{key}_discounted_payback_years'] = round(float(finances.discounted_payback[i]), 1)
+    return row
+
+
+def evaluate_home_row(row: Dict[str, Any], aggregator: Optional[PortfolioAggregator] = None) -> Dict[str, Any]:
+    """ Never raises, so one bad row doesn't stop the batch: the error goes in the output instead"""
+    try:
+        return evaluate_home(HomeSpec.from_dict(row), aggregator=aggregator)
+    except Exception as error:
+        return {'id': row.get('id', ''), 'error': f"{type(error).__name__}: {error}"}
+
+
+def evaluate_home_rows(rows: List[Dict[str, Any]], aggregate: bool = False
+                       ) -> Tuple[List[Dict[str, Any]], Optional[PortfolioAggregator]]:
+    """ Evaluate a chunk of homes, with the totals of their hourly profiles if aggregate"""
+    aggregator = PortfolioAggregator() if aggregate else None
+    return [evaluate_home_row(row, aggregator=aggregator) for row in rows], aggregator
+
+
+def output_columns() -> list[str]:
+    columns = ['id', 'error']
+    for key in SCENARIO_NAMES:
+        columns += [f'{key}_annual_bill', f'{key}_annual_tco2', f'{key}_electricity_imported_kwh',
+                    f'{key}_electricity_exported_kwh', f'{key}_upfront_cost']
+    for key in ['solar', 'heat_pump', 'both']:
+        columns += [f'{key}_bill_savings', f'{key}_carbon_savings_tco2', f'{key}_simple_payback_years',
+                    f'{key}_npv', f'{key}_irr', f'{key}_discounted_payback_years']
+    return columns
+
+
+def initialize_worker(number_of_workers: int):
+    """ Runs once in each worker process"""
+    # Map the demand profiles now; the pages are shared with every other process on the host
+    constants.load_normalized_hourly_base_demand()
+    constants.load_normalized_hourly_heat_demand_df()
+    # SQLite connections can't be shared across a fork, and the PVGIS rate limit is shared between the workers
+    pv_cache.set_default_cache(pv_cache.PVProfileCache(
+        path=os.environ.get("PV_PROFILE_CACHE_PATH", SolarConstants.PV_CACHE_DEFAULT_PATH)))
+    pvgis.set_default_client(pvgis.PVGISClient(
+        base_url=os.environ.get("PVGIS_BASE_URL", SolarConstants.PVGIS_BASE_URL),
+        max_calls_per_second=SolarConstants.PVGIS_MAX_CALLS_PER_SECOND / number_of_workers))
+
+
+def evaluate_homes(rows: Iterable[Dict[str, Any]], executor: Executor, window: int, chunk_size: int = 1,
+                   aggregator: Optional[PortfolioAggregator] = None) -> Iterator[Dict[str, Any]]:
+    """ Yields results in the same order as rows, with at most window chunks submitted but not yet yielded. If an
+    aggregator is passed, the totals from each chunk are merged into it as the chunk's results are yielded"""
+    in_flight = deque()
+
+    def finish_oldest_chunk() -> List[Dict[str, Any]]:
+        results, chunk_aggregator = in_flight.popleft().result()
+        if aggregator is not None:
+            aggregator.merge(chunk_aggregator)
+        return results
+
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        in_flight.append(executor.submit(evaluate_home_rows, chunk, aggregator is not None))
+        if len(in_flight) >= window:
+            yield from finish_oldest_chunk()
+    while in_flight:
+        yield from finish_oldest_chunk()
+
+
+def read_homes(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path, newline='') as file:
+        if path.suffix == '.jsonl':
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(file)
+
+
+def write_results(results: Iterable[Dict[str, Any]], file, output_format: str) -> int:
+    """ Write each result as soon as it arrives. Returns number of rows written"""
+    number_written = 0
+    if output_format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=output_columns())
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+            number_written += 1
+    else:
+        for result in results:
+            file.write(json.dumps(result) + '\n')
+            number_written += 1
+    return number_written
+
+
+def write_portfolio_results(aggregator: PortfolioAggregator, directory: Path):
+    """ Summary per scenario, hourly totals and load duration curves"""
+    directory.mkdir(parents=True, exist_ok=True)
+    summaries = []
+    for scenario in aggregator.scenarios:
+        summary = aggregator.summary(scenario)
+        summaries.append(dict(vars(summary), diversity_factor=summary.diversity_factor))
+    (directory / 'summary.json').write_text(json.dumps(summaries, indent=2))
+    aggregator.hourly_totals_df().to_csv(directory / 'hourly_totals.csv')
+    aggregator.load_duration_curves_df().to_csv(directory / 'load_duration_curves_import.csv')
+    aggregator.load_duration_curves_df(net=True).to_csv(directory / 'load_duration_curves_net.csv')
+
+
+def run(input_path: Path, output_path: Optional[Path], workers: int, window: int, chunk_size: int = 1,
+        aggregate_path: Optional[Path] = None) -> int:
+    output_format = 'jsonl' if output_path is not None and output_path.suffix == '.jsonl' else 'csv'
+    aggregator = PortfolioAggregator() if aggregate_path is not None else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker, initargs=(workers,)) as executor:
+        results = evaluate_homes(rows=read_homes(input_path), executor=executor, window=window,
+                                 chunk_size=chunk_size, aggregator=aggregator)
+        if output_path is None:
+            number_written = write_results(results=results, file=sys.stdout, output_format=output_format)
+        else:
+            with open(output_path, 'w', newline='') as file:
+                number_written = write_results(results=results, file=file, output_format=output_format)
+    if aggregator is not None:
+        write_portfolio_results(aggregator=aggregator, directory=aggregate_path)
+    return number_written
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', type=Path, help="CSV or JSONL file of homes, with columns named as in HomeSpec")
+    parser.add_argument('--output', '-o', type=Path, default=None,
+                        help="CSV or JSONL file to write results to. Writes CSV to stdout if not given")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--window', type=int, default=None,
+                        help="Max chunks of homes in flight at once. Defaults to 4 per worker")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="Homes per task sent to a worker. Defaults to 1, or 50 when aggregating")
+    parser.add_argument('--aggregate', type=Path, default=None,
+                        help="Directory to write portfolio peak, hourly totals and load duration curves to")
+    args = parser.parse_args(argv)
+    window = args.window if args.window is not None else 4 * args.workers
+    chunk_size = args.chunk_size
+    if chunk_size is None:
+        chunk_size = 50 if args.aggregate is not None else 1  # fewer sets of hourly totals to send back
+    number_written = run(input_path=args.input, output_path=args.output, workers=args.workers, window=window,
+                         chunk_size=chunk_size, aggregate_path=args.aggregate)
+    print(f"Evaluated {number_written} homes", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
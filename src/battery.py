@@ -0,0 +1,157 @@
+""" Home battery dispatch against an hourly net electricity profile (imports positive, exports negative).
+
+The battery charges from surplus solar and discharges to cover imports. Given time of use prices, it also charges
+from the grid in the cheapest hours of each day, and holds its charge through them.
+
+The state of charge is a sequential recurrence, but within a run of charging hours it can only hit full, and within a
+run of discharging hours it can only hit empty. So it only needs stepping through run by run (a couple of runs a day),
+with numpy doing the hours within each run. Which hours charge and which discharge doesn't depend on the size of the
+battery, so many battery sizes are simulated together by stepping through the same runs"""
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+import time_of_use
+from constants import BatteryConstants
+from dependencies import TrackedComponent
+
+
+@dataclass
+class DispatchResult:
+    """ Hourly flows after dispatch. Arrays are (hours,) for one battery or (batteries, hours) for several"""
+    net_kwh: np.ndarray  # electricity imported (positive) or exported (negative) once the battery has been used
+    state_of_charge_kwh: np.ndarray  # at the end of each hour
+    charge_kwh: np.ndarray  # drawn from solar or the grid to charge the battery
+    discharge_kwh: np.ndarray  # delivered by the battery
+
+    @property
+    def imported_kwh(self) -> np.ndarray:
+        return np.where(self.net_kwh > 0, self.net_kwh, 0.0).sum(axis=-1)
+
+    @property
+    def exported_kwh(self) -> np.ndarray:
+        return np.where(self.net_kwh < 0, -self.net_kwh, 0.0).sum(axis=-1)
+
+    def __getitem__(self, i: int) -> 'DispatchResult':
+        """ Result for one battery out of a batch"""
+        return DispatchResult(net_kwh=self.net_kwh[i], state_of_charge_kwh=self.state_of_charge_kwh[i],
+                              charge_kwh=self.charge_kwh[i], discharge_kwh=self.discharge_kwh[i])
+
+
+@dataclass
+class Battery(TrackedComponent):
+    capacity_kwh: float = BatteryConstants.CAPACITY_KWH
+    power_kw: float = BatteryConstants.POWER_KW  # max charge or discharge rate
+    round_trip_efficiency: float = BatteryConstants.ROUND_TRIP_EFFICIENCY
+    # Import prices to charge from the grid against, e.g. tariff.hourly_p_per_unit_import. Only solar if not set
+    hourly_p_per_unit_import: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.lifetime = BatteryConstants.LIFETIME
+
+    def __setattr__(self, name: str, value):
+        if name == 'hourly_p_per_unit_import' and value is not None:
+            value = time_of_use.freeze_prices(value)
+        super().__setattr__(name, value)
+
+    @property
+    def upfront_cost(self) -> int:
+        return int(round(self.capacity_kwh * BatteryConstants.COST_PER_KWH, -2))
+
+    @property
+    def grid_charge_hours(self) -> Optional[np.ndarray]:
+        if self.hourly_p_per_unit_import is None:
+            return None
+        if self.__dict__.get('_grid_charge_hours_prices') is not self.hourly_p_per_unit_import:
+            self._grid_charge_hours = make_grid_charge_hours(hourly_p_per_unit_import=self.hourly_p_per_unit_import,
+                                                             round_trip_efficiency=self.round_trip_efficiency)
+            self._grid_charge_hours_prices = self.hourly_p_per_unit_import
+        return self._grid_charge_hours
+
+    def dispatch(self, net_kwh: np.ndarray) -> DispatchResult:
+        return dispatch_batteries(net_kwh=net_kwh, capacity_kwh=self.capacity_kwh, power_kw=self.power_kw,
+                                  round_trip_efficiency=self.round_trip_efficiency,
+                                  grid_charge_hours=self.grid_charge_hours)[0]
+
+
+def make_grid_charge_hours(hourly_p_per_unit_import: np.ndarray, round_trip_efficiency: float) -> np.ndarray:
+    """ Hours at the cheapest import price of their day, on days where buying then and using it at the day's highest
+    price saves money after losses"""
+    daily_prices = np.asarray(hourly_p_per_unit_import).reshape(-1, 24)  # calendars always start at midnight
+    daily_min = daily_prices.min(axis=1, keepdims=True)
+    worth_it = daily_min < round_trip_efficiency * daily_prices.max(axis=1, keepdims=True)
+    return ((daily_prices == daily_min) & worth_it).ravel()
+
+
+def dispatch_batteries(net_kwh: np.ndarray, capacity_kwh: float | np.ndarray, power_kw: float | np.ndarray,
+                       round_trip_efficiency: float | np.ndarray = BatteryConstants.ROUND_TRIP_EFFICIENCY,
+                       grid_charge_hours: Optional[np.ndarray] = None,
+                       initial_state_of_charge_kwh: float | np.ndarray = 0.0) -> DispatchResult:
+    """ Dispatch one or more batteries against the same net profile. Battery parameters can be scalars or arrays of
+    one value per battery, e.g. capacity_kwh=np.arange(0, 21), power_kw=3 for every size from 0 to 20kWh.
+
+    Losses are split evenly between charging and discharging"""
+    net_kwh = np.asarray(net_kwh, dtype=np.float64)
+    capacity_kwh, power_kw, round_trip_efficiency, initial_state_of_charge_kwh = (
+        np.atleast_1d(np.asarray(value, dtype=np.float64))[:, np.newaxis]
+        for value in (capacity_kwh, power_kw, round_trip_efficiency, initial_state_of_charge_kwh))
+    number_of_batteries = max(len(capacity_kwh), len(power_kw), len(round_trip_efficiency))
+    charge_efficiency = np.sqrt(round_trip_efficiency)
+    discharge_efficiency = charge_efficiency
+
+    # Change in stored energy each hour if the battery were never full or empty
+    is_charging = net_kwh < 0
+    stored_kwh = np.where(is_charging, charge_efficiency * np.minimum(-net_kwh, power_kw),
+                          -np.minimum(net_kwh, power_kw) / discharge_efficiency)
+    if grid_charge_hours is not None:
+        is_charging = is_charging | grid_charge_hours
+        stored_kwh = np.where(grid_charge_hours, charge_efficiency * power_kw, stored_kwh)
+    stored_kwh = np.broadcast_to(stored_kwh, (number_of_batteries, len(net_kwh)))
+
+    run_starts = np.concatenate([[0], np.flatnonzero(np.diff(is_charging)) + 1])
+    run_lengths = np.diff(np.append(run_starts, len(net_kwh)))
+    cumulative_kwh = np.cumsum(stored_kwh, axis=1)
+    before_run_kwh = np.concatenate([np.zeros((number_of_batteries, 1)), cumulative_kwh[:, run_starts[1:] - 1]], axis=1)
+    run_totals_kwh = np.diff(np.append(before_run_kwh, cumulative_kwh[:, -1:], axis=1), axis=1)
+
+    run_start_kwh = step_through_runs(run_totals_kwh=run_totals_kwh, run_is_charging=is_charging[run_starts],
+                                      capacity_kwh=np.broadcast_to(capacity_kwh, (number_of_batteries, 1))[:, 0],
+                                      initial_kwh=np.broadcast_to(initial_state_of_charge_kwh,
+                                                                  (number_of_batteries, 1))[:, 0])
+    # Within a run only one limit can be hit, so clipping the running total to both limits gives the state of charge
+    within_run_kwh = cumulative_kwh - np.repeat(before_run_kwh, run_lengths, axis=1)
+    state_of_charge_kwh = np.clip(np.repeat(run_start_kwh, run_lengths, axis=1) + within_run_kwh, 0, capacity_kwh)
+
+    change_kwh = np.diff(state_of_charge_kwh, axis=1,
+                         prepend=np.broadcast_to(initial_state_of_charge_kwh, (number_of_batteries, 1)))
+    charge_kwh = np.maximum(change_kwh, 0) / charge_efficiency
+    discharge_kwh = np.maximum(-change_kwh, 0) * discharge_efficiency
+    return DispatchResult(net_kwh=net_kwh + charge_kwh - discharge_kwh, state_of_charge_kwh=state_of_charge_kwh,
+                          charge_kwh=charge_kwh, discharge_kwh=discharge_kwh)
+
+
+def step_through_runs(run_totals_kwh: np.ndarray, run_is_charging: np.ndarray, capacity_kwh: np.ndarray,
+                      initial_kwh: np.ndarray) -> np.ndarray:
+    """ State of charge at the start of each run, (batteries, runs). A charging run ends full or with its total added,
+    a discharging run ends empty or with its total taken off"""
+    if len(capacity_kwh) == 1:  # plain floats are much quicker than numpy for one battery
+        capacity = float(capacity_kwh[0])
+        state = float(initial_kwh[0])
+        starts = []
+        for total, charging in zip(run_totals_kwh[0].tolist(), run_is_charging.tolist()):
+            starts.append(state)
+            state = min(state + total, capacity) if charging else max(state + total, 0.0)
+        return np.array([starts])
+
+    state = initial_kwh.copy()
+    starts = np.empty_like(run_totals_kwh)
+    for i, charging in enumerate(run_is_charging.tolist()):
+        starts[:, i] = state
+        state += run_totals_kwh[:, i]
+        if charging:
+            np.minimum(state, capacity_kwh, out=state)
+        else:
+            np.maximum(state, 0.0, out=state)
+    return starts
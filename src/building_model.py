@@ -1,19 +1,33 @@
-from dataclasses import dataclass
-from functools import cached_property
-from typing import Dict
+import copy
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 
 import constants
-from consumption import Consumption
+import heat_pump_cop
+import time_of_use
+from battery import Battery, DispatchResult
+from consumption import Consumption, ConsumptionStream
+from dependencies import TrackedComponent, depends_on
 from solar import Solar
 from fuels import Fuel
+from hourly_calendar import HourlyCalendar
+
+# Which of the house's components each group of cached quantities is calculated from. Changing a component only
+# recalculates the quantities that depend on it, so e.g. a tariff edit reuses the hourly energy results
+ENERGY_INPUTS = ('envelope', 'heating_system', 'solar_install', 'battery')
+BILL_INPUTS = ENERGY_INPUTS + ('tariffs',)
+
+_UNCHANGED = object()  # for House.with_changes, where None means no battery
 
 
 class House:
     """ Stores info on consumption and bills """
 
-    def __init__(self, envelope: 'BuildingEnvelope', heating_system: 'HeatingSystem', solar_install: 'Solar' = None):
+    def __init__(self, envelope: 'BuildingEnvelope', heating_system: 'HeatingSystem', solar_install: 'Solar' = None,
+                 battery: Optional[Battery] = None):
 
         self.envelope = envelope
         # Set up initial values for heating system and tariffs but allow to be modified by the user later
@@ -23,6 +37,7 @@ class House:
         if solar_install is None:
             solar_install = Solar.create_zero_area_instance()
         self.solar_install = solar_install
+        self.battery = battery  # optional
 
         self.lifetime = (heating_system.lifetime + solar_install.lifetime) / 2  # very rough approach
 
@@ -34,19 +49,62 @@ class House:
                                                       parameters=constants.DEFAULT_HEATING_CONSTANTS[heating_name])
         return cls(envelope=envelope, heating_system=heating_system)
 
-    @property
+    def with_changes(self, envelope: 'BuildingEnvelope' = None, heating_system: 'HeatingSystem' = None,
+                     solar_install: 'Solar' = None, tariffs: Dict[str, 'Tariff'] = None,
+                     battery: Optional[Battery] = _UNCHANGED) -> 'House':
+        """ A variant of this house with some components swapped out. Pass battery=None to remove the battery.
+
+        Components that aren't swapped are copied on write: the variant gets its own copy of each, which shares any
+        cached results that don't depend on the swapped components until either house changes it. A heating system
+        cost overwrite only carries over if the heating system is unchanged."""
+        variant = copy.copy(self)
+        variant.envelope = self.envelope.copy_on_write() if envelope is None else envelope
+        if heating_system is None or heating_system is self.heating_system:
+            variant.heating_system = self.heating_system.copy_on_write()
+        else:
+            variant.heating_system = heating_system
+            variant._heating_system_upfront_cost = None
+        variant.solar_install = self.solar_install.copy_on_write() if solar_install is None else solar_install
+        if tariffs is None:
+            tariffs = {fuel_name: tariff.copy_on_write() for fuel_name, tariff in self.tariffs.items()}
+        variant.tariffs = tariffs
+        if battery is _UNCHANGED:
+            battery = None if self.battery is None else self.battery.copy_on_write()
+        variant.battery = battery
+        variant.lifetime = (variant.heating_system.lifetime + variant.solar_install.lifetime) / 2
+        # Own copy of the cache so results calculated for the variant don't end up on this house
+        variant._dependent_cache = dict(self.__dict__.get('_dependent_cache', {}))
+        return variant
+
+    @depends_on('envelope')
     def base_consumption(self) -> Consumption:
         # Base demand is always electricity (lighting/plug loads etc.)
         return Consumption(hourly_profile_kwh=self.envelope.base_demand, fuel=constants.ELECTRICITY)
 
-    @property
+    @depends_on('envelope', 'solar_install')
     def electricity_consumption_excluding_heating(self) -> Consumption:
+        if self.solar_install.capacity_kwp == 0:  # no need to add on a year of zeros
+            return self.base_consumption
         return self.base_consumption.add(self.solar_install.generation)
 
-    @cached_property
+    @depends_on('envelope', 'heating_system')
     def heating_consumption(self) -> Consumption:
         return self.heating_system.calculate_consumption(self.envelope.annual_heating_demand)
 
+    @property
+    def uses_annual_totals(self) -> bool:
+        """ Without solar or a battery nothing is exported and the hourly shape of demand doesn't change the annual
+        totals. The normalised demand profiles sum to 1, so annual energy (and bills and carbon, unless they vary by
+        hour) come straight from the annual demand without building any hourly profiles"""
+        return self.solar_install.capacity_kwp == 0 and self.battery is None
+
+    @property
+    def fuels(self) -> Dict[str, Fuel]:
+        fuels = {'electricity': constants.ELECTRICITY}
+        if self.heating_system.fuel.name != 'electricity':
+            fuels[self.heating_system.fuel.name] = self.heating_system.fuel
+        return fuels
+
     @property
     def has_multiple_fuels(self) -> bool:
         if self.heating_system.fuel.name == 'electricity':
@@ -55,7 +113,7 @@ class House:
             has_multiple_fuels = True
         return has_multiple_fuels
 
-    @property
+    @depends_on(*ENERGY_INPUTS)
     def consumption_per_fuel(self) -> Dict[str, 'Consumption']:
 
         match self.heating_system.fuel:
@@ -66,18 +124,47 @@ class House:
                 consumption_dict = {'electricity': self.electricity_consumption_excluding_heating,
                                     self.heating_consumption.fuel.name: self.heating_consumption}
 
+        if self.battery_dispatch is not None:
+            stream = ConsumptionStream.from_array(values=self.battery_dispatch.net_kwh,
+                                                  calendar=consumption_dict['electricity'].overall.calendar,
+                                                  fuel=constants.ELECTRICITY)
+            consumption_dict['electricity'] = Consumption.from_stream(overall=stream)
         return consumption_dict
 
-    @cached_property
+    @depends_on(*ENERGY_INPUTS)
+    def battery_dispatch(self) -> Optional[DispatchResult]:
+        """ Battery charging and discharging against the house's net electricity use. None if there's no battery"""
+        if self.battery is None:
+            return None
+        electricity = self.electricity_consumption_excluding_heating.overall
+        if self.heating_system.fuel.name == 'electricity':
+            electricity = electricity.add(self.heating_consumption.overall)
+        return self.battery.dispatch(net_kwh=electricity.values)
+
+    @depends_on(*ENERGY_INPUTS)
     def annual_consumption_per_fuel_kwh(self) -> Dict[str, float]:
-        return {fuel: consumption.overall.annual_sum_kwh
-                for fuel, consumption in self.consumption_per_fuel.items()}
+        return {fuel_name: kwh['imported'] - kwh['exported']
+                for fuel_name, kwh in self.annual_import_and_export_per_fuel_kwh.items()}
+
+    @depends_on(*ENERGY_INPUTS)
+    def annual_import_and_export_per_fuel_kwh(self) -> Dict[str, Dict[str, float]]:
+        if not self.uses_annual_totals:
+            return {fuel_name: {'imported': consumption.imported.annual_sum_kwh,
+                                'exported': consumption.exported.annual_sum_kwh}
+                    for fuel_name, consumption in self.consumption_per_fuel.items()}
+
+        base_kwh = self.envelope.annual_base_demand
+        heating_kwh = self.heating_system.calculate_annual_consumption_kwh(self.envelope.annual_heating_demand)
+        if self.heating_system.fuel.name == 'electricity':
+            return {'electricity': {'imported': base_kwh + heating_kwh, 'exported': 0.0}}
+        return {'electricity': {'imported': base_kwh, 'exported': 0.0},
+                self.heating_system.fuel.name: {'imported': heating_kwh, 'exported': 0.0}}
 
     @property
     def total_annual_consumption_kwh(self) -> float:
         return sum(self.annual_consumption_per_fuel_kwh.values())
 
-    @cached_property
+    @depends_on(*ENERGY_INPUTS)
     def percent_self_use_of_solar(self) -> float:
         if self.solar_install.capacity_kwp > 0:
             elec_consumption_pre_solar = self.base_consumption.overall.annual_sum_kwh
@@ -89,68 +176,82 @@ class House:
             self_use = 0
         return self_use
 
-    @property
+    @depends_on(*BILL_INPUTS)
     def annual_bill_import_and_export_per_fuel(self) -> Dict[str, Dict[str, float]]:
         bills_imported_and_exported = {}
-        for fuel_name, consumption in self.consumption_per_fuel.items():
-            inner_dict = {'imported': self.tariffs[fuel_name].calculate_annual_import_cost(consumption=consumption),
-                          'exported': self.tariffs[fuel_name].calculate_annual_export_cost(consumption=consumption)}
+        for fuel_name, kwh in self.annual_import_and_export_per_fuel_kwh.items():
+            tariff = self.tariffs[fuel_name]
+            if self.uses_annual_totals and not tariff.is_time_of_use:
+                inner_dict = {'imported': tariff.calculate_annual_import_cost_from_annual_kwh(
+                                  annual_kwh=kwh['imported'], days_in_year=self.envelope.calendar.days_in_year),
+                              'exported': 0.0}
+            else:
+                consumption = self.consumption_per_fuel[fuel_name]
+                inner_dict = {'imported': tariff.calculate_annual_import_cost(consumption=consumption),
+                              'exported': tariff.calculate_annual_export_cost(consumption=consumption)}
             bills_imported_and_exported[fuel_name] = inner_dict
         return bills_imported_and_exported
 
-    @property
+    @depends_on(*BILL_INPUTS)
     def annual_bill_per_fuel(self) -> Dict[str, float]:
         bills_dict = {}
-        for fuel_name, consumption in self.consumption_per_fuel.items():
+        for fuel_name in self.annual_bill_import_and_export_per_fuel.keys():
             bills_dict[fuel_name] = (self.annual_bill_import_and_export_per_fuel[fuel_name]['imported']
                                      - self.annual_bill_import_and_export_per_fuel[fuel_name]['exported'])
         return bills_dict
 
-    @cached_property
+    @depends_on(*BILL_INPUTS)
     def total_annual_bill(self) -> float:
         return sum(self.annual_bill_per_fuel.values())
 
-    @property
+    @depends_on(*ENERGY_INPUTS)
     def annual_tco2_per_fuel(self) -> Dict[str, float]:
+        return {fuel_name: tco2['imported'] - tco2['exported']
+                for fuel_name, tco2 in self.annual_tco2_import_and_export_per_fuel.items()}
+
+    @depends_on(*ENERGY_INPUTS)
+    def annual_tco2_import_and_export_per_fuel(self) -> Dict[str, Dict[str, float]]:
         carbon_dict = {}
-        for fuel_name, consumption in self.consumption_per_fuel.items():
-            carbon_dict[fuel_name] = consumption.overall.annual_sum_tco2
+        for fuel_name, kwh in self.annual_import_and_export_per_fuel_kwh.items():
+            fuel = self.fuels[fuel_name]
+            if self.uses_annual_totals and fuel.hourly_tco2_per_kwh is None:
+                carbon_dict[fuel_name] = {'imported': fuel.calculate_annual_tco2(kwh['imported']), 'exported': 0.0}
+            else:
+                consumption = self.consumption_per_fuel[fuel_name]
+                carbon_dict[fuel_name] = {'imported': consumption.imported.annual_sum_tco2,
+                                          'exported': consumption.exported.annual_sum_tco2}
         return carbon_dict
 
-    @cached_property
+    @depends_on(*ENERGY_INPUTS)
     def total_annual_tco2(self) -> float:
         return sum(self.annual_tco2_per_fuel.values())
 
-    @cached_property
+    @depends_on(*BILL_INPUTS)
     def energy_and_bills_df(self) -> pd.DataFrame:
 
         """ To make it easy to plot the results using plotly"""
-        kwh = {'electricity exports': - round(self.consumption_per_fuel['electricity'].exported.annual_sum_kwh, 0),
-               'electricity imports': round(self.consumption_per_fuel['electricity'].imported.annual_sum_kwh, 0)}
-        bill = {'electricity exports': - round(self.annual_bill_import_and_export_per_fuel['electricity']['exported'], 0),
-                'electricity imports': round(self.annual_bill_import_and_export_per_fuel['electricity']['imported'], 0)}
-        co2_dict = {'electricity exports': - round(self.consumption_per_fuel['electricity'].exported.annual_sum_tco2, 2),
-                    'electricity imports': round(self.consumption_per_fuel['electricity'].imported.annual_sum_tco2, 2)}
+        electricity_kwh = self.annual_import_and_export_per_fuel_kwh['electricity']
+        electricity_bill = self.annual_bill_import_and_export_per_fuel['electricity']
+        electricity_tco2 = self.annual_tco2_import_and_export_per_fuel['electricity']
+        kwh = {'electricity exports': - round(electricity_kwh['exported'], 0),
+               'electricity imports': round(electricity_kwh['imported'], 0)}
+        bill = {'electricity exports': - round(electricity_bill['exported'], 0),
+                'electricity imports': round(electricity_bill['imported'], 0)}
+        co2_dict = {'electricity exports': - round(electricity_tco2['exported'], 2),
+                    'electricity imports': round(electricity_tco2['imported'], 2)}
 
         heating_fuel = self.heating_system.fuel.name
         if heating_fuel != 'electricity':
-            kwh[heating_fuel] = round(self.consumption_per_fuel[heating_fuel].overall.annual_sum_kwh, 0)
+            kwh[heating_fuel] = round(self.annual_consumption_per_fuel_kwh[heating_fuel], 0)
             bill[heating_fuel] = round(self.annual_bill_per_fuel[heating_fuel], 0)
-            co2_dict[heating_fuel] = round(self.consumption_per_fuel[heating_fuel].overall.annual_sum_tco2, 2)
+            co2_dict[heating_fuel] = round(self.annual_tco2_per_fuel[heating_fuel], 2)
 
-        df = pd.DataFrame(data={'Your annual energy use kwh': kwh,
-                                'Your annual energy bill £': bill,
-                                'Your annual carbon emissions tCO2': co2_dict})
-        df.index.name = 'fuel'
-        df = df.reset_index()
-        return df
+        return make_energy_and_bills_df(kwh=kwh, bill=bill, co2_dict=co2_dict)
 
     def clear_cached_properties(self):
-        cls = self.__class__
-        attrs = [a for a in dir(self) if isinstance(getattr(cls, a, cls), cached_property)]
-        for a in attrs:
-            if a in self.__dict__.keys():
-                del self.__dict__[a]
+        """ Cached quantities are recalculated automatically when the components they depend on change, so this is
+        only needed to force a full recalculation"""
+        self.__dict__.pop('_dependent_cache', None)
 
     @property
     def heating_system_upfront_cost(self) -> int:
@@ -173,6 +274,8 @@ class House:
     @property
     def upfront_cost(self) -> int:
         cost = self.heating_system_upfront_cost + self.solar_install.upfront_cost
+        if self.battery is not None:
+            cost += self.battery.upfront_cost
         rounded_cost = round(cost, -2)
         return rounded_cost
 
@@ -181,12 +284,63 @@ class House:
         return self.upfront_cost - self.heating_system.grant
 
 
+def make_energy_and_bills_df(kwh: Dict[str, float], bill: Dict[str, float], co2_dict: Dict[str, float]
+                             ) -> pd.DataFrame:
+    """ One row per fuel (and electricity imports/exports) for plotting with plotly"""
+    df = pd.DataFrame(data={'Your annual energy use kwh': kwh,
+                            'Your annual energy bill £': bill,
+                            'Your annual carbon emissions tCO2': co2_dict})
+    df.index.name = 'fuel'
+    df = df.reset_index()
+    return df
+
+
 @dataclass
-class Tariff:
+class Tariff(TrackedComponent):
     fuel: constants.Fuel
     p_per_day: float
     p_per_unit_import: float  # unit defined by the fuel
     p_per_unit_export: float = 0.0
+    # Time of use prices, one per hour of the year. Used instead of the flat prices above when set
+    hourly_p_per_unit_import: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+    hourly_p_per_unit_export: Optional[np.ndarray] = field(default=None, repr=False, compare=False)
+
+    def __setattr__(self, name: str, value):
+        # Frozen whenever they are set, not just on construction, so they can't be changed in place
+        if name in ('hourly_p_per_unit_import', 'hourly_p_per_unit_export') and value is not None:
+            value = time_of_use.freeze_prices(value)
+        super().__setattr__(name, value)
+
+    @classmethod
+    def from_price_bands(cls, fuel: constants.Fuel, p_per_day: float, default_p_per_unit_import: float,
+                         import_bands: List[time_of_use.PriceBand], p_per_unit_export: float = 0.0,
+                         export_bands: Optional[List[time_of_use.PriceBand]] = None) -> 'Tariff':
+        """ e.g. Economy 7: import_bands=[PriceBand(start_hour=0, end_hour=7, p_per_unit=15.0)]. The flat import
+        price is set to the average over the year, for display"""
+        hourly_import = time_of_use.make_hourly_prices_from_bands(bands=import_bands,
+                                                                  default_p_per_unit=default_p_per_unit_import)
+        hourly_export = None
+        if export_bands is not None:
+            hourly_export = time_of_use.make_hourly_prices_from_bands(bands=export_bands,
+                                                                      default_p_per_unit=p_per_unit_export)
+        return cls(fuel=fuel, p_per_day=p_per_day, p_per_unit_import=float(hourly_import.mean()),
+                   p_per_unit_export=p_per_unit_export, hourly_p_per_unit_import=hourly_import,
+                   hourly_p_per_unit_export=hourly_export)
+
+    @property
+    def is_time_of_use(self) -> bool:
+        return self.hourly_p_per_unit_import is not None or self.hourly_p_per_unit_export is not None
+
+    @staticmethod
+    def calculate_unit_cost_p(stream: ConsumptionStream, p_per_unit: float,
+                              hourly_p_per_unit: Optional[np.ndarray]) -> float:
+        """ Cost in pence of the units in the stream, excluding standing charges"""
+        if hourly_p_per_unit is None:
+            return stream.annual_sum_fuel_units * p_per_unit
+        if len(hourly_p_per_unit) != stream.hours_in_year:
+            raise ValueError(f"Tariff has {len(hourly_p_per_unit)} hourly prices but consumption has "
+                             f"{stream.hours_in_year} hours")
+        return stream.values @ hourly_p_per_unit / stream.fuel.converter_consumption_units_to_kwh
 
     def calculate_annual_import_cost(self, consumption: 'Consumption') -> float:
         """ Calculate the annual cost of the import consumption of a certain fuel with this tariff"""
@@ -194,7 +348,8 @@ class Tariff:
             raise ValueError("To calculate annual costs the tariff fuel must match the consumption fuel, they are"
                              f"{self.fuel} and {consumption.fuel}")
         cost_p_per_day = consumption.overall.days_in_year * self.p_per_day
-        cost_p_imports = consumption.imported.annual_sum_fuel_units * self.p_per_unit_import
+        cost_p_imports = self.calculate_unit_cost_p(stream=consumption.imported, p_per_unit=self.p_per_unit_import,
+                                                    hourly_p_per_unit=self.hourly_p_per_unit_import)
         annual_import_cost = (cost_p_per_day + cost_p_imports) / 100
         return annual_import_cost
 
@@ -203,9 +358,17 @@ class Tariff:
         if self.fuel.name != consumption.fuel.name:
             raise ValueError("To calculate annual costs the tariff fuel must match the consumption fuel, they are"
                              f"{self.fuel} and {consumption.fuel}")
-        income_exports = consumption.exported.annual_sum_fuel_units * self.p_per_unit_export / 100
+        income_exports = self.calculate_unit_cost_p(stream=consumption.exported, p_per_unit=self.p_per_unit_export,
+                                                    hourly_p_per_unit=self.hourly_p_per_unit_export) / 100
         return income_exports
 
+    def calculate_annual_import_cost_from_annual_kwh(self, annual_kwh: float, days_in_year: float) -> float:
+        """ For flat tariffs, where only the annual total matters"""
+        if self.is_time_of_use:
+            raise ValueError("Time of use tariffs need the hourly consumption")
+        cost_p_imports = self.fuel.convert_kwh_to_fuel_units(annual_kwh) * self.p_per_unit_import
+        return (days_in_year * self.p_per_day + cost_p_imports) / 100
+
     def calculate_annual_net_cost(self, consumption: 'Consumption') -> float:
         annual_import_cost = self.calculate_annual_import_cost(consumption=consumption)
         income_exports = self.calculate_annual_export_cost(consumption=consumption)
@@ -239,12 +402,15 @@ class Tariff:
 
 
 @dataclass
-class HeatingSystem:
+class HeatingSystem(TrackedComponent):
     name: str
     efficiency: float
     fuel: constants.Fuel
     hourly_normalized_demand_profile: pd.Series
+    # Heat pumps only. If set, the COP each hour comes from the outdoor temperature and efficiency isn't used
+    flow_temperature_c: Optional[float] = None
     lifetime = constants.HEATING_SYSTEM_LIFETIME
+    _untracked_attributes = ('grant',)  # doesn't affect consumption or bills
 
     def __post_init__(self):
         self.grant = constants.HEATING_SYSTEM_GRANTS[self.name]
@@ -256,9 +422,30 @@ class HeatingSystem:
         return cls(name=name,
                    efficiency=parameters.efficiency,
                    fuel=parameters.fuel,
-                   hourly_normalized_demand_profile=parameters.normalized_hourly_heat_demand_profile)
+                   hourly_normalized_demand_profile=parameters.normalized_hourly_heat_demand_profile,
+                   flow_temperature_c=parameters.flow_temperature_c)
+
+    @property
+    def hourly_efficiency(self) -> Optional[np.ndarray]:
+        """ COP for each hour if it varies with outdoor temperature, otherwise None"""
+        if self.flow_temperature_c is None:
+            return None
+        return heat_pump_cop.calculate_hourly_cop(flow_temperature_c=self.flow_temperature_c)
+
+    @property
+    def seasonal_efficiency(self) -> float:
+        """ Heat delivered over the year divided by fuel used"""
+        hourly_efficiency = self.hourly_efficiency
+        if hourly_efficiency is None:
+            return self.efficiency
+        profile = self.hourly_normalized_demand_profile.to_numpy()
+        return profile.sum() / (profile / hourly_efficiency).sum()
 
     def calculate_consumption(self, annual_space_heating_demand_kwh: float) -> Consumption:
+        hourly_efficiency = self.hourly_efficiency
+        if hourly_efficiency is not None:
+            profile_kwh = self.hourly_normalized_demand_profile / hourly_efficiency * annual_space_heating_demand_kwh
+            return Consumption(hourly_profile_kwh=profile_kwh, fuel=self.fuel)
         try:
             profile_kwh = self.hourly_normalized_demand_profile / self.efficiency * annual_space_heating_demand_kwh
         except ZeroDivisionError:  # should only happen fleetingly when heating system state hasn't caught up
@@ -266,13 +453,23 @@ class HeatingSystem:
         consumption = Consumption(hourly_profile_kwh=profile_kwh, fuel=self.fuel)
         return consumption
 
+    def calculate_annual_consumption_kwh(self, annual_space_heating_demand_kwh: float) -> float:
+        """ Same total as calculate_consumption, as the normalized demand profile sums to 1"""
+        hourly_efficiency = self.hourly_efficiency
+        if hourly_efficiency is not None:
+            profile = self.hourly_normalized_demand_profile.to_numpy()
+            return annual_space_heating_demand_kwh * (profile / hourly_efficiency).sum()
+        if self.efficiency == 0:  # should only happen fleetingly when heating system state hasn't caught up
+            return 0.0
+        return annual_space_heating_demand_kwh / self.efficiency
+
     def calculate_upfront_cost(self, house_type: str):
         cost = constants.HEATING_SYSTEM_COSTS[self.name][house_type]
         return cost
 
 
 @dataclass()
-class BuildingEnvelope:
+class BuildingEnvelope(TrackedComponent):
     """ Stores info on the building and its energy demand"""
 
     def __init__(self, house_type: str, annual_heating_demand: float, base_electricity_demand_profile_kwh: pd.Series):
@@ -281,6 +478,14 @@ class BuildingEnvelope:
         self.base_demand = base_electricity_demand_profile_kwh
         self.units: str = 'kwh'
 
+    @property
+    def annual_base_demand(self) -> float:
+        return float(self.base_demand.to_numpy().sum())
+
+    @property
+    def calendar(self) -> HourlyCalendar:
+        return HourlyCalendar.from_index(self.base_demand.index)
+
     @classmethod
     def from_building_type_constants(cls, building_type_constants: constants.BuildingTypeConstants
                                      ) -> "BuildingEnvelope":
@@ -0,0 +1,123 @@
+""" Discounted cash flows over the lifetime of an upgrade: NPV, IRR and discounted payback.
+
+All cash flows are years x upgrades arrays, so any number of upgrades (e.g. the three options for one house, or every
+option for every home in a batch) are evaluated in one set of array operations.
+
+Year 0 is the upfront cost. From year 1, bill savings grow with energy prices, and the part that comes from solar
+falls as the panels degrade. Where the upgraded heating system wears out before the end of the period, the extra cost
+of replacing it is paid that year, and the part of the replacement's life left at the end is credited back."""
+
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from constants import FinanceConstants
+
+
+@dataclass
+class CashFlowInputs:
+    """ One value per upgrade"""
+    upfront_cost: np.ndarray
+    first_year_bill_savings: np.ndarray  # including the solar savings below
+    first_year_solar_bill_savings: np.ndarray
+    heating_replacement_cost: np.ndarray  # extra cost of replacing the upgraded heating rather than the original
+    heating_lifetime: np.ndarray  # years
+
+    def __post_init__(self):
+        for name, value in self.__dict__.items():
+            setattr(self, name, np.atleast_1d(np.asarray(value, dtype=np.float64)))
+
+
+@dataclass
+class CashFlowResults:
+    cash_flows: np.ndarray  # years x upgrades, year 0 first
+    discount_rate: float
+
+    @property
+    def discount_factors(self) -> np.ndarray:
+        return (1 + self.discount_rate) ** -np.arange(len(self.cash_flows))[:, np.newaxis]
+
+    @property
+    def discounted_cash_flows(self) -> np.ndarray:
+        return self.cash_flows * self.discount_factors
+
+    @property
+    def npv(self) -> np.ndarray:
+        return self.discounted_cash_flows.sum(axis=0)
+
+    @property
+    def irr(self) -> np.ndarray:
+        return calculate_irr(self.cash_flows)
+
+    @property
+    def discounted_payback(self) -> np.ndarray:
+        return calculate_payback(self.discounted_cash_flows)
+
+    def to_df(self, names: List[str]) -> pd.DataFrame:
+        return pd.DataFrame({'npv': self.npv, 'irr': self.irr, 'discounted_payback_years': self.discounted_payback},
+                            index=pd.Index(names, name='upgrade'))
+
+
+def calculate_cash_flows(inputs: CashFlowInputs,
+                         years: int = FinanceConstants.YEARS,
+                         discount_rate: float = FinanceConstants.DISCOUNT_RATE,
+                         price_escalation: float = FinanceConstants.ENERGY_PRICE_ESCALATION,
+                         solar_degradation: float = FinanceConstants.SOLAR_DEGRADATION) -> CashFlowResults:
+    year = np.arange(years + 1)[:, np.newaxis]
+    years_in = np.maximum(year - 1, 0)
+    other_savings = inputs.first_year_bill_savings - inputs.first_year_solar_bill_savings
+    solar_savings = inputs.first_year_solar_bill_savings * (1 - solar_degradation) ** years_in
+    cash_flows = (other_savings + solar_savings) * (1 + price_escalation) ** years_in
+    cash_flows[0] = -inputs.upfront_cost
+
+    replacement_year = inputs.heating_lifetime
+    is_replaced = replacement_year <= years
+    cash_flows -= np.where((year == replacement_year) & is_replaced, inputs.heating_replacement_cost, 0.0)
+    life_left = np.where(is_replaced, (replacement_year + inputs.heating_lifetime - years) / inputs.heating_lifetime, 0)
+    cash_flows[-1] += inputs.heating_replacement_cost * np.clip(life_left, 0, 1)
+    return CashFlowResults(cash_flows=cash_flows, discount_rate=discount_rate)
+
+
+def calculate_irr(cash_flows: np.ndarray, low: float = -0.99, high: float = 1.0, iterations: int = 60) -> np.ndarray:
+    """ Discount rate that makes the NPV zero, by bisection for all upgrades at once. Nan if there isn't one between
+    low and high, e.g. if the savings never cover the upfront cost"""
+    year = np.arange(len(cash_flows))[:, np.newaxis]
+
+    def npv_at(rate: np.ndarray) -> np.ndarray:
+        return (cash_flows * (1 + rate) ** -year).sum(axis=0)
+
+    low = np.full(cash_flows.shape[1], low)
+    high = np.full(cash_flows.shape[1], high)
+    npv_low = npv_at(low)
+    has_root = np.sign(npv_low) != np.sign(npv_at(high))
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        npv_middle = npv_at(middle)
+        same_sign_as_low = np.sign(npv_middle) == np.sign(npv_low)
+        low = np.where(same_sign_as_low, middle, low)
+        npv_low = np.where(same_sign_as_low, npv_middle, npv_low)
+        high = np.where(same_sign_as_low, high, middle)
+    return np.where(has_root, (low + high) / 2, np.nan)
+
+
+def calculate_payback(cash_flows: np.ndarray) -> np.ndarray:
+    """ Years until the cumulative cash flow stops being negative, interpolated within the year it turns. Nan if it
+    never does"""
+    cumulative = np.cumsum(cash_flows, axis=0)
+    is_paid_back = cumulative >= 0
+    # Last year in deficit, so an upgrade that pays back and then goes back into deficit (e.g. when the heat pump is
+    # replaced) counts from when it last pays back
+    in_deficit = ~is_paid_back
+    last_deficit_year = len(cumulative) - 1 - np.argmax(in_deficit[::-1], axis=0)
+    never_in_deficit = ~in_deficit.any(axis=0)
+    never_paid_back = in_deficit[-1]
+
+    columns = np.arange(cash_flows.shape[1])
+    next_year = np.minimum(last_deficit_year + 1, len(cumulative) - 1)
+    deficit = -cumulative[last_deficit_year, columns]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = deficit / cash_flows[next_year, columns]
+    payback = np.where(never_in_deficit, 0.0, last_deficit_year + fraction)
+    return np.where(never_paid_back, np.nan, payback)
@@ -1,18 +1,27 @@
+import os
 from dataclasses import dataclass
+from functools import cache
 
 import pandas as pd
 from pathlib import Path
 
+import profile_store
 from fuels import Fuel
+from hourly_calendar import HourlyCalendar
 
 THIS_FILE = Path(__file__)
 
 # Use same year as solar year
 BASE_YEAR_HOURLY_INDEX = pd.date_range(start="2013-01-01", end="2014-01-01", freq="1H", inclusive="left")
+BASE_YEAR_CALENDAR = HourlyCalendar.from_index(BASE_YEAR_HOURLY_INDEX)  # validated once, shared by all streams
 EMPTY_TIMESERIES = pd.Series(index=BASE_YEAR_HOURLY_INDEX, data=0)
 
 ELEC_TCO2_PER_KWH = 186 / 10 ** 6
-ELECTRICITY = Fuel("electricity", tco2_per_kwh=ELEC_TCO2_PER_KWH)
+# Emissions use the annual average above unless this file of hourly grid intensity has been made, by running
+# data_exploration_and_prep/prep_grid_carbon_intensity_file.py
+ELEC_HOURLY_TCO2_PER_KWH_FILE = THIS_FILE.parent.parent / 'data/profiles/grid_carbon_intensity_2013.npy'
+ELECTRICITY = Fuel("electricity", tco2_per_kwh=ELEC_TCO2_PER_KWH,
+                   hourly_tco2_per_kwh_file=ELEC_HOURLY_TCO2_PER_KWH_FILE)
 GAS_TCO2_PER_KWH = 202 / 10 ** 6
 GAS = Fuel(name="gas", tco2_per_kwh=GAS_TCO2_PER_KWH)
 OIL_TCO2_PER_KWH = 260 / 10 ** 6
@@ -22,40 +31,82 @@ OIL = Fuel(name="oil", units="litres", converter_consumption_units_to_kwh=KWH_PE
 FUELS = [ELECTRICITY, GAS, OIL]
 
 
+# Demand profiles are memory mapped from .npy files on first use rather than read in at import
+PROFILES_PATH = THIS_FILE.parent.parent / 'data/profiles'
+BASE_DEMAND_PROFILE_NAME = 'normalized_hourly_base_electricity_demand_profile_2013'
+HEAT_DEMAND_PROFILE_NAME = 'hourly_heating_demand_profiles_2013'
+OUTDOOR_TEMPERATURE_PROFILE_NAME = 'outdoor_air_temperature_2013'
+
+
+def load_profile_values(name: str):
+    values, entry = profile_store.load_profile(directory=PROFILES_PATH, name=name)
+    if entry['start'] != str(BASE_YEAR_HOURLY_INDEX[0]) or len(values) != len(BASE_YEAR_HOURLY_INDEX):
+        raise profile_store.ProfileStoreError(f"{name} doesn't cover the base year")
+    return values, entry
+
+
+@cache
+def load_normalized_hourly_base_demand() -> pd.Series:
+    values, entry = load_profile_values(name=BASE_DEMAND_PROFILE_NAME)
+    return pd.Series(values, index=BASE_YEAR_HOURLY_INDEX, name=entry['series_name'])
+# Based on elexon profiling data https://www.elexon.co.uk/operations-settlement/profiling/
+# Data processing done in data_exploration_and_prep folder
+
+
+@cache
+def load_normalized_hourly_heat_demand_df() -> pd.DataFrame:
+    values, entry = load_profile_values(name=HEAT_DEMAND_PROFILE_NAME)
+    return pd.DataFrame(values, index=BASE_YEAR_HOURLY_INDEX, columns=entry['columns'])
+# based on data from https://ukerc.rl.ac.uk/DC/cgi-bin/edc_search.pl?WantComp=165
+# processed in data_exploration_and_prep
+
+
+@cache
+def load_hourly_outdoor_temperature() -> pd.Series:
+    values, entry = load_profile_values(name=OUTDOOR_TEMPERATURE_PROFILE_NAME)
+    return pd.Series(values, index=BASE_YEAR_HOURLY_INDEX, name=entry['series_name'])
+# UK daily average for 2013 from the same UKERC dataset as the heat demand profiles, so the same value every hour of
+# a day. Processed in data_exploration_and_prep
+
+
+_LAZY_PROFILES = {'NORMALIZED_HOURLY_BASE_DEMAND': load_normalized_hourly_base_demand,
+                  'NORMALIZED_HOURLY_HEAT_DEMAND_DF': load_normalized_hourly_heat_demand_df}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_PROFILES:
+        return _LAZY_PROFILES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 @dataclass
 class BuildingTypeConstants:
     name: str
     annual_base_electricity_demand_kWh: float
-    normalized_base_electricity_demand_profile_kWh: pd.Series
     annual_heat_demand_kWh: float
 
+    @property
+    def normalized_base_electricity_demand_profile_kWh(self) -> pd.Series:
+        return load_normalized_hourly_base_demand()
 
-elec_path = Path(THIS_FILE.parent.parent / 'data/normalized_hourly_base_electricity_demand_profile_2013.pkl')
-NORMALIZED_HOURLY_BASE_DEMAND: pd.Series = pd.read_pickle(elec_path)
-# Based on elexon profiling data https://www.elexon.co.uk/operations-settlement/profiling/
-# Data processing done in data_exploration_and_prep folder
 
 # Decide whether to add floor area or not? < get issue with adjusting space heating demand and then what you do
 BUILDING_TYPE_OPTIONS = {
     "Terrace": BuildingTypeConstants(
         name="Terrace",
         annual_base_electricity_demand_kWh=2890,  # used value for terrace - small up to 70m2
-        normalized_base_electricity_demand_profile_kWh=NORMALIZED_HOURLY_BASE_DEMAND,
         annual_heat_demand_kWh=9900),  # order here defines dropdown order and default, so most common first
     "Semi-detached": BuildingTypeConstants(
         name="Semi-detached",
         annual_base_electricity_demand_kWh=3850,
-        normalized_base_electricity_demand_profile_kWh=NORMALIZED_HOURLY_BASE_DEMAND,
         annual_heat_demand_kWh=10600),
     "Flat": BuildingTypeConstants(
         name="Flat",
         annual_base_electricity_demand_kWh=2830,
-        normalized_base_electricity_demand_profile_kWh=NORMALIZED_HOURLY_BASE_DEMAND,
         annual_heat_demand_kWh=6600),
     "Detached": BuildingTypeConstants(
         name="Detached",
         annual_base_electricity_demand_kWh=4150,
-        normalized_base_electricity_demand_profile_kWh=NORMALIZED_HOURLY_BASE_DEMAND,
         annual_heat_demand_kWh=14000)
 }
 
@@ -70,33 +121,32 @@ BUILDING_TYPE_OPTIONS = {
 class HeatingConstants:
     efficiency: float
     fuel: Fuel
-    normalized_hourly_heat_demand_profile: pd.Series
+    heat_demand_profile_column: str
     #  Not splitting space and water heating because hourly demand profiles are combined
+    flow_temperature_c: float | None = None  # heat pumps only. If set, COP varies with outdoor temperature
 
+    @property
+    def normalized_hourly_heat_demand_profile(self) -> pd.Series:
+        return load_normalized_hourly_heat_demand_df()[self.heat_demand_profile_column]
 
-heat_path = Path(THIS_FILE.parent.parent / 'data/hourly_heating_demand_profiles_2013.pkl')
-NORMALIZED_HOURLY_HEAT_DEMAND_DF: pd.DataFrame = pd.read_pickle(heat_path)
-# based on data from https://ukerc.rl.ac.uk/DC/cgi-bin/edc_search.pl?WantComp=165
-# processed in data_exploration_and_prep
 
 DEFAULT_HEATING_CONSTANTS = {
     "Gas boiler": HeatingConstants(
         efficiency=0.84,
         fuel=GAS,
-        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF['Normalised_Gas_boiler_heat']),
+        heat_demand_profile_column='Normalised_Gas_boiler_heat'),
     "Oil boiler": HeatingConstants(
         efficiency=0.84,
         fuel=OIL,
-        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF['Normalised_Gas_boiler_heat']),
+        heat_demand_profile_column='Normalised_Gas_boiler_heat'),
     "Direct electric": HeatingConstants(
         efficiency=1.0,
         fuel=ELECTRICITY,
-        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF[
-            'Normalised_Resistance_heater_heat']),
+        heat_demand_profile_column='Normalised_Resistance_heater_heat'),
     "Heat pump": HeatingConstants(
         efficiency=3.4,
         fuel=ELECTRICITY,
-        normalized_hourly_heat_demand_profile=NORMALIZED_HOURLY_HEAT_DEMAND_DF['Normalised_ASHP_heat']),
+        heat_demand_profile_column='Normalised_ASHP_heat'),
 }
 
 RPI_ratio_oct_21_to_sept_23 = 378.4/312.0
@@ -121,6 +171,18 @@ HEATING_SYSTEM_GRANTS = {"Gas boiler": 0,
 HEATING_SYSTEM_LIFETIME = 20
 
 
+class HeatPumpConstants:
+    # COP of air source heat pumps against the difference between flow and outdoor temperature, dT:
+    # COP = 6.81 - 0.121 dT + 0.000630 dT^2, fitted to manufacturer data for 15 <= dT <= 60
+    # Staffell et al. 2012, A review of domestic heat pumps https://doi.org/10.1039/C2EE22653G
+    COP_COEFFICIENTS = (6.81, -0.121, 0.000630)
+    COP_MIN_TEMPERATURE_DIFFERENCE_C = 15
+    COP_MAX_TEMPERATURE_DIFFERENCE_C = 60
+    # COP is looked up on this grid of outdoor temperatures, then interpolated
+    OUTDOOR_TEMPERATURE_GRID_C = tuple(temperature / 2 for temperature in range(-60, 81))  # -30C to 40C
+    FLOW_TEMPERATURE_OPTIONS_C = (35, 40, 45, 50, 55)
+
+
 # TODO: reference nesta tool: http://asf-hp-cost-demo-l-b-1046547218.eu-west-1.elb.amazonaws.com
 
 
@@ -138,6 +200,9 @@ STANDARD_TARIFF = TariffConstants(
     p_per_kwh_gas=7.0, p_per_kwh_elec_import=27.0, p_per_kwh_elec_export=15.0,
     p_per_L_oil=79.0, p_per_day_gas=30.0, p_per_day_elec=53.0)
 
+# Tariffs to compare a house against. Format described in tariff_catalogue.py
+TARIFF_CATALOGUE_PATH = THIS_FILE.parent.parent / 'data/tariffs/catalogue.json'
+
 
 @dataclass()
 class Orientation:
@@ -183,12 +248,59 @@ class SolarConstants:
     LIFETIME = 25
 
     PERCENT_SQUARE_USABLE = 0.8  # complete guess - only used when shape drawn isn't rectangular
+    # How to count panels: 'simple' fills rectangles and falls back on area for other shapes, 'layout' lays out
+    # panels on the actual shape (see panel_layout.py). Can be overridden by the PANEL_COUNT_METHOD env variable
+    PANEL_COUNT_METHOD = 'simple'
+    PANEL_LAYOUT_RESOLUTION_M = 0.05  # size of the grid cells roofs are rasterised onto
+    PANEL_LAYOUT_CACHE_ENTRIES = 256
 
     API_YEAR = 2013
     # Was 202 Based on quick comparison of years for one location in the uk.
     # If you don't pass years to the API it gives you all hours from first to last year they have data for.
     SYSTEM_LOSS = 14  # percentage loss in the system - the PVGIS documentation suggests 14 %
 
+    # Generation profiles per kWp are cached on disk. 3 decimal places of lat/lng is about 100m
+    PV_CACHE_LAT_LNG_DECIMAL_PLACES = 3
+    AZIMUTH_STEP_DEGREES = 5  # azimuths inferred from roof drawings are rounded to this, so profiles can be shared
+    PV_CACHE_MAX_BYTES = 200 * 1024 ** 2  # about 3000 profiles
+    PV_CACHE_MEMORY_ENTRIES = 64
+    PV_CACHE_TOUCH_INTERVAL_SECONDS = 60  # how often a profile served from memory updates its last used time on disk
+    # In the user's cache directory rather than the source tree. PV_PROFILE_CACHE_PATH env variable overrides it
+    PV_CACHE_DEFAULT_PATH = (Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache')
+                             / 'heat_pump_and_solar_savings/pv_profiles_per_kwp.sqlite')
+
+    PVGIS_BASE_URL = 'https://re.jrc.ec.europa.eu/api/v5_2'  # can be overridden by the PVGIS_BASE_URL env variable
+    PVGIS_MAX_CALLS_PER_SECOND = 30  # PVGIS rejects requests from an IP making more calls than this
+    PVGIS_TIMEOUT_S = 60
+    PVGIS_CONNECTION_POOL_SIZE = 10
+    PV_PREFETCH_WORKERS = 8  # enough to fetch every orientation at once
+
+    # Offline alternative to PVGIS: 'pvgis' or 'local'. Can be overridden by the PV_BACKEND env variable
+    PV_BACKEND = 'pvgis'
+    # Profile store of hourly horizontal irradiance and air temperature on a lat/lng grid, made by
+    # prep_irradiance_dataset.py
+    IRRADIANCE_DATASET_DIRECTORY = THIS_FILE.parent.parent / 'data/irradiance_grid_2013'
+    GROUND_ALBEDO = 0.2  # typical value for grass and buildings
+    PV_NOCT_C = 45  # nominal operating cell temperature: cell temp at 800 W/m2, 20 C air temp
+    PV_TEMPERATURE_COEFFICIENT_PER_C = -0.004  # change in power output per degree of cell temperature above 25 C
+
+
+class BatteryConstants:
+    # Typical for a home battery, e.g. a 5kWh battery with a 3kW inverter
+    CAPACITY_KWH = 5
+    POWER_KW = 3
+    ROUND_TRIP_EFFICIENCY = 0.9
+    COST_PER_KWH = 700  # rough installed cost including the inverter
+    LIFETIME = 15
+
+
+class FinanceConstants:
+    YEARS = SolarConstants.LIFETIME  # cash flows are worked out over the longest lifetime of the upgrades
+    # Social discount rate from the HM Treasury Green Book
+    DISCOUNT_RATE = 0.035
+    ENERGY_PRICE_ESCALATION = 0.02  # rise in energy prices per year
+    SOLAR_DEGRADATION = 0.005  # fall in panel output per year, typical of manufacturer warranties
+
 
 CLASS_NAME_OF_SIDEBAR_DIV = "\"css-1f8pn94 edgvbvh3\""
 
@@ -1,35 +1,80 @@
 import copy
-from dataclasses import dataclass, field
+from typing import Tuple
 
+import numpy as np
 import pandas as pd
 
 import constants
 from fuels import Fuel
+from hourly_calendar import HourlyCalendar
 
 
-@dataclass
 class ConsumptionStream:
+    """ One year of hourly consumption of one fuel.
 
-    hourly_profile_kwh: pd.Series  # series index must be hourly datetime values for one whole year
-    fuel: Fuel = constants.ELECTRICITY
-
-    def __post_init__(self):
-        """ Check index is of correct form"""
-        # TODO: ask Archy how to do this better
-        assert isinstance(self.hourly_profile_kwh.index, pd.DatetimeIndex), "hourly_profile_kwh index must be datetime"
-        assert len(set(self.hourly_profile_kwh.index.year)) == 1  # only one year
-        assert self.hourly_profile_kwh.index.month[0] == 1
-        assert self.hourly_profile_kwh.index.month[-1] == 12
-        assert self.hourly_profile_kwh.index.day[0] == 1
-        assert self.hourly_profile_kwh.index.day[-1] == 31
-        assert self.hourly_profile_kwh.index.hour[0] == 0  # start at 0.00
-        assert self.hourly_profile_kwh.index.hour[-1] == 23  # end at 23.00
-        assert len(self.hourly_profile_kwh) == 8760 or len(self.hourly_profile_kwh) == 8760 + 24
-
-        self.year = self.hourly_profile_kwh.index.year[0]
-        self.hours_in_year = len(self.hourly_profile_kwh)
-        self.days_in_year = self.hours_in_year/24
-        self.leap_year = True if self.hours_in_year == 8760 + 24 else False
+    Stored as a contiguous float64 array plus a reference to a shared HourlyCalendar, so the index checks run once per
+    calendar rather than once per stream. hourly_profile_kwh is built as a Series view over the array when first asked
+    for. The array is read only, so annual sums can be cached and copies of the stream can share it."""
+
+    def __init__(self, hourly_profile_kwh: pd.Series, fuel: Fuel = constants.ELECTRICITY):
+        # series index must be hourly datetime values for one whole year
+        self.fuel = fuel
+        self.hourly_profile_kwh = hourly_profile_kwh
+
+    @classmethod
+    def from_array(cls, values: np.ndarray, calendar: HourlyCalendar = constants.BASE_YEAR_CALENDAR,
+                   fuel: Fuel = constants.ELECTRICITY) -> 'ConsumptionStream':
+        """ Set up directly from values on a calendar that has already been validated. No copy is made if values is
+        already a contiguous float64 array, in which case the stream takes ownership of it and marks it read only"""
+        if len(values) != calendar.hours_in_year:
+            raise ValueError(f"Expected {calendar.hours_in_year} hourly values but got {len(values)}")
+        stream = cls.__new__(cls)
+        stream.fuel = fuel
+        stream._set_values(values=values, calendar=calendar)
+        return stream
+
+    def __deepcopy__(self, memo):
+        # values are read only so the copy can share them
+        return ConsumptionStream.from_array(values=self.values, calendar=self.calendar,
+                                            fuel=copy.deepcopy(self.fuel, memo))
+
+    def _set_values(self, values: np.ndarray, calendar: HourlyCalendar):
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        values.flags.writeable = False
+        self.values = values
+        self.calendar = calendar
+        self._hourly_profile_kwh = None
+        self._annual_sum_kwh = None
+        self._annual_sum_fuel_units = None
+        self._annual_sum_tco2 = None
+
+    @property
+    def hourly_profile_kwh(self) -> pd.Series:
+        if self._hourly_profile_kwh is None:
+            self._hourly_profile_kwh = pd.Series(self.values, index=self.calendar.index, copy=False)
+        return self._hourly_profile_kwh
+
+    @hourly_profile_kwh.setter
+    def hourly_profile_kwh(self, hourly_profile_kwh: pd.Series):
+        calendar = HourlyCalendar.from_index(hourly_profile_kwh.index)
+        # copy so that later changes to the caller's series can't change the values underneath the cached sums
+        self._set_values(values=hourly_profile_kwh.to_numpy(dtype=np.float64, copy=True), calendar=calendar)
+
+    @property
+    def year(self) -> int:
+        return self.calendar.year
+
+    @property
+    def hours_in_year(self) -> int:
+        return self.calendar.hours_in_year
+
+    @property
+    def days_in_year(self) -> float:
+        return self.calendar.days_in_year
+
+    @property
+    def leap_year(self) -> bool:
+        return self.calendar.leap_year
 
     @property
     def hourly_profile_fuel_units(self):
@@ -38,23 +83,29 @@ class ConsumptionStream:
 
     @property
     def annual_sum_kwh(self) -> float:
-        annual_sum = self.hourly_profile_kwh.sum()
-        return annual_sum
+        if self._annual_sum_kwh is None:
+            self._annual_sum_kwh = self.values.sum()
+        return self._annual_sum_kwh
 
     @property
     def annual_sum_fuel_units(self) -> float:
-        annual_sum = self.hourly_profile_fuel_units.sum()
-        return annual_sum
+        if self._annual_sum_fuel_units is None:
+            self._annual_sum_fuel_units = self.fuel.convert_kwh_to_fuel_units(self.values).sum()
+        return self._annual_sum_fuel_units
 
     @property
     def annual_sum_tco2(self) -> float:
-        annual_tco2 = self.fuel.calculate_annual_tco2(self.annual_sum_kwh)
-        return annual_tco2
+        if self._annual_sum_tco2 is None:
+            if self.fuel.hourly_tco2_per_kwh is None:
+                self._annual_sum_tco2 = self.fuel.calculate_annual_tco2(self.annual_sum_kwh)
+            else:
+                self._annual_sum_tco2 = self.fuel.calculate_tco2(self.values)
+        return self._annual_sum_tco2
 
     def add(self, other: 'ConsumptionStream') -> 'ConsumptionStream':
-        if self.year == other.year:
-            combined_hourly_profile_kwh = self.hourly_profile_kwh + other.hourly_profile_kwh
-            combined = ConsumptionStream(hourly_profile_kwh=combined_hourly_profile_kwh, fuel=self.fuel)
+        if self.calendar is other.calendar:
+            combined = ConsumptionStream.from_array(values=self.values + other.values, calendar=self.calendar,
+                                                    fuel=self.fuel)
         else:
             raise ValueError("The year must be the same to be able to sum two profiles")
         return combined
@@ -65,25 +116,43 @@ class Consumption:
     def __init__(self, hourly_profile_kwh: pd.Series, fuel: constants.Fuel = constants.ELECTRICITY):
         self.overall = ConsumptionStream(hourly_profile_kwh=hourly_profile_kwh, fuel=fuel)
         self.fuel = fuel
+        self._split = None
+
+    @classmethod
+    def from_stream(cls, overall: ConsumptionStream) -> 'Consumption':
+        consumption = cls.__new__(cls)
+        consumption.overall = overall
+        consumption.fuel = overall.fuel
+        consumption._split = None
+        return consumption
 
     @property
     def imported(self) -> ConsumptionStream:
-        imported = copy.deepcopy(self.overall)
-        # set negative values equal to zero as they are exports
-        imported.hourly_profile_kwh.loc[imported.hourly_profile_kwh < 0] = 0
+        imported, _ = self.split_imports_and_exports()
         return imported
 
     @property
     def exported(self) -> ConsumptionStream:
-        exported = copy.deepcopy(self.overall)
-        # set positive values equal to zero as they are imports
-        exported.hourly_profile_kwh.loc[exported.hourly_profile_kwh > 0] = 0
-        # now that it is labelled as exported, make it positive to make it easier to deal with
-        exported.hourly_profile_kwh = exported.hourly_profile_kwh * -1
+        _, exported = self.split_imports_and_exports()
         return exported
 
+    def split_imports_and_exports(self) -> Tuple[ConsumptionStream, ConsumptionStream]:
+        """ Split overall into imports and exports in one pass and keep both, along with their cached annual sums.
+        Recalculated only if overall is swapped for a different profile"""
+        values = self.overall.values
+        if self._split is None or self._split[0] is not values:
+            # negative values are exports so are zero in imports
+            imported_values = np.where(values < 0, 0.0, values)
+            # positive values are imports so are zero in exports. Exports are made positive to make them easier to use
+            exported_values = np.where(values > 0, 0.0, values) * -1
+            imported = ConsumptionStream.from_array(values=imported_values, calendar=self.overall.calendar,
+                                                    fuel=self.fuel)
+            exported = ConsumptionStream.from_array(values=exported_values, calendar=self.overall.calendar,
+                                                    fuel=self.fuel)
+            self._split = (values, imported, exported)
+        _, imported, exported = self._split
+        return imported, exported
+
     def add(self, other: 'Consumption') -> 'Consumption':
         combined_overall_consumption = self.overall.add(other.overall)
-        combined_consumption = Consumption(hourly_profile_kwh=combined_overall_consumption.hourly_profile_kwh,
-                                           fuel=self.fuel)
-        return combined_consumption
+        return Consumption.from_stream(overall=combined_overall_consumption)
@@ -0,0 +1,104 @@
+""" Caching for House quantities that knows which components each quantity was calculated from.
+
+Components (envelope, heating system, tariffs, solar install) count changes to their public attributes. A cached
+quantity stores the identity and version of each component it depends on, and is only recalculated when one of
+those has changed. So a tariff edit recalculates bills but reuses the hourly energy results.
+
+A copy made with copy_on_write has the same identity as the component it was copied from until one of the two is
+changed, so the copy can reuse results cached for the original without either seeing the other's changes."""
+
+import copy
+from typing import Any, Callable, Tuple
+
+_MISSING = object()
+
+
+def _is_same_value(old_value, new_value) -> bool:
+    if old_value is new_value:
+        return True
+    # Only compare simple values: comparing series or arrays with == is elementwise
+    simple_types = (int, float, str, bool)
+    return isinstance(old_value, simple_types) and isinstance(new_value, simple_types) and old_value == new_value
+
+
+class TrackedComponent:
+    """ Counts changes to public attributes so cached results can tell whether the component has changed.
+
+    Setting an attribute to the value it already has is not counted as a change. Attributes listed in
+    _untracked_attributes (e.g. costs and grants, which no cached quantity uses) are never counted."""
+
+    _version = 0
+    _untracked_attributes: Tuple[str, ...] = ()
+
+    def __setattr__(self, name: str, value: Any):
+        if not name.startswith('_') and name not in self._untracked_attributes:
+            if not _is_same_value(self.__dict__.get(name, _MISSING), value):
+                self.mark_changed()
+        object.__setattr__(self, name, value)
+
+    def mark_changed(self):
+        """ For changes made in place that setting an attribute doesn't catch"""
+        object.__setattr__(self, '_version', self._version + 1)
+        if '_identity' in self.__dict__:  # stop sharing an identity with copies that haven't changed
+            object.__setattr__(self, '_identity', object())
+
+    def copy_on_write(self) -> 'TrackedComponent':
+        """ A shallow copy that shares this component's cached results until either of them is changed. Lists and dicts
+        held in public attributes are copied too, so e.g. appending to one doesn't change the other"""
+        duplicate = copy.copy(self)
+        object.__setattr__(duplicate, '_identity', self.__dict__.get('_identity', self))
+        for name, value in vars(self).items():
+            if not name.startswith('_') and isinstance(value, (list, dict)):
+                object.__setattr__(duplicate, name, copy.copy(value))
+        return duplicate
+
+
+def component_signature(component: Any) -> Tuple:
+    """ Identity and version of a component. A dict of components (e.g. tariffs per fuel) is expanded"""
+    if isinstance(component, dict):
+        return tuple(pair for value in component.values() for pair in component_signature(value))
+    identity = component.__dict__.get('_identity', component) if isinstance(component, TrackedComponent) else component
+    return (identity, getattr(component, '_version', 0)),
+
+
+def signatures_match(signature_1: Tuple, signature_2: Tuple) -> bool:
+    if len(signature_1) != len(signature_2):
+        return False
+    return all(component_1 is component_2 and version_1 == version_2
+               for (component_1, version_1), (component_2, version_2) in zip(signature_1, signature_2))
+
+
+class DependentCachedProperty:
+    """ Like functools.cached_property, but recalculated when any of the named inputs of the instance change"""
+
+    def __init__(self, func: Callable, inputs: Tuple[str, ...]):
+        self.func = func
+        self.inputs = inputs
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+
+    def signature(self, instance) -> Tuple:
+        return tuple(pair for input_name in self.inputs
+                     for pair in component_signature(getattr(instance, input_name)))
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        cache = instance.__dict__.setdefault('_dependent_cache', {})
+        signature = self.signature(instance)
+        entry = cache.get(self.name)
+        if entry is not None and signatures_match(entry[0], signature):
+            return entry[1]
+        value = self.func(instance)
+        cache[self.name] = (signature, value)
+        return value
+
+
+def depends_on(*inputs: str) -> Callable[[Callable], DependentCachedProperty]:
+    """ Decorator: cache a property until one of the named attributes of the instance changes"""
+    def decorator(func: Callable) -> DependentCachedProperty:
+        return DependentCachedProperty(func=func, inputs=inputs)
+    return decorator
@@ -0,0 +1,252 @@
+""" Pre-size solar for every building footprint or roof plane in a GeoJSON file, from the command line.
+
+Reads a GeoJSON FeatureCollection, or newline delimited GeoJSON with one feature per line, and writes one row per
+feature with its roof area, number of panels, kWp and azimuth. Panels are counted and the azimuth inferred the same way
+as for a roof drawn in the app.
+
+Features are parsed as the file is read rather than all at once, and sent in chunks to a pool of worker processes.
+Each worker works out the geometry of a whole chunk in one set of array operations. Only a bounded window of chunks is
+in flight at once, so memory use doesn't grow with the size of the file.
+
+A feature can be a Polygon or a MultiPolygon (e.g. the roof planes of one building), and only the outer ring of each
+polygon is used. A feature's pitch can be set with a "pitch" property, otherwise --pitch is used. The azimuth of a
+MultiPolygon is the azimuth of its largest polygon.
+
+Example:
+    python footprints.py estate.geojson --output panels.csv --workers 8
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO
+
+import numpy as np
+
+import solar
+from constants import SolarConstants
+from roof import PolygonGeometry
+
+OUTPUT_COLUMNS = ['id', 'error', 'number_of_polygons', 'roof_plan_area_m2', 'roof_area_m2', 'number_of_panels',
+                  'capacity_kwp', 'azimuth_degrees']
+
+READ_SIZE = 1024 ** 2  # characters read from a FeatureCollection at a time
+
+
+def read_features(path: Path) -> Iterator[Dict[str, Any]]:
+    """ Yields features one at a time, from newline delimited GeoJSON (.geojsonl, .ndjson, .jsonl) or a
+    FeatureCollection"""
+    with open(path) as file:
+        if path.suffix in ('.geojsonl', '.ndjson', '.jsonl'):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from read_feature_collection(file)
+
+
+def read_feature_collection(file: TextIO, read_size: int = READ_SIZE) -> Iterator[Dict[str, Any]]:
+    """ Decodes the features array one feature at a time, holding no more than about one read of the file and one
+    feature in memory"""
+    return FeatureCollectionReader(file=file, read_size=read_size).read_features()
+
+
+class FeatureCollectionReader:
+    """ Scans a FeatureCollection through a buffer that is topped up from the file as it is used up"""
+
+    def __init__(self, file: TextIO, read_size: int = READ_SIZE):
+        self.file = file
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+
+    def read_features(self) -> Iterator[Dict[str, Any]]:
+        self.skip_to_features_array()
+        while not self.next_character_is(']'):
+            yield self.decode_feature()
+            if self.next_character_is(','):
+                self.position += 1
+
+    def read_more(self) -> bool:
+        """ Drop what has been scanned and add the next read. False at the end of the file"""
+        chunk = self.file.read(self.read_size)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return bool(chunk)
+
+    def next_character_is(self, character: str) -> bool:
+        """ Skips whitespace first"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in ' \t\r\n':
+                self.position += 1
+            if self.position < len(self.buffer) or not self.read_more():
+                return self.buffer[self.position:self.position + 1] == character
+
+    def skip_to_features_array(self):
+        key = '"features"'
+        while (start := self.buffer.find(key, self.position)) < 0:
+            self.position = max(len(self.buffer) - len(key), 0)  # the key could be split across reads
+            if not self.read_more():
+                raise ValueError("No features found: expected a GeoJSON FeatureCollection")
+        self.position = start + len(key)
+        for expected in ':[':
+            if not self.next_character_is(expected):
+                raise ValueError(f"Expected '{expected}' after {key}")
+            self.position += 1
+
+    def decode_feature(self) -> Dict[str, Any]:
+        """ Reads more until the whole feature is in the buffer"""
+        while True:
+            try:
+                feature, self.position = self.decoder.raw_decode(self.buffer, self.position)
+                return feature
+            except json.JSONDecodeError:
+                if not self.read_more():
+                    raise
+
+
+def get_outer_rings(geometry: Dict[str, Any]) -> List[np.ndarray]:
+    """ (points, 2) lng, lat of the outer ring of each polygon in a Polygon or MultiPolygon"""
+    if geometry is None:
+        raise ValueError("Feature has no geometry")
+    if geometry['type'] == 'Polygon':
+        rings = [geometry['coordinates'][0]]
+    elif geometry['type'] == 'MultiPolygon':
+        rings = [polygon[0] for polygon in geometry['coordinates']]
+    else:
+        raise ValueError(f"Geometry type {geometry['type']} is not a Polygon or MultiPolygon")
+    rings = [np.asarray(ring, dtype=np.float64)[:, :2] for ring in rings]  # drop any altitudes
+    for ring in rings:
+        if len(ring) < 4:
+            raise ValueError("Polygon needs at least 3 points as well as the point that closes it")
+    return rings
+
+
+def get_feature_id(feature: Dict[str, Any], default: Any) -> Any:
+    properties = feature.get('properties') or {}
+    return feature.get('id', properties.get('id', default))
+
+
+def estimate_panels(features: List[Dict[str, Any]], default_pitch: float = SolarConstants.ROOF_PITCH_DEGREES,
+                    first_index: int = 0) -> List[Dict[str, Any]]:
+    """ One row per feature, in the same order. Never raises for a bad feature: the error goes in its row instead"""
+    rows = []
+    rings = []
+    pitches = []
+    number_of_rings = []
+    for i, feature in enumerate(features):
+        row = {'id': get_feature_id(feature, default=first_index + i), 'error': ''}
+        try:
+            feature_rings = get_outer_rings(feature.get('geometry'))
+            pitch = float((feature.get('properties') or {}).get('pitch', default_pitch))
+        except (KeyError, IndexError, TypeError, ValueError) as error:
+            row['error'] = f"{type(error).__name__}: {error}"
+            feature_rings, pitch = [], default_pitch
+        rows.append(row)
+        rings += feature_rings
+        pitches += [pitch] * len(feature_rings)
+        number_of_rings.append(len(feature_rings))
+    if not rings:
+        return rows
+
+    geometry = PolygonGeometry.from_points(rings)
+    pitches = np.array(pitches)
+    panels = solar.count_panels_in_polygons(geometry, pitch=pitches)
+    plan_areas = geometry.areas
+    areas = solar.convert_plan_value_to_value_along_pitch(plan_areas, pitch=pitches)
+    azimuths = geometry.azimuths
+
+    # Add up the polygons of each feature. Features with an error have none, so are skipped
+    feature_offsets = np.concatenate([[0], np.cumsum(number_of_rings)])
+    has_rings = np.array(number_of_rings) > 0
+    starts = feature_offsets[:-1][has_rings]
+    per_feature = {'roof_plan_area_m2': np.add.reduceat(plan_areas, starts),
+                   'roof_area_m2': np.add.reduceat(areas, starts),
+                   'number_of_panels': np.add.reduceat(panels, starts)}
+    for j, i in enumerate(np.flatnonzero(has_rings)):
+        if per_feature['roof_plan_area_m2'][j] < 1e-6:  # e.g. all points in a line, so no roof or azimuth
+            rows[i]['error'] = "ValueError: polygon has no area"
+            continue
+        number_of_panels = int(per_feature['number_of_panels'][j])
+        largest = np.argmax(plan_areas[feature_offsets[i]:feature_offsets[i + 1]])  # roof plane to take azimuth from
+        rows[i].update(number_of_polygons=number_of_rings[i],
+                       roof_plan_area_m2=round(float(per_feature['roof_plan_area_m2'][j]), 2),
+                       roof_area_m2=round(float(per_feature['roof_area_m2'][j]), 2),
+                       number_of_panels=number_of_panels,
+                       capacity_kwp=round(number_of_panels * SolarConstants.KW_PEAK_PER_PANEL, 3),
+                       azimuth_degrees=float(azimuths[feature_offsets[i] + largest]))
+    return rows
+
+
+def estimate_panels_for_features(features: Iterable[Dict[str, Any]], executor: Executor, window: int,
+                                 chunk_size: int, default_pitch: float = SolarConstants.ROOF_PITCH_DEGREES
+                                 ) -> Iterator[Dict[str, Any]]:
+    """ Yields rows in the same order as the features, with at most window chunks submitted but not yet yielded"""
+    in_flight = deque()
+    features = iter(features)
+    first_index = 0
+    while chunk := list(islice(features, chunk_size)):
+        in_flight.append(executor.submit(estimate_panels, chunk, default_pitch, first_index))
+        first_index += len(chunk)
+        if len(in_flight) >= window:
+            yield from in_flight.popleft().result()
+    while in_flight:
+        yield from in_flight.popleft().result()
+
+
+def write_rows(rows: Iterable[Dict[str, Any]], file, output_format: str) -> int:
+    """ Write each row as soon as it arrives. Returns number of rows written"""
+    number_written = 0
+    if output_format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=OUTPUT_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            number_written += 1
+    else:
+        for row in rows:
+            file.write(json.dumps(row) + '\n')
+            number_written += 1
+    return number_written
+
+
+def run(input_path: Path, output_path: Optional[Path], workers: int, window: int, chunk_size: int,
+        default_pitch: float = SolarConstants.ROOF_PITCH_DEGREES) -> int:
+    output_format = 'jsonl' if output_path is not None and output_path.suffix == '.jsonl' else 'csv'
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rows = estimate_panels_for_features(features=read_features(input_path), executor=executor, window=window,
+                                            chunk_size=chunk_size, default_pitch=default_pitch)
+        if output_path is None:
+            return write_rows(rows=rows, file=sys.stdout, output_format=output_format)
+        with open(output_path, 'w', newline='') as file:
+            return write_rows(rows=rows, file=file, output_format=output_format)
+
+
+def main(argv: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('input', type=Path,
+                        help="GeoJSON FeatureCollection, or newline delimited GeoJSON (.geojsonl, .ndjson, .jsonl)")
+    parser.add_argument('--output', '-o', type=Path, default=None,
+                        help="CSV or JSONL file to write results to. Writes CSV to stdout if not given")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--window', type=int, default=None,
+                        help="Max chunks of features in flight at once. Defaults to 4 per worker")
+    parser.add_argument('--chunk-size', type=int, default=2000, help="Features per task sent to a worker")
+    parser.add_argument('--pitch', type=float, default=SolarConstants.ROOF_PITCH_DEGREES,
+                        help="Roof pitch in degrees, for features without a pitch property")
+    args = parser.parse_args(argv)
+    window = args.window if args.window is not None else 4 * args.workers
+    number_written = run(input_path=args.input, output_path=args.output, workers=args.workers, window=window,
+                         chunk_size=args.chunk_size, default_pitch=args.pitch)
+    print(f"Sized solar for {number_written} features", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,23 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 
+import profile_store
+
+_NOT_LOADED = object()
+
 
 @dataclass
 class Fuel:
     name: str
-    tco2_per_kwh: float  # could be a time series later
+    tco2_per_kwh: float  # annual average, used when there is no hourly data
     units: str = "kWh"
     converter_consumption_units_to_kwh: float = 1
+    # .npy file in a profile store directory with one value per hour of the base year. Loaded when first needed
+    hourly_tco2_per_kwh_file: Optional[Path] = field(default=None, repr=False, compare=False)
 
     def convert_kwh_to_fuel_units(self, value_kwh: [float | pd.Series | pd.DataFrame]):
         value_fuel_units = value_kwh / self.converter_consumption_units_to_kwh
@@ -18,6 +27,30 @@ class Fuel:
         value_kwh = value_fuel_units * self.converter_consumption_units_to_kwh
         return value_kwh
 
+    @property
+    def hourly_tco2_per_kwh(self) -> Optional[np.ndarray]:
+        """ Carbon intensity for each hour, or None to use the annual average. That is the default: hourly data is
+        only used if the fuel has a file and it has been made"""
+        loaded = self.__dict__.get('_hourly_tco2_per_kwh', _NOT_LOADED)
+        if loaded is _NOT_LOADED:
+            loaded = None
+            if self.hourly_tco2_per_kwh_file is not None and Path(self.hourly_tco2_per_kwh_file).exists():
+                path = Path(self.hourly_tco2_per_kwh_file)
+                loaded, _ = profile_store.load_profile(directory=path.parent, name=path.stem)
+            self._hourly_tco2_per_kwh = loaded
+        return loaded
+
     def calculate_annual_tco2(self, annual_sum_kwh: float) -> float:
         annual_tco2 = self.tco2_per_kwh * annual_sum_kwh
         return annual_tco2
+
+    def calculate_tco2(self, hourly_kwh: np.ndarray) -> float:
+        """ Hourly intensity times hourly consumption, so exports are credited at the intensity of the hour they
+        happen in. Uses the annual average if there is no hourly data"""
+        hourly_tco2_per_kwh = self.hourly_tco2_per_kwh
+        if hourly_tco2_per_kwh is None:
+            return self.calculate_annual_tco2(hourly_kwh.sum())
+        if len(hourly_tco2_per_kwh) != len(hourly_kwh):
+            raise ValueError(f"Hourly carbon intensity for {self.name} has {len(hourly_tco2_per_kwh)} hours but "
+                             f"consumption has {len(hourly_kwh)}")
+        return float(hourly_kwh @ hourly_tco2_per_kwh)
@@ -0,0 +1,39 @@
+""" Hourly heat pump COP from the outdoor temperature and the flow temperature the heat pump runs at.
+
+COP against outdoor temperature is worked out once for each flow temperature on a fixed grid of outdoor temperatures.
+Each evaluation after that is one interpolation over the hours of the year, so it is cheap enough to redo on every
+change to the heat pump settings."""
+
+from functools import cache
+
+import numpy as np
+
+import constants
+from constants import HeatPumpConstants
+
+
+def calculate_cop(flow_temperature_c: float, outdoor_temperature_c: np.ndarray) -> np.ndarray:
+    """ From the fitted curve. Outside the range of temperature differences it was fitted to, the COP at the nearest
+    end of the range is used"""
+    temperature_difference_c = np.clip(flow_temperature_c - np.asarray(outdoor_temperature_c, dtype=np.float64),
+                                       HeatPumpConstants.COP_MIN_TEMPERATURE_DIFFERENCE_C,
+                                       HeatPumpConstants.COP_MAX_TEMPERATURE_DIFFERENCE_C)
+    constant, linear, quadratic = HeatPumpConstants.COP_COEFFICIENTS
+    return constant + linear * temperature_difference_c + quadratic * temperature_difference_c ** 2
+
+
+@cache
+def get_cop_lookup_table(flow_temperature_c: float) -> np.ndarray:
+    """ COP at each outdoor temperature in HeatPumpConstants.OUTDOOR_TEMPERATURE_GRID_C"""
+    cop = calculate_cop(flow_temperature_c=flow_temperature_c,
+                        outdoor_temperature_c=np.array(HeatPumpConstants.OUTDOOR_TEMPERATURE_GRID_C))
+    cop.flags.writeable = False  # shared by everything using this flow temperature
+    return cop
+
+
+def calculate_hourly_cop(flow_temperature_c: float, outdoor_temperature_c: np.ndarray | None = None) -> np.ndarray:
+    """ COP for each hour. Uses the base year's outdoor temperatures if none are given"""
+    if outdoor_temperature_c is None:
+        outdoor_temperature_c = constants.load_hourly_outdoor_temperature().to_numpy()
+    return np.interp(outdoor_temperature_c, HeatPumpConstants.OUTDOOR_TEMPERATURE_GRID_C,
+                     get_cop_lookup_table(float(flow_temperature_c)))
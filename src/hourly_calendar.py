@@ -0,0 +1,75 @@
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+HOUR_NS = pd.Timedelta(hours=1).value
+
+
+class HourlyCalendar:
+    """ An hourly datetime index covering one whole year, validated once and then shared.
+
+    Use HourlyCalendar.from_index rather than the constructor so that every stream on the same year points at the same
+    interned instance and the index checks only run the first time that year is seen"""
+
+    _interned: Dict[Tuple, 'HourlyCalendar'] = {}
+
+    def __init__(self, index: pd.DatetimeIndex):
+        self.validate_index(index)
+        self.index = index
+        self.year = index.year[0]
+        self.hours_in_year = len(index)
+        self.days_in_year = self.hours_in_year / 24
+        self.leap_year = True if self.hours_in_year == 8760 + 24 else False
+
+    def __copy__(self):
+        return self  # interned and never modified, so copies of streams should keep pointing at the same calendar
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return HourlyCalendar.from_index, (self.index,)
+
+    @classmethod
+    def from_index(cls, index: pd.DatetimeIndex) -> 'HourlyCalendar':
+        """ Return the interned calendar for this index, validating and storing it if it hasn't been seen before"""
+        if not isinstance(index, pd.DatetimeIndex):
+            raise TypeError("hourly_profile_kwh index must be datetime")
+        if not cls.is_regular_hourly(index):
+            raise ValueError("hourly_profile_kwh index must be in order, one hour apart, with no gaps")
+        key = cls.make_key(index)
+        calendar = cls._interned.get(key)
+        if calendar is None:
+            calendar = cls(index=index)
+            cls._interned[key] = calendar
+        return calendar
+
+    @staticmethod
+    def make_key(index: pd.DatetimeIndex) -> Tuple:
+        """ Cheap to compute: a regular hourly index is fully defined by its first and last hour and its length"""
+        if len(index) == 0:
+            return ()
+        return index[0], index[-1], len(index)
+
+    @staticmethod
+    def is_regular_hourly(index: pd.DatetimeIndex) -> bool:
+        """ True if each timestamp is one hour after the one before. Uses the index's freq if it has one, so indexes
+        made with pd.date_range aren't scanned"""
+        if index.freq is not None and index.freq == pd.offsets.Hour(1):
+            return True
+        return bool((np.diff(index.asi8) == HOUR_NS).all())
+
+    @staticmethod
+    def validate_index(index: pd.DatetimeIndex):
+        """ Check index is of correct form"""
+        assert isinstance(index, pd.DatetimeIndex), "hourly_profile_kwh index must be datetime"
+        assert len(set(index.year)) == 1  # only one year
+        assert index.month[0] == 1
+        assert index.month[-1] == 12
+        assert index.day[0] == 1
+        assert index.day[-1] == 31
+        assert index.hour[0] == 0  # start at 0.00
+        assert index.hour[-1] == 23  # end at 23.00
+        assert len(index) == 8760 or len(index) == 8760 + 24
+        assert HourlyCalendar.is_regular_hourly(index)  # in order with no gaps or repeats
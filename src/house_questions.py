@@ -35,7 +35,6 @@ def render(house: House) -> House:
     if st.session_state.heating_fuel_changed:
         house.tariffs = update_tariffs_for_new_heating_fuel(heating_fuel=house.heating_system.fuel,
                                                             tariffs=house.tariffs)
-        house.clear_cached_properties()  # so that change in tariff flows through into cached properties
 
     house = render_house_assumptions_sidebar(house=house)
 
@@ -73,7 +72,6 @@ def render_building_envelope_questions(house: House) -> House:
                 envelope = BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS[house_type])
                 write_house_type_variables_to_session_state(envelope=envelope)
                 house.envelope = envelope
-                house.clear_cached_properties()  # so that change in envelope flows through into cached properties
                 write_heating_consumption_to_session_state(house)  # so change of house type changes consumption
                 st.session_state.upgrade_heating_system_cost_needs_resetting = True
                 st.session_state.baseline_heating_system_cost_needs_resetting = True
@@ -122,7 +120,6 @@ def render_heating_system_questions(house: House) -> House:
                                                               parameters=constants.DEFAULT_HEATING_CONSTANTS[name])
                 write_baseline_heating_system_to_session_state(heating_system=heating_system)
                 house.heating_system = heating_system
-                house.clear_cached_properties()
                 write_heating_consumption_to_session_state(house=house)
                 st.session_state.baseline_heating_system_cost_needs_resetting = True
 
@@ -188,7 +185,6 @@ def render_baseline_heating_system_overwrite_options(house: "House") -> "House":
 
     if st.session_state.baseline_heating_efficiency_changed:
         house.heating_system.efficiency = st.session_state.baseline_heating_efficiency
-        house.clear_cached_properties()
         write_heating_consumption_to_session_state(house)  # so change of heating efficiency changes consumption
         st.session_state.baseline_heating_efficiency_changed = False
 
@@ -224,7 +220,6 @@ def render_consumption_overwrite_options(house: 'House') -> House:
         print("Behaves as if heating demand changed")
         mult = st.session_state.annual_heating_consumption/int(house.heating_consumption.overall.annual_sum_fuel_units)
         house.envelope.annual_heating_demand = house.envelope.annual_heating_demand * mult
-        house.clear_cached_properties()  # so change in annual heating demand flows through to cached properties
         st.session_state.annual_heating_demand = int(house.envelope.annual_heating_demand)
         st.session_state.heating_demand_changed = False
 
@@ -240,7 +235,6 @@ def render_consumption_overwrite_options(house: 'House') -> House:
         print("Behaves as if base demand changed")
         multiplier = st.session_state.annual_base_demand / int(house.envelope.base_demand.sum())
         house.envelope.base_demand = house.envelope.base_demand * multiplier
-        house.clear_cached_properties()  # so change in base demand flows through to cached properties
         st.session_state.base_demand_changed = False
 
     typical_heat_demand = constants.BUILDING_TYPE_OPTIONS[house.envelope.house_type].annual_heat_demand_kWh
@@ -336,7 +330,6 @@ def render_tariff_overwrite_options(house: House) -> House:
 
     if st.session_state.tariff_changed:
         house.tariffs = tariffs
-        house.clear_cached_properties()
         st.session_state.tariff_changed = False
 
     return house
@@ -0,0 +1,164 @@
+""" Lay out panels on a roof polygon of any shape, including concave ones, mixing portrait and landscape rows.
+
+The roof is drawn in plan, so it is first turned so its longest side (taken to be the eaves) runs along x, and
+stretched up the slope by the pitch. Then it is rasterised onto a grid of small cells. A summed area table of the
+cells on the roof says in one lookup whether a panel and the border around it fit at any position.
+
+Panels go in rows parallel to the eaves. Each row is either portrait or landscape, and is filled from the left taking
+each panel at the first position it fits. Which rows to use, and at what heights, is picked by dynamic programming
+over the rows of cells, from the top of the roof down.
+
+Layouts are memoised by the shape of the polygon and the pitch, so redrawing the page doesn't repeat the packing."""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from constants import SolarConstants
+
+
+@dataclass(frozen=True)
+class PanelLayout:
+    """ Positions in metres along the eaves (x) and up the slope (y) of the roof, once turned and stretched"""
+    roof_outline: np.ndarray  # (points, 2)
+    panels: np.ndarray  # (panels, 4): x, y of the bottom left corner, width, height
+    border: float
+
+    @property
+    def number_of_panels(self) -> int:
+        return len(self.panels)
+
+    @property
+    def number_in_portrait(self) -> int:
+        return int(np.sum(self.panels[:, 3] > self.panels[:, 2]))
+
+
+def make_panel_layout(dimensions: Sequence[Tuple[float, float]], pitch: float) -> PanelLayout:
+    """ dimensions are the plan points of the roof in metres, as in Polygon.dimensions"""
+    key = tuple((round(north, 3), round(east, 3)) for north, east in dimensions)
+    return _make_panel_layout(key, float(pitch))
+
+
+@lru_cache(maxsize=SolarConstants.PANEL_LAYOUT_CACHE_ENTRIES)
+def _make_panel_layout(dimensions: Tuple[Tuple[float, float], ...], pitch: float) -> PanelLayout:
+    outline = convert_plan_to_roof_outline(np.array(dimensions, dtype=np.float64).reshape(-1, 2), pitch=pitch)
+    roof_height = outline[:, 1].max() - outline[:, 1].min() if len(outline) else 0
+    # Typically, installers leave a bigger border on big roofs. Increase border if fit more than 2 rows height-wise
+    if roof_height >= 2 * (SolarConstants.SMALL_PANEL_BORDER_M + SolarConstants.PANEL_HEIGHT_M):
+        border = SolarConstants.BIG_PANEL_BORDER_M
+    else:
+        border = SolarConstants.SMALL_PANEL_BORDER_M
+    panels = pack_panels(outline=outline, border=border)
+    for array in (outline, panels):
+        array.flags.writeable = False  # shared by every caller with the same polygon
+    return PanelLayout(roof_outline=outline, panels=panels, border=border)
+
+
+def convert_plan_to_roof_outline(dimensions: np.ndarray, pitch: float) -> np.ndarray:
+    """ (points, 2) x along the longest side, y up the slope, from north, east plan points"""
+    if len(dimensions) < 3:
+        return np.zeros((0, 2))
+    east_north = dimensions[:, ::-1]
+    sides = east_north - np.roll(east_north, 1, axis=0)
+    longest = sides[np.argmax(np.hypot(sides[:, 0], sides[:, 1]))]
+    angle = np.arctan2(longest[1], longest[0])
+    rotation = np.array([[np.cos(angle), np.sin(angle)], [-np.sin(angle), np.cos(angle)]])
+    outline = east_north @ rotation.T
+    outline[:, 1] /= np.cos(np.radians(pitch))
+    return outline - outline.min(axis=0)
+
+
+def rasterise(outline: np.ndarray, resolution: float) -> np.ndarray:
+    """ (rows, columns) True for cells whose centres are inside the outline"""
+    width, height = outline.max(axis=0)
+    x = (np.arange(int(np.ceil(width / resolution))) + 0.5) * resolution
+    y = (np.arange(int(np.ceil(height / resolution))) + 0.5) * resolution
+
+    # Even-odd rule: count the edges crossed by a line from each cell in the +x direction
+    start = np.roll(outline, 1, axis=0)
+    end = outline
+    crosses = (start[:, 1] > y[:, np.newaxis]) != (end[:, 1] > y[:, np.newaxis])  # (rows, edges)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing_x = start[:, 0] + ((y[:, np.newaxis] - start[:, 1]) * (end[:, 0] - start[:, 0])
+                                    / (end[:, 1] - start[:, 1]))
+    crossing_x = np.where(crosses, crossing_x, -np.inf)
+    return np.sum(x[:, np.newaxis] < crossing_x[:, np.newaxis, :], axis=-1) % 2 == 1
+
+
+def find_fits(usable: np.ndarray, panel_columns: int, panel_rows: int) -> np.ndarray:
+    """ (rows, columns) True where a panel with its bottom left corner in that cell covers only usable cells"""
+    rows, columns = usable.shape
+    fits = np.zeros(usable.shape, dtype=bool)
+    if panel_rows > rows or panel_columns > columns:
+        return fits
+    summed = np.zeros((rows + 1, columns + 1), dtype=np.int64)
+    summed[1:, 1:] = usable.cumsum(axis=0).cumsum(axis=1)
+    covered = (summed[panel_rows:, panel_columns:] - summed[:-panel_rows, panel_columns:]
+               - summed[panel_rows:, :-panel_columns] + summed[:-panel_rows, :-panel_columns])
+    fits[:rows - panel_rows + 1, :columns - panel_columns + 1] = covered == panel_rows * panel_columns
+    return fits
+
+
+def fill_rows(fits: np.ndarray, panel_columns: int) -> list:
+    """ Columns of the panels in each row, taking each panel at the first column it fits from the left"""
+    columns = fits.shape[1]
+    # Index of the first column at or after each column that a panel fits at, or columns if there isn't one
+    next_fit = np.where(fits, np.arange(columns), columns)
+    next_fit = np.minimum.accumulate(next_fit[:, ::-1], axis=1)[:, ::-1]
+    next_fit = np.append(next_fit, np.full((len(fits), panel_columns + 1), columns), axis=1).tolist()
+    rows = []
+    for row_next_fit in next_fit:
+        placed = []
+        column = row_next_fit[0]
+        while column < columns:
+            placed.append(column)
+            column = row_next_fit[column + panel_columns]
+        rows.append(placed)
+    return rows
+
+
+def pack_panels(outline: np.ndarray, border: float,
+                resolution: float = SolarConstants.PANEL_LAYOUT_RESOLUTION_M) -> np.ndarray:
+    """ (panels, 4) x, y, width, height of each panel"""
+    if len(outline) < 3:
+        return np.zeros((0, 4))
+    inside = rasterise(outline, resolution=resolution)
+    # Round panels and borders up to whole cells, so panels never overlap or go past the border
+    border_cells = int(np.ceil(border / 2 / resolution - 1e-9))  # border is the total gap across the roof
+    orientations = [(SolarConstants.PANEL_WIDTH_M, SolarConstants.PANEL_HEIGHT_M),  # portrait
+                    (SolarConstants.PANEL_HEIGHT_M, SolarConstants.PANEL_WIDTH_M)]  # landscape
+    row_options = []
+    for panel_width, panel_height in orientations:
+        panel_columns = int(np.ceil(panel_width / resolution - 1e-9))
+        panel_rows = int(np.ceil(panel_height / resolution - 1e-9))
+        # A panel fits where it and the border all round it are on the roof. Index by the panel's corner, not the
+        # border's
+        fits = find_fits(inside, panel_columns=panel_columns + 2 * border_cells,
+                         panel_rows=panel_rows + 2 * border_cells)
+        fits = np.pad(fits, ((border_cells, 0), (border_cells, 0)))[:len(fits), :fits.shape[1]]
+        placed = fill_rows(fits, panel_columns=panel_columns)
+        row_options.append((panel_rows, placed, panel_width, panel_height))
+
+    # best[row] is the most panels that fit in the rows of cells from row up
+    number_of_rows = len(inside)
+    best = [0] * (number_of_rows + max(option[0] for option in row_options) + 1)
+    choice = [None] * number_of_rows
+    for row in range(number_of_rows - 1, -1, -1):
+        best[row] = best[row + 1]
+        for i, (panel_rows, placed, _, _) in enumerate(row_options):
+            if placed[row] and len(placed[row]) + best[row + panel_rows] > best[row]:
+                best[row] = len(placed[row]) + best[row + panel_rows]
+                choice[row] = i
+
+    panels = []
+    row = 0
+    while row < number_of_rows:
+        if choice[row] is None:
+            row += 1
+            continue
+        panel_rows, placed, panel_width, panel_height = row_options[choice[row]]
+        panels += [(column * resolution, row * resolution, panel_width, panel_height) for column in placed[row]]
+        row += panel_rows
+    return np.array(panels, dtype=np.float64).reshape(-1, 4)
@@ -0,0 +1,131 @@
+""" Savings, self use, exports and payback for every number of panels from 0 up to a maximum, e.g. for a sizing curve.
+
+Generation is linear in the number of panels, so the install's profile per kWp is fetched once and scaled into a
+panels x hours matrix. Imports, exports, bills and carbon for every panel count then come out of one pass of array
+operations rather than one House evaluation each."""
+
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+import constants
+from building_model import House
+from constants import SolarConstants
+from scenarios import calculate_weighted_sums
+
+
+@dataclass
+class PanelSweep:
+    """ One value per number of panels. Savings are compared with the same house with no panels"""
+    number_of_panels: np.ndarray
+    capacity_kwp: np.ndarray
+    solar_generation_kwh: np.ndarray
+    electricity_imported_kwh: np.ndarray
+    electricity_exported_kwh: np.ndarray
+    percent_self_use_of_solar: np.ndarray
+    total_annual_bill: np.ndarray
+    total_annual_tco2: np.ndarray
+    solar_upfront_cost: np.ndarray
+
+    @property
+    def bill_savings(self) -> np.ndarray:
+        return self.total_annual_bill[0] - self.total_annual_bill
+
+    @property
+    def carbon_savings(self) -> np.ndarray:
+        return self.total_annual_tco2[0] - self.total_annual_tco2
+
+    @property
+    def simple_payback(self) -> np.ndarray:
+        """ Years for the bill savings to cover the cost of the panels. Nan where there are no savings"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.bill_savings > 0, self.solar_upfront_cost / self.bill_savings, np.nan)
+
+    def to_df(self) -> pd.DataFrame:
+        return pd.DataFrame({'number_of_panels': self.number_of_panels,
+                             'capacity_kwp': self.capacity_kwp,
+                             'solar_generation_kwh': self.solar_generation_kwh,
+                             'electricity_imported_kwh': self.electricity_imported_kwh,
+                             'electricity_exported_kwh': self.electricity_exported_kwh,
+                             'percent_self_use_of_solar': self.percent_self_use_of_solar,
+                             'total_annual_bill': self.total_annual_bill,
+                             'bill_savings': self.bill_savings,
+                             'carbon_savings_tco2': self.carbon_savings,
+                             'solar_upfront_cost': self.solar_upfront_cost,
+                             'simple_payback_years': self.simple_payback}).set_index('number_of_panels')
+
+
+def sweep_number_of_panels(house: House, max_number_of_panels: Optional[int] = None) -> PanelSweep:
+    """ The house with 0, 1, ... max_number_of_panels panels of its solar install, with all its other components
+    unchanged. Defaults to up to the install's current number of panels"""
+    solar_install = house.solar_install
+    if max_number_of_panels is None:
+        max_number_of_panels = solar_install.number_of_panels
+    number_of_panels = np.arange(max_number_of_panels + 1)
+    capacity_kwp = number_of_panels * solar_install.kwp_per_panel
+
+    electricity_pre_solar = house.base_consumption.overall.values
+    if house.heating_system.fuel.name == 'electricity':
+        electricity_pre_solar = electricity_pre_solar + house.heating_consumption.overall.values
+    if max_number_of_panels > 0:
+        generation_per_kwp = solar_install.get_hourly_generation_per_kwp()
+    else:  # no need to fetch a profile
+        generation_per_kwp = np.zeros(len(electricity_pre_solar))
+    # panels x hours. Imports positive, exports negative
+    generation = - capacity_kwp[:, np.newaxis] * generation_per_kwp
+    electricity = electricity_pre_solar + generation
+    if house.battery is not None:
+        for i in range(len(electricity)):
+            electricity[i] = house.battery.dispatch(net_kwh=electricity[i]).net_kwh
+
+    hourly_imported = np.where(electricity < 0, 0.0, electricity)
+    hourly_exported = np.where(electricity > 0, 0.0, electricity) * -1
+    imported = hourly_imported.sum(axis=1)
+    exported = hourly_exported.sum(axis=1)
+    solar_generation_kwh = - generation.sum(axis=1)
+
+    tariff = house.tariffs['electricity']
+    import_cost_p = calculate_weighted_sums(
+        hourly_units=tariff.fuel.convert_kwh_to_fuel_units(hourly_imported),
+        annual_units=tariff.fuel.convert_kwh_to_fuel_units(imported),
+        per_unit=np.full(len(number_of_panels), tariff.p_per_unit_import),
+        hourly_per_unit=[tariff.hourly_p_per_unit_import] * len(number_of_panels))
+    export_cost_p = calculate_weighted_sums(
+        hourly_units=tariff.fuel.convert_kwh_to_fuel_units(hourly_exported),
+        annual_units=tariff.fuel.convert_kwh_to_fuel_units(exported),
+        per_unit=np.full(len(number_of_panels), tariff.p_per_unit_export),
+        hourly_per_unit=[tariff.hourly_p_per_unit_export] * len(number_of_panels))
+    electricity_bill = (house.base_consumption.overall.days_in_year * tariff.p_per_day + import_cost_p
+                        - export_cost_p) / 100
+
+    hourly_tco2_per_kwh = constants.ELECTRICITY.hourly_tco2_per_kwh
+    if hourly_tco2_per_kwh is None:
+        electricity_tco2 = constants.ELECTRICITY.tco2_per_kwh * electricity.sum(axis=1)
+    else:
+        electricity_tco2 = electricity @ hourly_tco2_per_kwh
+    # Solar doesn't change the heating fuel use, so its bill and carbon are the same for every number of panels
+    other_fuels_bill = sum(bill for fuel_name, bill in house.annual_bill_per_fuel.items() if fuel_name != 'electricity')
+    other_fuels_tco2 = sum(tco2 for fuel_name, tco2 in house.annual_tco2_per_fuel.items() if fuel_name != 'electricity')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        self_use = np.where(solar_generation_kwh > 0,
+                            (electricity_pre_solar.sum() - imported) / solar_generation_kwh, 0.0)
+
+    return PanelSweep(number_of_panels=number_of_panels,
+                      capacity_kwp=capacity_kwp,
+                      solar_generation_kwh=solar_generation_kwh,
+                      electricity_imported_kwh=imported,
+                      electricity_exported_kwh=exported,
+                      percent_self_use_of_solar=self_use,
+                      total_annual_bill=electricity_bill + other_fuels_bill,
+                      total_annual_tco2=electricity_tco2 + other_fuels_tco2,
+                      solar_upfront_cost=calculate_solar_upfront_cost(capacity_kwp))
+
+
+def calculate_solar_upfront_cost(capacity_kwp: np.ndarray) -> np.ndarray:
+    """ Same as Solar.upfront_cost, for many capacities at once"""
+    cost_per_kwp = np.where(capacity_kwp <= 4, SolarConstants.COST_PER_KWP_LESS_THAN_4_KW,
+                            SolarConstants.COST_PER_KWP_MORE_THAN_4_KW)
+    return np.round(capacity_kwp * cost_per_kwp, -2).astype(int)
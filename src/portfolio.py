@@ -0,0 +1,149 @@
+""" Hourly totals across a portfolio of homes, for the peak impact of upgrades on the network.
+
+Each home's hourly profiles are added into fixed length buffers as it is evaluated and then dropped, so memory use is
+the same for ten homes or twenty thousand. Aggregators from different worker processes can be merged."""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+import constants
+from building_model import House
+from hourly_calendar import HourlyCalendar
+
+
+@dataclass
+class PortfolioSummary:
+    scenario: str
+    number_of_homes: int
+    peak_import_kw: float
+    peak_import_time: str
+    peak_export_kw: float  # coincident: the most exported at the same moment across all homes
+    peak_export_time: str
+    sum_of_individual_peak_imports_kw: float
+    annual_import_kwh: float
+    annual_export_kwh: float
+    annual_heating_fuel_kwh: Dict[str, float]
+
+    @property
+    def diversity_factor(self) -> float:
+        """ How much lower the portfolio peak is than if every home peaked at the same time"""
+        if self.peak_import_kw == 0:
+            return np.nan
+        return self.sum_of_individual_peak_imports_kw / self.peak_import_kw
+
+
+class ScenarioTotals:
+    """ Running hourly totals for one scenario"""
+
+    def __init__(self, hours_in_year: int):
+        self.number_of_homes = 0
+        self.imported = np.zeros(hours_in_year)
+        self.exported = np.zeros(hours_in_year)
+        self.heating_fuel: Dict[str, np.ndarray] = {}  # fuels other than electricity, kWh
+        self.sum_of_individual_peak_imports = 0.0
+
+    def add(self, imported: np.ndarray, exported: np.ndarray, heating_fuel: Dict[str, np.ndarray]):
+        self.number_of_homes += 1
+        self.imported += imported
+        self.exported += exported
+        self.sum_of_individual_peak_imports += imported.max()
+        for fuel_name, values in heating_fuel.items():
+            if fuel_name not in self.heating_fuel:
+                self.heating_fuel[fuel_name] = np.zeros(len(self.imported))
+            self.heating_fuel[fuel_name] += values
+
+    def merge(self, other: 'ScenarioTotals'):
+        self.number_of_homes += other.number_of_homes
+        self.imported += other.imported
+        self.exported += other.exported
+        self.sum_of_individual_peak_imports += other.sum_of_individual_peak_imports
+        for fuel_name, values in other.heating_fuel.items():
+            if fuel_name not in self.heating_fuel:
+                self.heating_fuel[fuel_name] = np.zeros(len(self.imported))
+            self.heating_fuel[fuel_name] += values
+
+
+class PortfolioAggregator:
+
+    def __init__(self, calendar: HourlyCalendar = constants.BASE_YEAR_CALENDAR):
+        self.calendar = calendar
+        self.totals: Dict[str, ScenarioTotals] = {}
+
+    @property
+    def scenarios(self) -> List[str]:
+        return list(self.totals.keys())
+
+    def scenario_totals(self, scenario: str) -> ScenarioTotals:
+        if scenario not in self.totals:
+            self.totals[scenario] = ScenarioTotals(hours_in_year=self.calendar.hours_in_year)
+        return self.totals[scenario]
+
+    def add_house(self, scenario: str, house: House):
+        """ Add the house's hourly imports, exports and heating fuel use to the totals for the scenario"""
+        consumption_per_fuel = house.consumption_per_fuel
+        electricity = consumption_per_fuel['electricity']
+        heating_fuel = {fuel_name: consumption.overall.values
+                        for fuel_name, consumption in consumption_per_fuel.items() if fuel_name != 'electricity'}
+        self.scenario_totals(scenario).add(imported=electricity.imported.values,
+                                           exported=electricity.exported.values,
+                                           heating_fuel=heating_fuel)
+
+    def add_houses(self, houses: Dict[str, House]):
+        for scenario, house in houses.items():
+            self.add_house(scenario=scenario, house=house)
+
+    def merge(self, other: 'PortfolioAggregator'):
+        """ Add in totals from another aggregator, e.g. one filled in a different worker process"""
+        if other.calendar is not self.calendar:
+            raise ValueError("Can only merge aggregators on the same calendar")
+        for scenario, totals in other.totals.items():
+            self.scenario_totals(scenario).merge(totals)
+
+    @classmethod
+    def merge_all(cls, aggregators: Iterable['PortfolioAggregator']) -> 'PortfolioAggregator':
+        combined = cls()
+        for aggregator in aggregators:
+            combined.merge(aggregator)
+        return combined
+
+    def summary(self, scenario: str) -> PortfolioSummary:
+        totals = self.totals[scenario]
+        index = self.calendar.index
+        peak_import_hour = int(totals.imported.argmax())
+        peak_export_hour = int(totals.exported.argmax())
+        return PortfolioSummary(scenario=scenario,
+                                number_of_homes=totals.number_of_homes,
+                                peak_import_kw=float(totals.imported[peak_import_hour]),
+                                peak_import_time=str(index[peak_import_hour]),
+                                peak_export_kw=float(totals.exported[peak_export_hour]),
+                                peak_export_time=str(index[peak_export_hour]),
+                                sum_of_individual_peak_imports_kw=float(totals.sum_of_individual_peak_imports),
+                                annual_import_kwh=float(totals.imported.sum()),
+                                annual_export_kwh=float(totals.exported.sum()),
+                                annual_heating_fuel_kwh={fuel_name: float(values.sum())
+                                                         for fuel_name, values in totals.heating_fuel.items()})
+
+    def load_duration_curve(self, scenario: str, net: bool = False) -> np.ndarray:
+        """ Hourly import (or import minus export if net) across the portfolio, sorted from highest to lowest"""
+        totals = self.totals[scenario]
+        values = totals.imported - totals.exported if net else totals.imported
+        return np.sort(values)[::-1]
+
+    def load_duration_curves_df(self, net: bool = False) -> pd.DataFrame:
+        df = pd.DataFrame({scenario: self.load_duration_curve(scenario=scenario, net=net)
+                           for scenario in self.scenarios})
+        df.index.name = 'hours_exceeded'
+        return df
+
+    def hourly_totals_df(self) -> pd.DataFrame:
+        """ One column per scenario and stream, e.g. 'Heat pump electricity imports'"""
+        columns = {}
+        for scenario, totals in self.totals.items():
+            columns[f'{scenario} electricity imports'] = totals.imported
+            columns[f'{scenario} electricity exports'] = totals.exported
+            for fuel_name, values in totals.heating_fuel.items():
+                columns[f'{scenario} {fuel_name}'] = values
+        return pd.DataFrame(columns, index=self.calendar.index)
@@ -0,0 +1,91 @@
+""" Hourly profiles stored as .npy arrays with a JSON manifest, so they can be memory mapped.
+
+Each profile is one .npy file of shape (hours,) or (hours, columns), or for gridded data any shape with hours last so
+each cell's hours are contiguous. The manifest records the format version, the
+sha256 of each file, and the metadata needed to rebuild the pandas object (series name or column names). Mapped
+arrays are read only and backed by the page cache, so several worker processes on one host share the same pages.
+
+Checksums are written by the data prep scripts and checked by verify_profiles in the tests. Loading only checks the
+shape and dtype, as hashing would read the whole file in every process that maps it"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MANIFEST_FILENAME = 'manifest.json'
+
+
+class ProfileStoreError(Exception):
+    pass
+
+
+def sha256_of_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(directory: Path) -> Dict:
+    manifest_path = Path(directory) / MANIFEST_FILENAME
+    if not manifest_path.exists():
+        return {'format_version': FORMAT_VERSION, 'profiles': {}}
+    manifest = json.loads(manifest_path.read_text())
+    if manifest['format_version'] != FORMAT_VERSION:
+        raise ProfileStoreError(f"Profiles in {directory} are format version {manifest['format_version']}, "
+                                f"expected {FORMAT_VERSION}. Rerun the data prep scripts")
+    return manifest
+
+
+def save_profile(directory: Path, name: str, values: np.ndarray, start: str,
+                 series_name: Optional[str] = None, columns: Optional[List[str]] = None):
+    """ Write values to <directory>/<name>.npy and record it in the manifest"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if columns is not None and (values.ndim != 2 or values.shape[1] != len(columns)):
+        raise ValueError("values must have one column per column name")
+
+    filename = f"{name}.npy"
+    np.save(directory / filename, values)
+    manifest = read_manifest(directory)
+    manifest['profiles'][name] = {'file': filename,
+                                  'sha256': sha256_of_file(directory / filename),
+                                  'shape': list(values.shape),
+                                  'start': start,
+                                  'series_name': series_name,
+                                  'columns': columns}
+    (directory / MANIFEST_FILENAME).write_text(json.dumps(manifest, indent=2) + '\n')
+
+
+def load_profile(directory: Path, name: str, verify: bool = False) -> tuple[np.ndarray, Dict]:
+    """ Memory mapped, read only array and its manifest entry. verify also checks the file's checksum, which means
+    reading all of it"""
+    directory = Path(directory)
+    entry = read_manifest(directory)['profiles'].get(name)
+    if entry is None:
+        raise ProfileStoreError(f"No profile called {name} in {directory}")
+    path = directory / entry['file']
+    if verify:
+        verify_checksum(path=path, entry=entry)
+    values = np.load(path, mmap_mode='r')
+    if list(values.shape) != entry['shape'] or values.dtype != np.float64:
+        raise ProfileStoreError(f"Shape or dtype of {path} doesn't match the manifest")
+    return values, entry
+
+
+def verify_checksum(path: Path, entry: Dict):
+    if sha256_of_file(path) != entry['sha256']:
+        raise ProfileStoreError(f"Checksum of {path} doesn't match the manifest")
+
+
+def verify_profiles(directory: Path):
+    """ Check every file in the manifest against its checksum"""
+    directory = Path(directory)
+    for entry in read_manifest(directory)['profiles'].values():
+        verify_checksum(path=directory / entry['file'], entry=entry)
@@ -0,0 +1,186 @@
+""" Persistent store of hourly PV generation profiles for a 1 kWp system.
+
+PVGIS output is linear in the installed capacity, so one profile per location and roof geometry covers any number of
+panels: generation is the stored profile times the capacity in kWp. Profiles are kept in a SQLite file so they survive
+restarts and are shared by all worker processes on a host, with a small in-memory layer in front for repeat reads
+within a process. The least recently used profiles are evicted once the file goes over its size limit. Reads from
+memory update the last used time on disk at most once per touch interval, so popular profiles aren't evicted first
+without a write on every read."""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from constants import SolarConstants
+
+ProfileKey = Tuple[float, float, float, float, float, int]
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size_bytes: int
+
+
+def make_key(latitude: float, longitude: float, pitch: float, aspect: float,
+             loss: float = SolarConstants.SYSTEM_LOSS, year: int = SolarConstants.API_YEAR) -> ProfileKey:
+    """ Round so that nearby points share a profile. The rounded values are also the ones sent to the API, so the
+    stored profile is exactly what a request for the key returns"""
+    return (round(latitude, SolarConstants.PV_CACHE_LAT_LNG_DECIMAL_PLACES),
+            round(longitude, SolarConstants.PV_CACHE_LAT_LNG_DECIMAL_PLACES),
+            round(pitch, 1),
+            round(aspect, 1),
+            round(loss, 1),
+            int(year))
+
+
+class PVProfileCache:
+
+    def __init__(self, path: Path | str, max_bytes: int = SolarConstants.PV_CACHE_MAX_BYTES,
+                 memory_entries: int = SolarConstants.PV_CACHE_MEMORY_ENTRIES,
+                 touch_interval_seconds: float = SolarConstants.PV_CACHE_TOUCH_INTERVAL_SECONDS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.touch_interval_seconds = touch_interval_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._memory: OrderedDict[ProfileKey, np.ndarray] = OrderedDict()
+        self._last_touched: Dict[ProfileKey, float] = {}  # when last_used was last written, for keys in memory
+        self._lock = threading.RLock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")  # lets several processes read while one writes
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS profiles (
+                                        latitude REAL, longitude REAL, pitch REAL, aspect REAL, loss REAL,
+                                        year INTEGER, profile BLOB NOT NULL, size_bytes INTEGER NOT NULL,
+                                        last_used REAL NOT NULL,
+                                        PRIMARY KEY (latitude, longitude, pitch, aspect, loss, year))""")
+
+    def get(self, key: ProfileKey) -> Optional[np.ndarray]:
+        """ Hourly kW per kWp installed, or None if not stored. Counts as a hit or a miss"""
+        with self._lock:
+            profile = self._get_from_memory(key)
+            if profile is None:
+                profile = self._get_from_disk(key)
+            if profile is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return profile
+
+    def put(self, key: ProfileKey, profile_kw_per_kwp: np.ndarray) -> np.ndarray:
+        profile = np.ascontiguousarray(profile_kw_per_kwp, dtype=np.float64)
+        profile.flags.writeable = False  # shared by every caller that gets it
+        blob = profile.tobytes()
+        now = time.time()
+        with self._lock:
+            self._connection.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     (*key, blob, len(blob), now))
+            self._remember(key, profile, touched=now)
+            self.evict()
+        return profile
+
+    def get_or_fetch(self, key: ProfileKey, fetch: Callable[[], np.ndarray]) -> np.ndarray:
+        """ Stored profile if there is one, otherwise fetch it, store it and return it"""
+        profile = self.get(key)
+        if profile is None:
+            profile = self.put(key, fetch())
+        return profile
+
+    def evict(self):
+        """ Drop least recently used profiles until the store is within its size limit"""
+        with self._lock:
+            size_bytes = self.size_bytes
+            if size_bytes <= self.max_bytes:
+                return
+            rows = self._connection.execute("SELECT latitude, longitude, pitch, aspect, loss, year, size_bytes "
+                                            "FROM profiles ORDER BY last_used ASC").fetchall()
+            for *key, row_bytes in rows:
+                if size_bytes <= self.max_bytes:
+                    break
+                self._connection.execute("DELETE FROM profiles WHERE latitude = ? AND longitude = ? AND pitch = ? "
+                                         "AND aspect = ? AND loss = ? AND year = ?", key)
+                self._forget(tuple(key))
+                size_bytes -= row_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM profiles")
+            self._memory.clear()
+            self._last_touched.clear()
+
+    @property
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM profiles").fetchone()[0]
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+            return CacheInfo(hits=self.hits, misses=self.misses, evictions=self.evictions, entries=entries,
+                             size_bytes=self.size_bytes)
+
+    def _get_from_memory(self, key: ProfileKey) -> Optional[np.ndarray]:
+        profile = self._memory.get(key)
+        if profile is not None:
+            self._memory.move_to_end(key)
+            if time.time() - self._last_touched.get(key, 0) >= self.touch_interval_seconds:
+                self._touch(key)
+        return profile
+
+    def _get_from_disk(self, key: ProfileKey) -> Optional[np.ndarray]:
+        row = self._connection.execute("SELECT profile FROM profiles WHERE latitude = ? AND longitude = ? "
+                                       "AND pitch = ? AND aspect = ? AND loss = ? AND year = ?", key).fetchone()
+        if row is None:
+            return None
+        profile = np.frombuffer(row[0], dtype=np.float64)  # read only because it is a view of the bytes
+        self._remember(key, profile, touched=self._touch(key))
+        return profile
+
+    def _touch(self, key: ProfileKey) -> float:
+        now = time.time()
+        self._connection.execute("UPDATE profiles SET last_used = ? WHERE latitude = ? AND longitude = ? "
+                                 "AND pitch = ? AND aspect = ? AND loss = ? AND year = ?", (now, *key))
+        self._last_touched[key] = now
+        return now
+
+    def _remember(self, key: ProfileKey, profile: np.ndarray, touched: float):
+        self._memory[key] = profile
+        self._memory.move_to_end(key)
+        self._last_touched[key] = touched
+        while len(self._memory) > self.memory_entries:
+            self._forget(next(iter(self._memory)))
+
+    def _forget(self, key: ProfileKey):
+        self._memory.pop(key, None)
+        self._last_touched.pop(key, None)
+
+
+_default_cache: Optional[PVProfileCache] = None
+
+
+def get_default_cache() -> PVProfileCache:
+    """ Process-wide cache, stored at the PV_PROFILE_CACHE_PATH environment variable if set"""
+    global _default_cache
+    if _default_cache is None:
+        path = os.environ.get("PV_PROFILE_CACHE_PATH", SolarConstants.PV_CACHE_DEFAULT_PATH)
+        _default_cache = PVProfileCache(path=path)
+    return _default_cache
+
+
+def set_default_cache(cache: PVProfileCache):
+    global _default_cache
+    _default_cache = cache
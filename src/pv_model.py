@@ -0,0 +1,192 @@
+""" Local alternative to PVGIS: hourly PV generation per kWp calculated with NumPy from a gridded irradiance dataset.
+
+The steps are the standard ones: sun position for each hour, transposition of the horizontal beam and diffuse
+irradiance onto the roof plane (isotropic sky), then temperature and system losses. All orientations for a location
+are calculated in one set of array operations, with the sun position computed once and shared. Sun positions and
+profiles are memoised, so asking again for a location or key doesn't repeat the calculation."""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import profile_store
+import pv_cache
+from constants import SolarConstants
+from pv_cache import ProfileKey
+
+
+IRRADIANCE_DATASET_ARRAYS = ('latitudes', 'longitudes', 'ghi', 'dni', 'dhi', 'temp_air')
+
+
+@dataclass
+class IrradianceDataset:
+    """ Hourly values for each cell of a lat/lng grid. Irradiance arrays are W/m2 with shape
+    (len(latitudes), len(longitudes), hours in year). Hours are UTC and start on 1st Jan of year"""
+    year: int
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    ghi: np.ndarray  # global horizontal irradiance
+    dni: np.ndarray  # direct normal irradiance
+    dhi: np.ndarray  # diffuse horizontal irradiance
+    temp_air: np.ndarray  # air temperature at 2m, C
+
+    @classmethod
+    def from_profile_store(cls, directory: Path | str = SolarConstants.IRRADIANCE_DATASET_DIRECTORY
+                           ) -> 'IrradianceDataset':
+        """ Memory mapped, so each process only reads the cells it uses and the pages are shared between processes"""
+        directory = Path(directory)
+        if 'ghi' not in profile_store.read_manifest(directory)['profiles']:
+            raise FileNotFoundError(f"No irradiance dataset in {directory}, which PV_BACKEND=local needs. Make it "
+                                    f"with data_exploration_and_prep/prep_irradiance_dataset.py")
+        arrays = {}
+        for name in IRRADIANCE_DATASET_ARRAYS:
+            arrays[name], entry = profile_store.load_profile(directory=directory, name=name)
+        return cls(year=pd.Timestamp(entry['start']).year, **arrays)
+
+    def nearest_cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        return int(np.abs(self.latitudes - latitude).argmin()), int(np.abs(self.longitudes - longitude).argmin())
+
+
+@lru_cache(maxsize=SolarConstants.PV_CACHE_MEMORY_ENTRIES)
+def solar_position(latitude: float, longitude: float, hours_in_year: int) -> tuple[np.ndarray, np.ndarray]:
+    """ Sun zenith and azimuth in radians at the middle of each hour. Azimuth is measured from south, with west
+    positive, to match the aspect convention of PVGIS and Orientation. Uses the NOAA approximations, which are
+    within about a degree. Memoised, so the arrays are read only"""
+    hours = np.arange(hours_in_year) + 0.5
+    days_in_year = 366 if hours_in_year > 8760 else 365
+    fractional_year = 2 * np.pi / days_in_year * (hours / 24)
+
+    equation_of_time_min = 229.18 * (0.000075 + 0.001868 * np.cos(fractional_year)
+                                     - 0.032077 * np.sin(fractional_year)
+                                     - 0.014615 * np.cos(2 * fractional_year)
+                                     - 0.040849 * np.sin(2 * fractional_year))
+    declination = (0.006918 - 0.399912 * np.cos(fractional_year) + 0.070257 * np.sin(fractional_year)
+                   - 0.006758 * np.cos(2 * fractional_year) + 0.000907 * np.sin(2 * fractional_year)
+                   - 0.002697 * np.cos(3 * fractional_year) + 0.00148 * np.sin(3 * fractional_year))
+
+    solar_time_min = (hours % 24) * 60 + equation_of_time_min + 4 * longitude
+    hour_angle = np.radians(solar_time_min / 4 - 180)
+
+    lat = np.radians(latitude)
+    cos_zenith = np.sin(lat) * np.sin(declination) + np.cos(lat) * np.cos(declination) * np.cos(hour_angle)
+    zenith = np.arccos(np.clip(cos_zenith, -1, 1))
+    azimuth = np.arctan2(np.sin(hour_angle),
+                         np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat))
+    for array in (zenith, azimuth):
+        array.flags.writeable = False
+    return zenith, azimuth
+
+
+def plane_of_array_irradiance(zenith: np.ndarray, azimuth: np.ndarray, ghi: np.ndarray, dni: np.ndarray,
+                              dhi: np.ndarray, pitch: float, aspects: np.ndarray) -> np.ndarray:
+    """ Irradiance on the panel in W/m2, shape (len(aspects), hours). Isotropic sky diffuse plus ground reflection"""
+    tilt = np.radians(pitch)
+    aspects = np.radians(np.asarray(aspects, dtype=np.float64))[:, np.newaxis]
+    cos_angle_of_incidence = (np.cos(zenith) * np.cos(tilt)
+                              + np.sin(zenith) * np.sin(tilt) * np.cos(azimuth - aspects))
+    sun_up = zenith < np.pi / 2
+    beam = dni * np.clip(cos_angle_of_incidence, 0, None) * sun_up
+    sky_diffuse = dhi * (1 + np.cos(tilt)) / 2
+    ground_reflected = ghi * SolarConstants.GROUND_ALBEDO * (1 - np.cos(tilt)) / 2
+    return beam + sky_diffuse + ground_reflected
+
+
+def generation_per_kwp(poa_irradiance: np.ndarray, temp_air: np.ndarray,
+                       loss: float = SolarConstants.SYSTEM_LOSS) -> np.ndarray:
+    """ kW out per kWp installed, from plane of array irradiance in W/m2"""
+    temp_cell = temp_air + poa_irradiance * (SolarConstants.PV_NOCT_C - 20) / 800
+    temperature_factor = 1 + SolarConstants.PV_TEMPERATURE_COEFFICIENT_PER_C * (temp_cell - 25)
+    return poa_irradiance / 1000 * temperature_factor * (1 - loss / 100)
+
+
+class LocalPVModel:
+    """ Same interface as PVGISClient, calculated locally"""
+
+    def __init__(self, dataset: Optional[IrradianceDataset] = None,
+                 memory_entries: int = SolarConstants.PV_CACHE_MEMORY_ENTRIES):
+        self._dataset = dataset
+        self.memory_entries = memory_entries
+        self._profiles: OrderedDict[ProfileKey, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()  # prefetches run on a thread pool
+
+    @property
+    def dataset(self) -> IrradianceDataset:
+        if self._dataset is None:  # only load when first needed as the file is large
+            self._dataset = IrradianceDataset.from_profile_store()
+        return self._dataset
+
+    def get_hourly_generation_per_kwp(self, key: ProfileKey) -> np.ndarray:
+        """ Returns array of average solar pv power for each hour in kW for a 1 kWp install"""
+        return self.get_hourly_generation_per_kwp_for_keys([key])[0]
+
+    def get_hourly_generation_per_kwp_for_keys(self, keys: List[ProfileKey]) -> List[np.ndarray]:
+        """ Read only profile for each key. Those not already memoised are calculated in one batch per location, pitch
+        and loss"""
+        with self._lock:
+            profiles = {key: self._profiles[key] for key in keys if key in self._profiles}
+            for key in profiles:
+                self._profiles.move_to_end(key)
+
+        to_calculate: Dict[tuple, List[ProfileKey]] = {}
+        for key in dict.fromkeys(keys):
+            if key not in profiles:
+                latitude, longitude, pitch, _, loss, _ = key  # year is that of the dataset
+                to_calculate.setdefault((latitude, longitude, pitch, loss), []).append(key)
+        for (latitude, longitude, pitch, loss), keys_to_calculate in to_calculate.items():
+            calculated = self.get_hourly_generation_per_kwp_for_aspects(
+                latitude=latitude, longitude=longitude, pitch=pitch,
+                aspects=np.array([key[3] for key in keys_to_calculate]), loss=loss)
+            calculated.flags.writeable = False  # shared by every caller that gets it
+            for key, profile in zip(keys_to_calculate, calculated):
+                profiles[key] = profile
+                self._remember(key=key, profile=profile)
+        return [profiles[key] for key in keys]
+
+    def _remember(self, key: ProfileKey, profile: np.ndarray):
+        with self._lock:
+            self._profiles[key] = profile
+            self._profiles.move_to_end(key)
+            while len(self._profiles) > self.memory_entries:
+                self._profiles.popitem(last=False)
+
+    def get_hourly_generation_per_kwp_for_aspects(self, latitude: float, longitude: float, pitch: float,
+                                                  aspects: np.ndarray,
+                                                  loss: float = SolarConstants.SYSTEM_LOSS) -> np.ndarray:
+        """ kW per kWp with shape (len(aspects), hours), all calculated together"""
+        dataset = self.dataset
+        i, j = dataset.nearest_cell(latitude=latitude, longitude=longitude)
+        zenith, azimuth = solar_position(latitude=latitude, longitude=longitude,
+                                         hours_in_year=dataset.ghi.shape[-1])
+        poa_irradiance = plane_of_array_irradiance(zenith=zenith, azimuth=azimuth, ghi=dataset.ghi[i, j],
+                                                   dni=dataset.dni[i, j], dhi=dataset.dhi[i, j], pitch=pitch,
+                                                   aspects=aspects)
+        return generation_per_kwp(poa_irradiance=poa_irradiance, temp_air=dataset.temp_air[i, j], loss=loss)
+
+    def get_hourly_generation_per_kwp_all_orientations(self, latitude: float, longitude: float,
+                                                       pitch: float = SolarConstants.ROOF_PITCH_DEGREES
+                                                       ) -> dict[str, np.ndarray]:
+        keys = [pv_cache.make_key(latitude=latitude, longitude=longitude, pitch=pitch,
+                                  aspect=orientation.azimuth_degrees)
+                for orientation in SolarConstants.ORIENTATIONS.values()]
+        return dict(zip(SolarConstants.ORIENTATIONS.keys(), self.get_hourly_generation_per_kwp_for_keys(keys)))
+
+
+_default_model: Optional[LocalPVModel] = None
+
+
+def get_default_model() -> LocalPVModel:
+    global _default_model
+    if _default_model is None:
+        _default_model = LocalPVModel()
+    return _default_model
+
+
+def set_default_model(model: LocalPVModel):
+    global _default_model
+    _default_model = model
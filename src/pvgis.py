@@ -0,0 +1,142 @@
+""" Process-wide client for the PVGIS API.
+
+Every session in the app shares one client, so the PVGIS limit of 30 calls per second is enforced across all of them
+by a token bucket, connections are reused from a pooled requests.Session, and concurrent requests for the same
+profile wait for the one call already in flight rather than each making their own."""
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from constants import SolarConstants
+from pv_cache import ProfileKey
+
+
+class TokenBucket:
+    """ Allows bursts of up to capacity calls, refilling at rate calls per second"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """ Block until a call is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_s = (1 - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+
+class PVGISClient:
+
+    def __init__(self, base_url: str = SolarConstants.PVGIS_BASE_URL,
+                 max_calls_per_second: float = SolarConstants.PVGIS_MAX_CALLS_PER_SECOND,
+                 timeout_s: float = SolarConstants.PVGIS_TIMEOUT_S,
+                 pool_size: int = SolarConstants.PVGIS_CONNECTION_POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.timeout_s = timeout_s
+        self.rate_limiter = TokenBucket(rate=max_calls_per_second)
+        self.calls_made = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._in_flight: Dict[ProfileKey, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_hourly_generation_per_kwp(self, key: ProfileKey) -> np.ndarray:
+        """ Returns array of 8760 of average solar pv power for that hour in kW for a 1 kWp install.
+        If the same profile is already being fetched, waits for that call instead of making another"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+        if not is_leader:
+            return future.result()
+
+        try:
+            profile = self._fetch_hourly_generation_per_kwp(key)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(profile)
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+        return profile
+
+    def _fetch_hourly_generation_per_kwp(self, key: ProfileKey) -> np.ndarray:
+        # API Documentation here: https://joint-research-centre.ec.europa.eu/
+        #   pvgis-photovoltaic-geographical-information-system/getting-started-pvgis/api-non-interactive-service_en
+        latitude, longitude, pitch, aspect, loss, year = key
+
+        tool_name = 'seriescalc'
+        api_url = f'{self.base_url}/{tool_name}'
+
+        params = {'lat': latitude,
+                  'lon': longitude,
+                  'startyear': year,  # just take one year for now
+                  'endyear': year,
+                  'pvcalculation': 1,  # estimate hourly PV production
+                  'peakpower': 1,  # output is linear in installed capacity so scale up afterwards
+                  'mountingplace': "building",
+                  'loss': loss,
+                  'angle': pitch,
+                  'aspect': aspect,
+                  'outputformat': "json"
+                  }
+        self.rate_limiter.acquire()
+        print("making api call")
+        self.calls_made += 1
+        response = self.session.get(api_url, params=params, timeout=self.timeout_s)
+
+        if response.status_code == 200:
+            dictr = response.json()
+            df = pd.DataFrame(dictr['outputs']['hourly'])
+            pv_power_kw_per_kwp = df['P'].to_numpy() / 1000  # source data in W so convert to kW
+        else:
+            print(response.status_code)
+            print(response.text)
+            raise requests.ConnectionError
+
+        return pv_power_kw_per_kwp
+
+
+_default_client: Optional[PVGISClient] = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client() -> PVGISClient:
+    """ Process-wide client, pointed at the PVGIS_BASE_URL environment variable if set"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = PVGISClient(base_url=os.environ.get("PVGIS_BASE_URL", SolarConstants.PVGIS_BASE_URL))
+        return _default_client
+
+
+def set_default_client(client: PVGISClient):
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
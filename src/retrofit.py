@@ -1,18 +1,25 @@
-import copy
 from typing import List, Tuple
 
 import pandas as pd
 import numpy as np
 
+import constants
 from building_model import House, HeatingSystem
+from cash_flow import CashFlowInputs, CashFlowResults, calculate_cash_flows
+from scenarios import ScenarioResult
 from solar import Solar
 
 
 class Retrofit:
+    """ Houses can be House objects or ScenarioResult objects from scenarios.evaluate_scenarios.
+    solar_bill_savings is the part of the bill savings that comes from solar panels, which falls as they degrade"""
 
-    def __init__(self, baseline_house: 'House', upgrade_house: 'House'):
+    def __init__(self, baseline_house: 'House | ScenarioResult', upgrade_house: 'House | ScenarioResult',
+                 solar_bill_savings: float = 0.0):
         self.baseline_house = baseline_house
         self.upgrade_house = upgrade_house
+        self.solar_bill_savings = solar_bill_savings
+        self._lifetime_finances: CashFlowResults | None = None
 
     @property
     def bill_savings_absolute(self):
@@ -44,36 +51,68 @@ class Retrofit:
             payback = 0
         return payback
 
+    @property
+    def heating_replacement_cost(self) -> int:
+        """ Extra cost of replacing the upgraded heating system at the end of its life rather than the original"""
+        return self.upgrade_house.heating_system_upfront_cost - self.baseline_house.heating_system_upfront_cost
 
-def upgrade_buildings(baseline_house: 'House', solar_install: 'Solar', upgrade_heating: 'HeatingSystem'
-                      ) -> Tuple['House', 'House', 'House']:
+    @property
+    def lifetime_finances(self) -> CashFlowResults:
+        if self._lifetime_finances is None:
+            self._lifetime_finances = calculate_lifetime_finances([self])
+        return self._lifetime_finances
+
+    @property
+    def npv(self) -> float:
+        return float(self.lifetime_finances.npv[0])
+
+    @property
+    def irr(self) -> float:
+        return float(self.lifetime_finances.irr[0])
 
-    hp_house = copy.deepcopy(baseline_house)  # do after modifications so modifications flow through
-    hp_house.clear_cost_overwrite()  # so that changes in baseline cost don't flow through into hp_house
-    hp_house.heating_system = upgrade_heating  # means that cost overwrites here do not persist
-    hp_house.clear_cached_properties()  # so that cached properties recalculated for this heating system
+    @property
+    def discounted_payback(self) -> float:
+        return float(self.lifetime_finances.discounted_payback[0])
 
-    solar_house = copy.deepcopy(baseline_house)
-    solar_house.solar_install = solar_install
-    solar_house.clear_cached_properties()  # so that cached properties recalculated for this solar install
 
-    both_house = copy.deepcopy(hp_house)
-    both_house.clear_cost_overwrite()  # so that changes in baseline cost don't flow through into both_house
-    both_house.solar_install = solar_install
-    both_house.clear_cached_properties()  # so that cached properties recalculated for this solar install + hp system
+def upgrade_buildings(baseline_house: 'House', solar_install: 'Solar', upgrade_heating: 'HeatingSystem'
+                      ) -> Tuple['House', 'House', 'House']:
+    """ Variants share the baseline's unchanged components and cached results rather than copying them. Heating cost
+    overwrites on the baseline don't carry over to the houses with the upgraded heating system"""
+
+    hp_house = baseline_house.with_changes(heating_system=upgrade_heating)
+    solar_house = baseline_house.with_changes(solar_install=solar_install)
+    both_house = hp_house.with_changes(solar_install=solar_install)
 
     return solar_house, hp_house, both_house
 
 
-def generate_all_retrofit_cases(baseline_house: 'House', solar_house: 'House', hp_house: 'House',
-                                both_house: 'House'):
-    solar_retrofit = Retrofit(baseline_house=baseline_house, upgrade_house=solar_house)
+def generate_all_retrofit_cases(baseline_house: 'House | ScenarioResult', solar_house: 'House | ScenarioResult',
+                                hp_house: 'House | ScenarioResult', both_house: 'House | ScenarioResult'):
+    solar_retrofit = Retrofit(baseline_house=baseline_house, upgrade_house=solar_house,
+                              solar_bill_savings=baseline_house.total_annual_bill - solar_house.total_annual_bill)
     hp_retrofit = Retrofit(baseline_house=baseline_house, upgrade_house=hp_house)
-    both_retrofit = Retrofit(baseline_house=baseline_house, upgrade_house=both_house)
+    both_retrofit = Retrofit(baseline_house=baseline_house, upgrade_house=both_house,
+                             solar_bill_savings=hp_house.total_annual_bill - both_house.total_annual_bill)
     return solar_retrofit, hp_retrofit, both_retrofit
 
 
-def combine_results_dfs_multiple_houses(houses: List['House'], keys: List['str']):
+def calculate_lifetime_finances(retrofits: List[Retrofit]) -> CashFlowResults:
+    """ Cash flows for all the retrofits at once, one column each"""
+    finances = calculate_cash_flows(CashFlowInputs(
+        upfront_cost=[retrofit.incremental_cost for retrofit in retrofits],
+        first_year_bill_savings=[retrofit.bill_savings_absolute for retrofit in retrofits],
+        first_year_solar_bill_savings=[retrofit.solar_bill_savings for retrofit in retrofits],
+        heating_replacement_cost=[retrofit.heating_replacement_cost for retrofit in retrofits],
+        heating_lifetime=np.full(len(retrofits), constants.HEATING_SYSTEM_LIFETIME)))
+    for i, retrofit in enumerate(retrofits):
+        if retrofit._lifetime_finances is None:
+            retrofit._lifetime_finances = CashFlowResults(cash_flows=finances.cash_flows[:, i:i + 1],
+                                                          discount_rate=finances.discount_rate)
+    return finances
+
+
+def combine_results_dfs_multiple_houses(houses: List['House | ScenarioResult'], keys: List['str']):
     results_df = pd.concat([house.energy_and_bills_df for house in houses], keys=keys)
     results_df.index.names = ['Upgrade option', 'old_index']
     results_df = results_df.reset_index()
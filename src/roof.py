@@ -1,6 +1,7 @@
 from dataclasses import dataclass
+from functools import cache
 import math
-from typing import List, Tuple, Optional
+from typing import Iterable, List, Optional, Sequence, Tuple
 
 import folium
 import leafmap.foliumap as leafmap
@@ -8,8 +9,10 @@ import streamlit as st
 import streamlit.components.v1 as streamlit_components
 from streamlit_folium import st_folium
 import numpy as np
+import pandas as pd
 
-from constants import SolarConstants
+from constants import ORIENTATION_OPTIONS, Orientation, SolarConstants
+from dependencies import depends_on
 from place_search import place_search
 
 KM_TO_M = 1e3
@@ -33,9 +36,213 @@ def shoelace(x_y) -> float:
     return area
 
 
+R_EARTH_IN_KM = 6378
+KM_PER_DEGREE_LAT = 111  # constant
+
+
+@dataclass
+class PolygonGeometry:
+    """ Geometry of many polygons at once, e.g. a whole dataset of building footprints.
+
+    The vertices of every polygon are stacked into one array, with the vertices of polygon i at
+    offsets[i]:offsets[i + 1]. Each polygon is projected to metres around its own first point, as in Polygon.
+    Side k of a polygon runs from its vertex k - 1 to its vertex k, so side 0 is the one that closes the shape"""
+    origins: np.ndarray  # (polygons, 2) lat, lng of the first point of each polygon
+    dimensions: np.ndarray  # (vertices, 2) metres north and east of the first point of the polygon
+    offsets: np.ndarray  # (polygons + 1,)
+
+    @classmethod
+    def from_points(cls, polygons_points: Iterable[Sequence[Sequence[float]]]) -> 'PolygonGeometry':
+        """ From closed shapes of lng, lat points as drawn on the map: the last point repeats the first, and is
+        dropped"""
+        lng_lats = [np.asarray(points, dtype=np.float64).reshape(-1, 2)[:-1] for points in polygons_points]
+        offsets = np.zeros(len(lng_lats) + 1, dtype=np.int64)
+        np.cumsum([len(points) for points in lng_lats], out=offsets[1:])
+        lat_lngs = np.concatenate(lng_lats)[:, ::-1] if lng_lats else np.empty((0, 2))
+        return cls.from_lat_lngs(lat_lngs=lat_lngs, offsets=offsets)
+
+    @classmethod
+    def from_lat_lngs(cls, lat_lngs: np.ndarray, offsets: np.ndarray) -> 'PolygonGeometry':
+        """ From the vertices of every polygon stacked into one (vertices, 2) array, without closing points"""
+        offsets = np.asarray(offsets, dtype=np.int64)
+        if np.any(np.diff(offsets) < 1):
+            raise ValueError("Every polygon needs at least one vertex as well as the point that closes it")
+        origins = lat_lngs[offsets[:-1]]
+        vertex_origins = np.repeat(origins, np.diff(offsets), axis=0)
+        relative = lat_lngs - vertex_origins
+        km_per_degree_lng = (math.pi / 180) * R_EARTH_IN_KM * np.cos(vertex_origins[:, 0] * math.pi / 180)
+        dimensions = np.column_stack([relative[:, 0] * KM_PER_DEGREE_LAT * KM_TO_M,
+                                      relative[:, 1] * km_per_degree_lng * KM_TO_M])
+        for array in (origins, dimensions, offsets):
+            array.flags.writeable = False  # shared by the properties below
+        return cls(origins=origins, dimensions=dimensions, offsets=offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def number_of_sides(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @property
+    def previous_vertex(self) -> np.ndarray:
+        """ Index of the vertex before each vertex in the same polygon"""
+        previous = np.arange(-1, len(self.dimensions) - 1)
+        previous[self.offsets[:-1]] = self.offsets[1:] - 1
+        return previous
+
+    @property
+    def sides(self) -> np.ndarray:
+        """ (vertices, 2) north and east length of each side"""
+        return self.dimensions - self.dimensions[self.previous_vertex]
+
+    @property
+    def side_lengths(self) -> np.ndarray:
+        sides = self.sides
+        return np.sqrt(sides[:, 0] * sides[:, 0] + sides[:, 1] * sides[:, 1])
+
+    @property
+    def bearings(self) -> np.ndarray:
+        """ Compass bearing of each side in degrees, clockwise from north"""
+        sides = self.sides
+        return np.degrees(np.arctan2(sides[:, 1], sides[:, 0])) % 360
+
+    def sum_per_polygon(self, values: np.ndarray) -> np.ndarray:
+        return np.add.reduceat(values, self.offsets[:-1], axis=0)
+
+    @property
+    def _cross_products(self) -> np.ndarray:
+        """ Shoelace terms for each side"""
+        previous = self.dimensions[self.previous_vertex]
+        return previous[:, 0] * self.dimensions[:, 1] - previous[:, 1] * self.dimensions[:, 0]
+
+    @property
+    def areas(self) -> np.ndarray:
+        return 0.5 * np.absolute(self.sum_per_polygon(self._cross_products))
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """ (polygons, 2) lat, lng of the centre of each polygon. The mean of the vertices if it has no area"""
+        cross_products = self._cross_products
+        signed_areas = 0.5 * self.sum_per_polygon(cross_products)
+        edge_midpoints = self.dimensions + self.dimensions[self.previous_vertex]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            centroids = (self.sum_per_polygon(edge_midpoints * cross_products[:, np.newaxis])
+                         / (6 * signed_areas[:, np.newaxis]))
+        vertex_means = self.sum_per_polygon(self.dimensions) / self.number_of_sides[:, np.newaxis]
+        centroids = np.where(signed_areas[:, np.newaxis] != 0, centroids, vertex_means)
+
+        km_per_degree_lng = (math.pi / 180) * R_EARTH_IN_KM * np.cos(self.origins[:, 0] * math.pi / 180)
+        return self.origins + np.column_stack([centroids[:, 0] / (KM_PER_DEGREE_LAT * KM_TO_M),
+                                               centroids[:, 1] / (km_per_degree_lng * KM_TO_M)])
+
+    @property
+    def ridge_vectors(self) -> np.ndarray:
+        """ (polygons, 2) sum of the sides of each polygon, weighted by length, with their bearings doubled so sides
+        running in opposite directions add up rather than cancel out"""
+        doubled = np.radians(2 * self.bearings)
+        side_lengths = self.side_lengths
+        return np.column_stack([self.sum_per_polygon(side_lengths * np.cos(doubled)),
+                                self.sum_per_polygon(side_lengths * np.sin(doubled))])
+
+    @property
+    def ridge_bearings(self) -> np.ndarray:
+        """ Bearing of the main axis of each polygon, from 0 to 180 degrees clockwise from north: the direction most of
+        its length runs in. Taken to be the ridge, as roofs are drawn wider than they are deep"""
+        return convert_ridge_vectors_to_bearings(self.ridge_vectors)
+
+    @property
+    def azimuths(self) -> np.ndarray:
+        """ Azimuth of each polygon, as in convert_ridge_bearings_to_azimuths"""
+        return convert_ridge_bearings_to_azimuths(self.ridge_bearings)
+
+    def _average_opposite_sides(self) -> np.ndarray:
+        """ (polygons, 2) average of sides 0 and 2, and of sides 1 and 3. Nan for polygons with fewer than 4 sides"""
+        side_lengths = np.append(self.side_lengths, np.nan)
+        has_four_sides = self.number_of_sides >= 4
+        first = np.where(has_four_sides, self.offsets[:-1], len(side_lengths) - 1)
+        return np.column_stack([(side_lengths[first] + side_lengths[first + 2 * has_four_sides]) / 2,
+                                (side_lengths[first + has_four_sides] + side_lengths[first + 3 * has_four_sides]) / 2])
+
+    @property
+    def average_plan_heights(self) -> np.ndarray:
+        """ As Polygon.average_plan_height"""
+        return self._average_opposite_sides().min(axis=1)
+
+    @property
+    def average_widths(self) -> np.ndarray:
+        """ As Polygon.average_width"""
+        return self._average_opposite_sides().max(axis=1)
+
+    def __getitem__(self, i: int) -> 'PolygonGeometry':
+        """ Geometry of one polygon out of the batch"""
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return PolygonGeometry(origins=self.origins[i:i + 1], dimensions=self.dimensions[start:end],
+                               offsets=np.array([0, end - start]))
+
+    def to_df(self) -> pd.DataFrame:
+        """ One row per polygon"""
+        centroids = self.centroids
+        return pd.DataFrame({'number_of_sides': self.number_of_sides,
+                             'area_m2': self.areas,
+                             'centroid_lat': centroids[:, 0],
+                             'centroid_lng': centroids[:, 1],
+                             'average_width_m': self.average_widths,
+                             'average_plan_height_m': self.average_plan_heights,
+                             'azimuth_degrees': self.azimuths})
+
+
+def calculate_geometry(polygons: Iterable['Polygon']) -> PolygonGeometry:
+    """ Geometry of many polygons in one go"""
+    return PolygonGeometry.from_points(polygon._points for polygon in polygons)
+
+
+def convert_ridge_vectors_to_bearings(ridge_vectors: np.ndarray) -> np.ndarray:
+    return np.degrees(np.arctan2(ridge_vectors[..., 1], ridge_vectors[..., 0])) / 2 % 180
+
+
+def convert_ridge_bearings_to_azimuths(ridge_bearings: np.ndarray) -> np.ndarray:
+    """ Degrees clockwise from south, as PVGIS takes them, of the side of the ridge facing closest to south. Users
+    draw on their most south facing roof, so that is the side they have drawn. Rounded to
+    SolarConstants.AZIMUTH_STEP_DEGREES so nearby roofs share generation profiles"""
+    azimuths = ridge_bearings - 90  # facing the ridge bearing + 90, which is 180 from south
+    step = SolarConstants.AZIMUTH_STEP_DEGREES
+    return np.round(azimuths / step) * step + 0.0  # + 0.0 turns -0.0 into 0.0
+
+
+def infer_orientation(polygons: List['Polygon']) -> Optional[Orientation]:
+    """ From the sides of all the polygons together, as if they were drawn on the same roof. None if they have no
+    area, as then their sides don't say anything"""
+    geometry = calculate_geometry(polygons)
+    if not geometry.areas.sum() > 0:
+        return None
+    ridge_bearing = convert_ridge_vectors_to_bearings(geometry.ridge_vectors.sum(axis=0))
+    azimuth = float(convert_ridge_bearings_to_azimuths(ridge_bearing))
+    return make_orientation(azimuth)
+
+
+@cache
+def make_orientation(azimuth_degrees: float) -> Orientation:
+    """ Named after the nearest of the standard options, with the azimuth too if it isn't exactly that. The same
+    object for the same azimuth, so setting it on a Solar again doesn't count as a change"""
+    nearest = min(ORIENTATION_OPTIONS.values(),
+                  key=lambda option: abs((option.azimuth_degrees - azimuth_degrees + 180) % 360 - 180))
+    orientation = Orientation(azimuth_degrees=azimuth_degrees, name=nearest.name)
+    if orientation.azimuth_degrees != nearest.azimuth_degrees:
+        orientation.name = f"{nearest.name} ({orientation.azimuth_degrees:g}° from south)"
+    return orientation
+
+
 @dataclass
 class Polygon:
+    """ Geometry is worked out once and cached, so treat the points as fixed: set _points to a new list rather than
+    changing it in place.
+
+    orientation and pitch are for roofs with more than one plane, e.g. east/west split roofs. If not set, the
+    polygon takes the orientation and pitch of the solar install it is part of"""
     _points: List[List[float]]
+    orientation: Optional[Orientation] = None
+    pitch: Optional[float] = None
 
     @classmethod
     def make_zero_area_instance(cls):
@@ -48,30 +255,44 @@ class Polygon:
         """map returns lng lat for some reason, rather than lat long - so switch around here"""
         return [(lat, lng) for (lng, lat) in self._points]
 
-    @property
+    @depends_on('_points')
+    def geometry(self) -> PolygonGeometry:
+        return PolygonGeometry.from_points([self._points])
+
+    @depends_on('_points')
     def dimensions(self) -> List[Tuple[float]]:
-        """Formats points as metres"""
-        points_in_relative_lat_lng = self.convert_points_to_be_relative_to_first(self.points)
-        points_in_relative_metres = [
-            self.lat_lng_to_metres(start_lat_lng=self.points[0], lat_lng=p) for p in points_in_relative_lat_lng
-        ]
-        points_in_relative_metres = points_in_relative_metres[:-1]  # drop the 5th point which closes the shape
-        return points_in_relative_metres
+        """Formats points as metres. Drops the last point, which closes the shape"""
+        return [tuple(point) for point in self.geometry.dimensions.tolist()]
 
-    @property
+    @depends_on('_points')
     def area(self) -> float:
-        return shoelace(self.dimensions)
-
-    @property
-    def side_lengths(self):
-        side_lengths = []
-        for i in range(len(self.dimensions)):
-            next_dimension = self.dimensions[i + 1] if i + 1 < len(self.dimensions) else self.dimensions[0]
-            side_length = self.calculate_side_length(self.dimensions[i], next_dimension)
-            side_lengths.append(side_length)
-        side_lengths = [self.calculate_side_length(self.dimensions[i], self.dimensions[i + 1]) for i in
-                        range(-1, (len(self.dimensions) - 1))]
-        return side_lengths
+        return float(self.geometry.areas[0])
+
+    @depends_on('_points')
+    def side_lengths(self) -> List[float]:
+        """ Side i runs from point i - 1 to point i"""
+        return self.geometry.side_lengths.tolist()
+
+    @depends_on('_points')
+    def bearings(self) -> List[float]:
+        """ Compass bearing of each side in degrees, in the same order as side_lengths"""
+        return self.geometry.bearings.tolist()
+
+    @depends_on('_points')
+    def ridge_bearing(self) -> float:
+        """ Degrees clockwise from north, from 0 to 180. See PolygonGeometry.ridge_bearings"""
+        return float(self.geometry.ridge_bearings[0])
+
+    @depends_on('_points')
+    def azimuth(self) -> float:
+        """ Degrees clockwise from south of the side of the ridge facing closest to south"""
+        return float(self.geometry.azimuths[0])
+
+    @depends_on('_points')
+    def centroid(self) -> Tuple[float, float]:
+        """ lat, lng"""
+        lat, lng = self.geometry.centroids[0].tolist()
+        return lat, lng
 
     @property
     def average_plan_height(self):
@@ -98,21 +319,12 @@ class Polygon:
         start_lat, _ = start_lat_lng
 
         lat, lng = lat_lng
-        r_earth_in_km = 6378
-        km_per_degree_lng = (math.pi / 180) * r_earth_in_km * np.cos(start_lat * math.pi / 180)  # Depend upon latitude
-        km_per_degree_lat = 111  # constant
+        km_per_degree_lng = (math.pi / 180) * R_EARTH_IN_KM * np.cos(start_lat * math.pi / 180)  # Depend upon latitude
 
-        return lat * km_per_degree_lat * KM_TO_M, lng * km_per_degree_lng * KM_TO_M
+        return lat * KM_PER_DEGREE_LAT * KM_TO_M, lng * km_per_degree_lng * KM_TO_M
 
     def calculate_side_lengths(self, dimensions: List[Tuple[float]]) -> List[float]:
-        side_lengths = []
-        for i in range(len(dimensions)):
-            next_dimension = dimensions[i + 1] if i + 1 < len(dimensions) else dimensions[0]
-            side_length = self.calculate_side_length(dimensions[i], next_dimension)
-            side_lengths.append(side_length)
-        side_lengths = [self.calculate_side_length(dimensions[i], dimensions[i + 1]) for i in
-                        range(-1, (len(dimensions) - 1))]
-        return side_lengths
+        return [self.calculate_side_length(dimensions[i], dimensions[i + 1]) for i in range(-1, (len(dimensions) - 1))]
 
     @staticmethod
     def calculate_side_length(point_1: Tuple[float], point_2: Tuple[float]) -> float:
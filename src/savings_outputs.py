@@ -6,9 +6,11 @@ import streamlit as st
 
 import house_questions
 import retrofit
+import scenarios
 import solar_questions
 from building_model import *
 from constants import CLASS_NAME_OF_SIDEBAR_DIV
+from scenarios import ScenarioResult
 from solar import Solar
 from solar_questions import render_solar_overwrite_options
 
@@ -36,10 +38,16 @@ def render(house: "House", solar_install: "Solar", upgrade_heating: "HeatingSyst
     house, solar_house, hp_house, both_house = render_savings_assumptions_sidebar_and_calculate_upgraded_houses(
         house=house, solar_install=solar_install, upgrade_heating=upgrade_heating)
 
+    # All four evaluated together in one pass. Keys are the labels used in the charts
+    results = scenarios.evaluate_scenarios({"Both ": both_house, "Heat pump ": hp_house,
+                                            "Solar panels ": solar_house, "Current ": house})
+    current, solar, hp, both = results["Current "], results["Solar panels "], results["Heat pump "], results["Both "]
+
     solar_retrofit, hp_retrofit, both_retrofit = retrofit.generate_all_retrofit_cases(
-        baseline_house=house, solar_house=solar_house, hp_house=hp_house, both_house=both_house)
+        baseline_house=current, solar_house=solar, hp_house=hp, both_house=both)
+    retrofit.calculate_lifetime_finances([solar_retrofit, hp_retrofit, both_retrofit])  # all three in one go
 
-    render_results(house=house, hp_house=hp_house, solar_house=solar_house, both_house=both_house,
+    render_results(house=current, hp_house=hp, solar_house=solar, both_house=both,
                    solar_retrofit=solar_retrofit, hp_retrofit=hp_retrofit, both_retrofit=both_retrofit)
     return house, solar_house.solar_install, hp_house.heating_system
 
@@ -86,19 +94,39 @@ def render_heat_pump_overwrite_options(upgrade_heating: HeatingSystem) -> Heatin
         st.session_state.upgrade_heating_efficiency = upgrade_heating.efficiency
         st.session_state.upgrade_heating_efficiency_overwritten = False
 
+    if "upgrade_heating_flow_temperature" not in st.session_state:
+        st.session_state.upgrade_heating_flow_temperature = upgrade_heating.flow_temperature_c
+
+    flow_temperature_options = [None] + list(constants.HeatPumpConstants.FLOW_TEMPERATURE_OPTIONS_C)
+    st.selectbox(
+        label="Flow temperature: ",
+        options=flow_temperature_options,
+        index=flow_temperature_options.index(st.session_state.upgrade_heating_flow_temperature),
+        format_func=lambda option: "Not set, use efficiency" if option is None else f"{option}°C",
+        key="upgrade_heating_flow_temperature_overwrite",
+        on_change=overwrite_upgrade_heating_flow_temperature_in_session_state,
+        help="With a flow temperature the efficiency is worked out for each hour from the outside temperature, "
+             "so it drops in cold weather when you need the most heat")
+    upgrade_heating.flow_temperature_c = st.session_state.upgrade_heating_flow_temperature
+
     st.number_input(
         label="Efficiency: ",
         min_value=1.0,
         max_value=8.0,
         value=st.session_state.upgrade_heating_efficiency,
         key="upgrade_heating_efficiency_overwrite",
-        on_change=overwrite_upgrade_heating_efficiency_in_session_state)
+        on_change=overwrite_upgrade_heating_efficiency_in_session_state,
+        disabled=upgrade_heating.flow_temperature_c is not None)
 
     if st.session_state.upgrade_heating_efficiency_overwritten:
         print("Behaves as if heating efficiency overwritten")
         upgrade_heating.efficiency = st.session_state.upgrade_heating_efficiency
         st.session_state.upgrade_heating_efficiency_overwritten = False
 
+    if upgrade_heating.flow_temperature_c is not None:
+        st.caption(f"Average efficiency over the year at this flow temperature: "
+                   f"{upgrade_heating.seasonal_efficiency:.1f}")
+
     st.session_state["page_state"]["upgrade_heating"] = dict(upgrade_heating=upgrade_heating)
 
     st.caption(
@@ -111,6 +139,10 @@ def render_heat_pump_overwrite_options(upgrade_heating: HeatingSystem) -> Heatin
     return upgrade_heating
 
 
+def overwrite_upgrade_heating_flow_temperature_in_session_state():
+    st.session_state.upgrade_heating_flow_temperature = st.session_state.upgrade_heating_flow_temperature_overwrite
+
+
 def overwrite_upgrade_heating_efficiency_in_session_state():
     st.session_state.upgrade_heating_efficiency = st.session_state.upgrade_heating_efficiency_overwrite
     st.session_state.upgrade_heating_efficiency_overwritten = True
@@ -252,8 +284,8 @@ def flag_that_heat_pump_grant_value_overwritten():
     st.session_state.heat_pump_grant_value_overwritten = True
 
 
-def render_results(house: House, solar_house: House, hp_house: House, both_house: House,
-                   solar_retrofit: retrofit.Retrofit, hp_retrofit: retrofit.Retrofit,
+def render_results(house: ScenarioResult, solar_house: ScenarioResult, hp_house: ScenarioResult,
+                   both_house: ScenarioResult, solar_retrofit: retrofit.Retrofit, hp_retrofit: retrofit.Retrofit,
                    both_retrofit: retrofit.Retrofit):
     # Combine results all variables
     results_df = retrofit.combine_results_dfs_multiple_houses(
@@ -275,7 +307,7 @@ def render_results(house: House, solar_house: House, hp_house: House, both_house
             "</div>"
             "<div class='saving-maths'>"
             "<div>"
-            f"<p class='saving-maths-headline'> ~£{solar_house.solar_install.upfront_cost:,d}</p>"
+            f"<p class='saving-maths-headline'> ~£{solar_house.solar_upfront_cost:,d}</p>"
             "<p class='saving-maths'> to install</p>"
             "</div>"
             "<div>"
@@ -330,6 +362,8 @@ def render_results(house: House, solar_house: House, hp_house: House, both_house
         st.subheader("Bills")
         render_bill_outputs(house=house, solar_house=solar_house, hp_house=hp_house, both_house=both_house)
         render_bill_chart(results_df)
+        st.subheader("Over the lifetime of the upgrades")
+        render_lifetime_outputs(solar_retrofit=solar_retrofit, hp_retrofit=hp_retrofit, both_retrofit=both_retrofit)
         st.subheader("Energy")
         render_consumption_outputs(house=house, solar_house=solar_house, hp_house=hp_house, both_house=both_house)
         render_consumption_chart(results_df)
@@ -400,7 +434,8 @@ def wrap_words_in_blue_format(words: str) -> str:
     return f"<span style='color:hsl(220, 60%, 40%)'> {words} </span> "
 
 
-def render_bill_outputs(house: "House", solar_house: "House", hp_house: "House", both_house: "House"):
+def render_bill_outputs(house: "ScenarioResult", solar_house: "ScenarioResult", hp_house: "ScenarioResult",
+                        both_house: "ScenarioResult"):
     st.markdown(f"""
                 <p class='next-steps'>We calculate that {produce_current_bill_sentence(house)}
                     <ul>
@@ -417,7 +452,35 @@ def render_bill_outputs(house: "House", solar_house: "House", hp_house: "House",
                 )
 
 
-def produce_current_bill_sentence(house: "House") -> str:
+def render_lifetime_outputs(solar_retrofit: retrofit.Retrofit, hp_retrofit: retrofit.Retrofit,
+                            both_retrofit: retrofit.Retrofit):
+    st.markdown(f"""
+                <p class='next-steps'>Over {constants.FinanceConstants.YEARS} years, with energy prices rising
+                {constants.FinanceConstants.ENERGY_PRICE_ESCALATION:.0%} a year, solar panels producing
+                {constants.FinanceConstants.SOLAR_DEGRADATION:.1%} less each year and a heat pump replaced after
+                {constants.HEATING_SYSTEM_LIFETIME} years, the savings less the costs are worth today
+                    <ul>
+                        <li> <b>With solar</b> {produce_lifetime_sentence(solar_retrofit)}</li>
+                        <li> <b>With a heat pump</b> {produce_lifetime_sentence(hp_retrofit)}</li>
+                        <li> <b>With both</b> {produce_lifetime_sentence(both_retrofit)}</li>
+                    </ul>
+                 Future savings are discounted at {constants.FinanceConstants.DISCOUNT_RATE:.1%} a year.
+                 </p>
+                 """,
+                unsafe_allow_html=True
+                )
+
+
+def produce_lifetime_sentence(upgrade: retrofit.Retrofit) -> str:
+    sentence = wrap_words_in_blue_format(words=f' £{int(upgrade.npv):,}')
+    if np.isnan(upgrade.discounted_payback):
+        sentence += ", and it doesn't pay back"
+    else:
+        sentence += f", and it pays back after {upgrade.discounted_payback:.0f} years"
+    return sentence
+
+
+def produce_current_bill_sentence(house: "ScenarioResult") -> str:
     end = wrap_words_in_blue_format(words=f' £{int(house.total_annual_bill):,}')
     sentence = f"your energy bills for the next year will be {end}"
     return sentence
@@ -429,7 +492,7 @@ def produce_hypothetical_bill_sentence(house) -> str:
     return sentence
 
 
-def produce_bill_saving_sentence(house: "House", baseline_house: "House") -> str:
+def produce_bill_saving_sentence(house: "ScenarioResult", baseline_house: "ScenarioResult") -> str:
     saving = int(baseline_house.total_annual_bill - house.total_annual_bill)
     if saving >= 0:
         end = wrap_words_in_blue_format(words=f' £{saving:,}')
@@ -444,7 +507,8 @@ def render_carbon_chart(results_df: pd.DataFrame):
     render_savings_chart(results_df=results_df, x_variable="Your annual carbon emissions tCO2")
 
 
-def render_carbon_outputs(house: "House", solar_house: "House", hp_house: "House", both_house: "House"):
+def render_carbon_outputs(house: "ScenarioResult", solar_house: "ScenarioResult", hp_house: "ScenarioResult",
+                          both_house: "ScenarioResult"):
     current_formatted = wrap_words_in_blue_format(f'{house.total_annual_tco2:.1f}')
     solar_formatted = wrap_words_in_blue_format(f'{solar_house.total_annual_tco2:.1f}')
     hp_formatted = wrap_words_in_blue_format(f'{hp_house.total_annual_tco2:.1f}')
@@ -465,7 +529,8 @@ def render_consumption_chart(results_df: pd.DataFrame):
     render_savings_chart(results_df=results_df, x_variable="Your annual energy use kwh")
 
 
-def render_consumption_outputs(house: "House", solar_house: "House", hp_house: "House", both_house: "House"):
+def render_consumption_outputs(house: "ScenarioResult", solar_house: "ScenarioResult", hp_house: "ScenarioResult",
+                               both_house: "ScenarioResult"):
     st.markdown(f"""
                 <p class='next-steps'>We calculate that your house currently imports {produce_consumption_sentence(house)}
                     <ul>    
@@ -477,25 +542,25 @@ def render_consumption_outputs(house: "House", solar_house: "House", hp_house: "
                 unsafe_allow_html=True)
 
 
-def produce_consumption_sentence(house: 'House') -> str:
+def produce_consumption_sentence(house: 'ScenarioResult') -> str:
     sentence = (wrap_words_in_blue_format(
-                f"{int(round(house.consumption_per_fuel['electricity'].imported.annual_sum_kwh, -2)):,} ")
+                f"{int(round(house.electricity_imported_kwh, -2)):,} ")
                 + "kWh of electricity")
 
     if house.has_multiple_fuels:
         heat = (" and "
                 + wrap_words_in_blue_format(
-                    f"{int(round(house.annual_consumption_per_fuel_kwh[house.heating_system.fuel.name], -2)):,} ")
-                + f"{house.heating_system.fuel.units} of {house.heating_system.fuel.name}")
+                    f"{int(round(house.heating_fuel_kwh, -2)):,} ")
+                + f"{house.heating_fuel.units} of {house.heating_fuel.name}")
         sentence += heat
 
-    if house.solar_install.generation.overall.annual_sum_kwh != 0:
+    if house.solar_generation_kwh != 0:
         export = (f", and export "
                   + wrap_words_in_blue_format(
-                    f"{int(round(house.consumption_per_fuel['electricity'].exported.annual_sum_kwh, -2)):,} ")
+                    f"{int(round(house.electricity_exported_kwh, -2)):,} ")
                   + "of the"
                   + wrap_words_in_blue_format(
-                    f" {int(round(-house.solar_install.generation.overall.annual_sum_kwh, -2))} ")
+                    f" {int(round(house.solar_generation_kwh, -2))} ")
                   + f"kWh generated by your solar panels")
         self_use = produce_self_use_sentence(house)
         sentence = f'{sentence}{export}{self_use}'
@@ -503,7 +568,7 @@ def produce_consumption_sentence(house: 'House') -> str:
     return sentence
 
 
-def produce_self_use_sentence(house: 'House') -> str:
+def produce_self_use_sentence(house: 'ScenarioResult') -> str:
     start = wrap_words_in_blue_format(f" {int(house.percent_self_use_of_solar * 100)}%")
     extra = f" ({start} self-use)"
     return extra
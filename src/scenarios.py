@@ -0,0 +1,223 @@
+""" Evaluate several versions of a house (e.g. current, solar, heat pump, both) together.
+
+The hourly electricity and heating fuel demand of every scenario are stacked into scenarios x hours matrices, so the
+import/export split, bills, carbon and solar self-use for all of them come out of one pass of array operations rather
+than one House evaluation each."""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import constants
+from building_model import House, make_energy_and_bills_df
+
+
+@dataclass
+class ScenarioResult:
+    """ Results for one scenario. Has the same names as the House attributes it replaces, so it can be passed to
+    Retrofit and combine_results_dfs_multiple_houses in place of a House"""
+    name: str
+    heating_fuel: constants.Fuel
+    electricity_imported_kwh: float
+    electricity_exported_kwh: float
+    electricity_imported_tco2: float
+    electricity_exported_tco2: float
+    electricity_bill_imported: float
+    electricity_bill_exported: float
+    heating_fuel_kwh: float
+    heating_fuel_tco2: float
+    heating_fuel_bill: float
+    solar_generation_kwh: float
+    percent_self_use_of_solar: float
+    upfront_cost: int
+    upfront_cost_after_grants: int
+    solar_upfront_cost: int
+    heating_system_upfront_cost: int
+
+    @property
+    def has_multiple_fuels(self) -> bool:
+        return self.heating_fuel.name != 'electricity'
+
+    @property
+    def total_annual_bill(self) -> float:
+        return self.electricity_bill_imported - self.electricity_bill_exported + self.heating_fuel_bill
+
+    @property
+    def total_annual_tco2(self) -> float:
+        return self.electricity_imported_tco2 - self.electricity_exported_tco2 + self.heating_fuel_tco2
+
+    @property
+    def energy_and_bills_df(self) -> pd.DataFrame:
+        """ Same layout as House.energy_and_bills_df"""
+        kwh = {'electricity exports': - round(self.electricity_exported_kwh, 0),
+               'electricity imports': round(self.electricity_imported_kwh, 0)}
+        bill = {'electricity exports': - round(self.electricity_bill_exported, 0),
+                'electricity imports': round(self.electricity_bill_imported, 0)}
+        co2_dict = {'electricity exports': - round(self.electricity_exported_tco2, 2),
+                    'electricity imports': round(self.electricity_imported_tco2, 2)}
+        if self.has_multiple_fuels:
+            kwh[self.heating_fuel.name] = round(self.heating_fuel_kwh, 0)
+            bill[self.heating_fuel.name] = round(self.heating_fuel_bill, 0)
+            co2_dict[self.heating_fuel.name] = round(self.heating_fuel_tco2, 2)
+        return make_energy_and_bills_df(kwh=kwh, bill=bill, co2_dict=co2_dict)
+
+
+@dataclass
+class ScenarioResults:
+    """ Annual results with one entry per scenario, in the order the houses were passed in"""
+    names: List[str]
+    heating_fuels: List[constants.Fuel]
+    electricity_imported_kwh: np.ndarray
+    electricity_exported_kwh: np.ndarray
+    electricity_imported_tco2: np.ndarray
+    electricity_exported_tco2: np.ndarray
+    electricity_bill_imported: np.ndarray
+    electricity_bill_exported: np.ndarray
+    heating_fuel_kwh: np.ndarray
+    heating_fuel_tco2: np.ndarray
+    heating_fuel_bill: np.ndarray
+    solar_generation_kwh: np.ndarray
+    percent_self_use_of_solar: np.ndarray
+    upfront_cost: np.ndarray
+    upfront_cost_after_grants: np.ndarray
+    solar_upfront_cost: np.ndarray
+    heating_system_upfront_cost: np.ndarray
+
+    @property
+    def total_annual_bill(self) -> np.ndarray:
+        return self.electricity_bill_imported - self.electricity_bill_exported + self.heating_fuel_bill
+
+    @property
+    def total_annual_tco2(self) -> np.ndarray:
+        return self.electricity_imported_tco2 - self.electricity_exported_tco2 + self.heating_fuel_tco2
+
+    def __getitem__(self, name: str) -> ScenarioResult:
+        i = self.names.index(name)
+        return ScenarioResult(name=name,
+                              heating_fuel=self.heating_fuels[i],
+                              electricity_imported_kwh=self.electricity_imported_kwh[i],
+                              electricity_exported_kwh=self.electricity_exported_kwh[i],
+                              electricity_imported_tco2=self.electricity_imported_tco2[i],
+                              electricity_exported_tco2=self.electricity_exported_tco2[i],
+                              electricity_bill_imported=self.electricity_bill_imported[i],
+                              electricity_bill_exported=self.electricity_bill_exported[i],
+                              heating_fuel_kwh=self.heating_fuel_kwh[i],
+                              heating_fuel_tco2=self.heating_fuel_tco2[i],
+                              heating_fuel_bill=self.heating_fuel_bill[i],
+                              solar_generation_kwh=self.solar_generation_kwh[i],
+                              percent_self_use_of_solar=self.percent_self_use_of_solar[i],
+                              upfront_cost=int(self.upfront_cost[i]),
+                              upfront_cost_after_grants=int(self.upfront_cost_after_grants[i]),
+                              solar_upfront_cost=int(self.solar_upfront_cost[i]),
+                              heating_system_upfront_cost=int(self.heating_system_upfront_cost[i]))
+
+
+def evaluate_scenarios(houses: Dict[str, House]) -> ScenarioResults:
+    """ Evaluate all houses in one set of array operations. Keys of houses are used as the scenario names"""
+    names = list(houses.keys())
+    house_list = list(houses.values())
+    heating_fuels = [house.heating_system.fuel for house in house_list]
+    heating_is_electric = np.array([fuel.name == 'electricity' for fuel in heating_fuels])
+
+    # scenarios x hours. Imports positive, exports negative
+    base = np.stack([house.base_consumption.overall.values for house in house_list])
+    generation = np.stack([house.solar_install.generation.overall.values for house in house_list])
+    heating = np.stack([house.heating_consumption.overall.values for house in house_list])
+    electricity_pre_solar = base + np.where(heating_is_electric[:, np.newaxis], heating, 0.0)
+    electricity = electricity_pre_solar + generation
+    for i, house in enumerate(house_list):
+        if house.battery is not None:
+            electricity[i] = house.battery_dispatch.net_kwh
+    heating_fuel = np.where(heating_is_electric[:, np.newaxis], 0.0, heating)
+
+    hourly_imported = np.where(electricity < 0, 0.0, electricity)
+    hourly_exported = np.where(electricity > 0, 0.0, electricity) * -1
+    imported = hourly_imported.sum(axis=1)
+    exported = hourly_exported.sum(axis=1)
+    heating_fuel_kwh = heating_fuel.sum(axis=1)
+    solar_generation_kwh = - generation.sum(axis=1)
+
+    days_in_year = constants.BASE_YEAR_CALENDAR.days_in_year
+    elec_tariffs = [house.tariffs['electricity'] for house in house_list]
+    elec_p_per_day = np.array([tariff.p_per_day for tariff in elec_tariffs])
+    elec_p_import = np.array([tariff.p_per_unit_import for tariff in elec_tariffs])
+    elec_p_export = np.array([tariff.p_per_unit_export for tariff in elec_tariffs])
+    # Time of use tariffs get a dot product of hourly units and hourly prices
+    elec_import_cost_p = calculate_weighted_sums(
+        hourly_units=hourly_imported, annual_units=imported, per_unit=elec_p_import,
+        hourly_per_unit=[tariff.hourly_p_per_unit_import for tariff in elec_tariffs])
+    elec_export_cost_p = calculate_weighted_sums(
+        hourly_units=hourly_exported, annual_units=exported, per_unit=elec_p_export,
+        hourly_per_unit=[tariff.hourly_p_per_unit_export for tariff in elec_tariffs])
+    bill_imported = (days_in_year * elec_p_per_day + elec_import_cost_p) / 100
+    bill_exported = elec_export_cost_p / 100
+
+    heating_p_per_day = np.zeros(len(house_list))
+    heating_p_import = np.zeros(len(house_list))
+    heating_hourly_p_import = [None] * len(house_list)
+    heating_kwh_per_unit = np.ones(len(house_list))
+    heating_tco2_per_kwh = np.zeros(len(house_list))
+    heating_hourly_tco2_per_kwh = [None] * len(house_list)
+    for i, (house, fuel) in enumerate(zip(house_list, heating_fuels)):
+        if fuel.name != 'electricity':
+            heating_p_per_day[i] = house.tariffs[fuel.name].p_per_day
+            heating_p_import[i] = house.tariffs[fuel.name].p_per_unit_import
+            heating_hourly_p_import[i] = house.tariffs[fuel.name].hourly_p_per_unit_import
+            heating_kwh_per_unit[i] = fuel.converter_consumption_units_to_kwh
+            heating_tco2_per_kwh[i] = fuel.tco2_per_kwh
+            heating_hourly_tco2_per_kwh[i] = fuel.hourly_tco2_per_kwh
+    heating_cost_p = calculate_weighted_sums(
+        hourly_units=heating_fuel / heating_kwh_per_unit[:, np.newaxis],
+        annual_units=heating_fuel_kwh / heating_kwh_per_unit, per_unit=heating_p_import,
+        hourly_per_unit=heating_hourly_p_import)
+    heating_fuel_bill = np.where(heating_is_electric, 0.0, (days_in_year * heating_p_per_day + heating_cost_p) / 100)
+
+    # Weighted by the intensity in the hour the electricity is used or exported, where there is hourly data
+    elec_hourly_tco2_per_kwh = [constants.ELECTRICITY.hourly_tco2_per_kwh] * len(house_list)
+    elec_tco2_per_kwh = np.full(len(house_list), constants.ELECTRICITY.tco2_per_kwh)
+    electricity_imported_tco2 = calculate_weighted_sums(hourly_units=hourly_imported, annual_units=imported,
+                                                        per_unit=elec_tco2_per_kwh,
+                                                        hourly_per_unit=elec_hourly_tco2_per_kwh)
+    electricity_exported_tco2 = calculate_weighted_sums(hourly_units=hourly_exported, annual_units=exported,
+                                                        per_unit=elec_tco2_per_kwh,
+                                                        hourly_per_unit=elec_hourly_tco2_per_kwh)
+    heating_fuel_tco2 = calculate_weighted_sums(hourly_units=heating_fuel, annual_units=heating_fuel_kwh,
+                                                per_unit=heating_tco2_per_kwh,
+                                                hourly_per_unit=heating_hourly_tco2_per_kwh)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        self_use = np.where(solar_generation_kwh > 0,
+                            (electricity_pre_solar.sum(axis=1) - imported) / solar_generation_kwh, 0.0)
+
+    return ScenarioResults(
+        names=names,
+        heating_fuels=heating_fuels,
+        electricity_imported_kwh=imported,
+        electricity_exported_kwh=exported,
+        electricity_imported_tco2=electricity_imported_tco2,
+        electricity_exported_tco2=electricity_exported_tco2,
+        electricity_bill_imported=bill_imported,
+        electricity_bill_exported=bill_exported,
+        heating_fuel_kwh=heating_fuel_kwh,
+        heating_fuel_tco2=heating_fuel_tco2,
+        heating_fuel_bill=heating_fuel_bill,
+        solar_generation_kwh=solar_generation_kwh,
+        percent_self_use_of_solar=self_use,
+        upfront_cost=np.array([house.upfront_cost for house in house_list]),
+        upfront_cost_after_grants=np.array([house.upfront_cost_after_grants for house in house_list]),
+        solar_upfront_cost=np.array([house.solar_install.upfront_cost for house in house_list]),
+        heating_system_upfront_cost=np.array([house.heating_system_upfront_cost for house in house_list]))
+
+
+def calculate_weighted_sums(hourly_units: np.ndarray, annual_units: np.ndarray, per_unit: np.ndarray,
+                            hourly_per_unit: List[Optional[np.ndarray]]) -> np.ndarray:
+    """ Annual units times a flat rate (a price or a carbon intensity) for each scenario, or a row by row dot product of
+    hourly units and hourly rates where a scenario has them"""
+    totals = annual_units * per_unit
+    hourly_rows = [i for i, rates in enumerate(hourly_per_unit) if rates is not None]
+    if hourly_rows:
+        rates = np.stack([hourly_per_unit[i] for i in hourly_rows])
+        totals[hourly_rows] = np.einsum('ij,ij->i', hourly_units[hourly_rows], rates)
+    return totals
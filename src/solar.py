@@ -1,28 +1,39 @@
-from functools import cache
-from math import floor
-from typing import List
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-import requests
 
 import constants
+import pv_cache
+import pv_model
+import pvgis
 from constants import SolarConstants, Orientation
-from consumption import Consumption
-from roof import Polygon
+from consumption import Consumption, ConsumptionStream
+from dependencies import TrackedComponent
+from panel_layout import PanelLayout, make_panel_layout
+from roof import Polygon, PolygonGeometry, calculate_geometry, infer_orientation
 
+_prefetch_executor: Optional[ThreadPoolExecutor] = None
+_prefetches: Dict[pv_cache.ProfileKey, Future] = {}  # only those still running
+_prefetch_lock = threading.Lock()
 
-class Solar:
+
+class Solar(TrackedComponent):
+    _untracked_attributes = ('upfront_cost',)  # doesn't affect generation
 
     def __init__(self, orientation: Orientation, polygons: List[Polygon],
-                 pitch: float = SolarConstants.ROOF_PITCH_DEGREES):
+                 pitch: float = SolarConstants.ROOF_PITCH_DEGREES, number_of_panels: Optional[int] = None):
 
+        # Defaults for polygons that don't have their own orientation and pitch, e.g. for east/west split roofs
         self.orientation = orientation
         self.polygons = polygons
         self.pitch = pitch
 
-        #  just take first polygon - lat long don't need to be super precise
-        (lat, lng) = polygons[0].points[0]
+        # Centre of the polygons - lat long don't need to be super precise, but this keeps them on the roof
+        (lat, lng) = calculate_centre(polygons)
         self.latitude = lat  # Latitude, in decimal degrees, south is negative
         self.longitude = lng  # Longitude, in decimal degrees, west is negative
 
@@ -31,7 +42,9 @@ class Solar:
 
         # The below two can be overwritten by user, so they are not set up as properties.
         # This means changes in roof area after initial set up won't change the number of panels
-        self.number_of_panels = self.get_number_of_panels_from_polygons()
+        if number_of_panels is None:
+            number_of_panels = self.get_number_of_panels_from_polygons()
+        self.number_of_panels = number_of_panels
         self.kwp_per_panel = SolarConstants.KW_PEAK_PER_PANEL
 
         self.lifetime = SolarConstants.LIFETIME
@@ -43,7 +56,8 @@ class Solar:
                      self.longitude,
                      self.pitch,
                      self.peak_capacity_kw_out_per_kw_in_per_m2,
-                     self.orientation.azimuth_degrees
+                     self.orientation.azimuth_degrees,
+                     self.plane_orientations_and_pitches
                      ))
 
     def __eq__(self, other: 'Solar'):
@@ -52,6 +66,7 @@ class Solar:
                   and self.pitch == other.pitch
                   and self.peak_capacity_kw_out_per_kw_in_per_m2 == other.peak_capacity_kw_out_per_kw_in_per_m2
                   and self.orientation.azimuth_degrees == other.orientation.azimuth_degrees
+                  and self.plane_orientations_and_pitches == other.plane_orientations_and_pitches
                   )
         return result
 
@@ -61,14 +76,47 @@ class Solar:
         orientation = [orientation for orientation in SolarConstants.ORIENTATIONS.values()][0]
         default_install = cls(orientation=orientation,
                               polygons=[Polygon.make_zero_area_instance()],
-                              pitch=SolarConstants.ROOF_PITCH_DEGREES)
+                              pitch=SolarConstants.ROOF_PITCH_DEGREES,
+                              number_of_panels=0)  # nothing fits in zero area, so no need to work it out
         return default_install
 
+    @classmethod
+    def from_location(cls, latitude: float, longitude: float, orientation: Orientation, number_of_panels: int,
+                      pitch: float = SolarConstants.ROOF_PITCH_DEGREES) -> 'Solar':
+        """ For when the number of panels is known and there is no roof drawing, e.g. in batch runs"""
+        point = [longitude, latitude]
+        return cls(orientation=orientation, polygons=[Polygon(_points=[point, point, point, point, point])],
+                   pitch=pitch, number_of_panels=number_of_panels)
+
+    @property
+    def inferred_orientation(self) -> Optional[Orientation]:
+        """ Orientation of the roof worked out from the sides of the polygons drawn on it. None if they have no area"""
+        return infer_orientation(self.polygons)
+
     @property
     def roof_area(self):
+        if self.has_multiple_planes:
+            return float(sum(convert_plan_value_to_value_along_pitch(polygon.area, pitch=self.get_plane_pitch(polygon))
+                             for polygon in self.polygons))
         area = self.convert_plan_value_to_value_along_pitch(self.roof_plan_area)
         return area
 
+    def get_plane_orientation(self, polygon: Polygon) -> Orientation:
+        return polygon.orientation if polygon.orientation is not None else self.orientation
+
+    def get_plane_pitch(self, polygon: Polygon) -> float:
+        return polygon.pitch if polygon.pitch is not None else self.pitch
+
+    @property
+    def plane_orientations_and_pitches(self) -> tuple:
+        """ Azimuth and pitch of each polygon"""
+        return tuple((self.get_plane_orientation(polygon).azimuth_degrees, self.get_plane_pitch(polygon))
+                     for polygon in self.polygons)
+
+    @property
+    def has_multiple_planes(self) -> bool:
+        return any(polygon.orientation is not None or polygon.pitch is not None for polygon in self.polygons)
+
     @property
     def capacity_kwp(self):
         return self.number_of_panels * self.kwp_per_panel
@@ -96,61 +144,35 @@ class Solar:
         self.upfront_cost = None
 
     def convert_plan_value_to_value_along_pitch(self, value: float):
-        return value / np.cos(np.radians(self.pitch))
+        return convert_plan_value_to_value_along_pitch(value, pitch=self.pitch)
 
     def get_number_of_panels_from_polygons(self) -> int:
-        numbers = []
-        for polygon in self.polygons:
-            if len(polygon.dimensions) != 4:  # if not roughly rectangular
-                print("Calculated based on area")
-                number_this_polygon = self.get_number_of_panels_from_polygon_area(polygon)
-            else:
-                print("Calculated based on side lengths")
-                number_this_polygon = self.max_number_of_panels_in_a_rectangle(polygon)
-            numbers.append(number_this_polygon)
-        print(f"number this polygon: {number_this_polygon}")
-        all_panels = sum(numbers)
-        print(f"number all polygons: {all_panels}")
-        print(f"number based on area: {self.get_number_of_panels_from_polygon_area(polygon)}")
-        return all_panels
+        return int(self.get_number_of_panels_per_polygon().sum())
+
+    def get_number_of_panels_per_polygon(self) -> np.ndarray:
+        if using_panel_layouts():
+            return np.array([layout.number_of_panels for layout in self.panel_layouts], dtype=np.int64)
+        pitches = np.array([self.get_plane_pitch(polygon) for polygon in self.polygons])
+        return count_panels_in_polygons(calculate_geometry(self.polygons), pitch=pitches)
+
+    @property
+    def panel_layouts(self) -> List[PanelLayout]:
+        """ Panels laid out on each polygon"""
+        return [make_panel_layout(dimensions=polygon.dimensions, pitch=self.get_plane_pitch(polygon))
+                for polygon in self.polygons]
 
     def get_number_of_panels_from_polygon_area(self, polygon: Polygon) -> int:
         """ Very simplified assumptions to fall back on when shape not roughly rectangular"""
-        area = self.convert_plan_value_to_value_along_pitch(polygon.area)
-        usable_area = area * SolarConstants.PERCENT_SQUARE_USABLE
-        number_of_panels = floor(usable_area / SolarConstants.PANEL_AREA)
-        return number_of_panels
+        return int(count_panels_from_plan_areas(polygon.area, pitch=self.pitch))
 
     def max_number_of_panels_in_a_rectangle(self, polygon) -> int:
         """ Assume shape is rectangular. Try panels in either orientation"""
-        roof_height = self.convert_plan_value_to_value_along_pitch(polygon.average_plan_height)
-        print(f"roof height = {roof_height}, roof_width = {polygon.average_width}")
-        # Typically, installers leave a bigger border on big roofs. Increase border if fit more than 2 rows height-wise
-        if roof_height >= 2 * (SolarConstants.SMALL_PANEL_BORDER_M + SolarConstants.PANEL_HEIGHT_M):
-            border_to_use = SolarConstants.BIG_PANEL_BORDER_M
-            print("Using big border")
-        else:
-            border_to_use = SolarConstants.SMALL_PANEL_BORDER_M
-            print("Using small border")
-        print("long side up roof")
-        option_1 = self.number_of_panels_in_rectangle(side_1=polygon.average_width, side_2=roof_height,
-                                                      border=border_to_use)
-        print("short side up roof")
-        option_2 = self.number_of_panels_in_rectangle(side_1=roof_height, side_2=polygon.average_width,
-                                                      border=border_to_use)
-        number = max(option_1, option_2)
-        return number
+        return int(count_panels_in_rectangles(width=polygon.average_width, plan_height=polygon.average_plan_height,
+                                              pitch=self.pitch))
 
     @staticmethod
     def number_of_panels_in_rectangle(side_1: float, side_2: float, border: float) -> int:
-        if side_1 < border or side_2 < border:
-            number = 0
-        else:
-            rows_axis_1 = floor((side_1 - border) / SolarConstants.PANEL_WIDTH_M)
-            rows_axis_2 = floor((side_2 - border) / SolarConstants.PANEL_HEIGHT_M)
-            number = rows_axis_1 * rows_axis_2
-            print(f"{rows_axis_1} by {rows_axis_2}")
-        return number
+        return int(count_panels_in_rectangles_with_border(side_1=side_1, side_2=side_2, border=border))
 
     @property
     def number_of_panels_has_been_overwritten(self):
@@ -164,49 +186,200 @@ class Solar:
     @property
     def generation(self):
         if self.peak_capacity_kw_out_per_kw_in_per_m2 > 0:
-            profile_kwh = self.get_hourly_radiation_from_eu_api()
-            profile_kwh.index = constants.BASE_YEAR_HOURLY_INDEX
+            profile_kw = self.get_hourly_generation_per_kwp() * self.peak_capacity_kw_out_per_kw_in_per_m2
         else:
-            profile_kwh = pd.Series(index=constants.BASE_YEAR_HOURLY_INDEX, data=0)
+            profile_kw = np.zeros(constants.BASE_YEAR_CALENDAR.hours_in_year)
         # set negative as generation not consumption
-        profile_kwh_negative = profile_kwh * -1
-        generation = Consumption(hourly_profile_kwh=profile_kwh_negative, fuel=constants.ELECTRICITY)
+        stream = ConsumptionStream.from_array(values=profile_kw * -1, calendar=constants.BASE_YEAR_CALENDAR,
+                                              fuel=constants.ELECTRICITY)
+        generation = Consumption.from_stream(overall=stream)
         return generation
 
-    @cache
     def get_hourly_radiation_from_eu_api(self) -> pd.Series:
-        """ Returns series of 8760 of average solar pv power for that hour in kW. Index 0 to 8759"""
-        # API Documentation here: https://joint-research-centre.ec.europa.eu/
-        #   pvgis-photovoltaic-geographical-information-system/getting-started-pvgis/api-non-interactive-service_en
-        # Limit of 30 calls per second
-
-        tool_name = 'seriescalc'
-        api_url = f'https://re.jrc.ec.europa.eu/api/v5_2/{tool_name}'
-
-        params = {'lat': self.latitude,
-                  'lon': self.longitude,
-                  'startyear': SolarConstants.API_YEAR,  # just take one year for now
-                  'endyear': SolarConstants.API_YEAR,
-                  'pvcalculation': 1,  # estimate hourly PV production
-                  'peakpower': self.peak_capacity_kw_out_per_kw_in_per_m2,  # installed capacity
-                  'mountingplace': "building",
-                  'loss': SolarConstants.SYSTEM_LOSS,
-                  'angle': self.pitch,
-                  'aspect': self.orientation.azimuth_degrees,
-                  'outputformat': "json"
-                  }
-        print("making api call")
-        response = requests.get(api_url, params=params)
-
-        if response.status_code == 200:
-            dictr = response.json()
-            df = pd.DataFrame(dictr['outputs']['hourly'])
-            # can add timeseries as index later if needed
-            pv_power_kw = df['P'] / 1000  # source data in W so convert to kW
-            pv_power_kw.index = constants.BASE_YEAR_HOURLY_INDEX
-        else:
-            print(response.status_code)
-            print(response.text)
-            raise requests.ConnectionError
+        """ Returns series of 8760 of average solar pv power for that hour in kW for this install's capacity"""
+        profile_kw = self.get_hourly_generation_per_kwp() * self.peak_capacity_kw_out_per_kw_in_per_m2
+        return pd.Series(profile_kw, index=constants.BASE_YEAR_HOURLY_INDEX)
+
+    @property
+    def pv_cache_key(self) -> pv_cache.ProfileKey:
+        """ For the install's own orientation and pitch, which all polygons without their own share"""
+        return pv_cache.make_key(latitude=self.latitude, longitude=self.longitude, pitch=self.pitch,
+                                 aspect=self.orientation.azimuth_degrees)
 
-        return pv_power_kw
+    @property
+    def pv_cache_keys_and_shares(self) -> Dict[pv_cache.ProfileKey, float]:
+        """ Profile for each distinct orientation and pitch, with the share of the panels on planes facing that way"""
+        if not self.has_multiple_planes:
+            return {self.pv_cache_key: 1.0}
+        panels = self.get_number_of_panels_per_polygon().astype(np.float64)
+        if panels.sum() == 0:  # nothing fits, or no drawing: share by area, or equally
+            panels = np.array([polygon.area for polygon in self.polygons])
+            if panels.sum() == 0:
+                panels = np.ones(len(self.polygons))
+        shares = {}
+        for polygon, share in zip(self.polygons, (panels / panels.sum()).tolist()):
+            key = pv_cache.make_key(latitude=self.latitude, longitude=self.longitude,
+                                    pitch=self.get_plane_pitch(polygon),
+                                    aspect=self.get_plane_orientation(polygon).azimuth_degrees)
+            shares[key] = shares.get(key, 0.0) + share
+        return shares
+
+    def get_hourly_generation_per_kwp(self) -> np.ndarray:
+        """ Hourly kW output per kWp installed. Comes from the on-disk cache where possible, and because output is
+        linear in capacity, changing the number or size of panels never needs a new API call.
+
+        For roofs with several planes, the profiles of the planes are fetched at the same time and added up, weighted
+        by the share of the panels on each"""
+        keys_and_shares = self.pv_cache_keys_and_shares
+        if len(keys_and_shares) == 1:
+            key = next(iter(keys_and_shares))
+            prefetch = _prefetches.get(key)
+            if prefetch is not None and prefetch.exception() is None:  # waits for it if still running
+                return prefetch.result()
+            return get_hourly_generation_per_kwp(key=key)
+
+        futures = prefetch_hourly_generation_per_kwp_for_keys(keys=list(keys_and_shares))
+        profiles = np.stack([future.result() for future in futures])  # planes x hours
+        return np.array(list(keys_and_shares.values())) @ profiles
+
+    def prefetch_generation_for_planes(self) -> List[Future]:
+        """ Start fetching the profile of every plane of the roof"""
+        return prefetch_hourly_generation_per_kwp_for_keys(keys=list(self.pv_cache_keys_and_shares))
+
+    def prefetch_generation_for_all_orientations(self) -> Dict[str, Future]:
+        """ Start fetching the generation profile for every orientation on a background thread pool, so it is ready
+        by the time the user picks an orientation and gets to the results"""
+        keys = {name: pv_cache.make_key(latitude=self.latitude, longitude=self.longitude, pitch=self.pitch,
+                                        aspect=orientation.azimuth_degrees)
+                for name, orientation in SolarConstants.ORIENTATIONS.items()}
+        return dict(zip(keys, prefetch_hourly_generation_per_kwp_for_keys(keys=list(keys.values()))))
+
+
+def get_hourly_generation_per_kwp(key: pv_cache.ProfileKey) -> np.ndarray:
+    if using_local_pv_model():
+        # Quick to calculate and memoised by the model, and the cache only holds PVGIS profiles
+        return pv_model.get_default_model().get_hourly_generation_per_kwp(key=key)
+    return pv_cache.get_default_cache().get_or_fetch(
+        key=key, fetch=lambda: pvgis.get_default_client().get_hourly_generation_per_kwp(key=key))
+
+
+def using_local_pv_model() -> bool:
+    return os.environ.get("PV_BACKEND", SolarConstants.PV_BACKEND) == 'local'
+
+
+def using_panel_layouts() -> bool:
+    return os.environ.get("PANEL_COUNT_METHOD", SolarConstants.PANEL_COUNT_METHOD) == 'layout'
+
+
+def prefetch_hourly_generation_per_kwp(key: pv_cache.ProfileKey) -> Future:
+    """ Fetch in the background. Returns the future already running for this key if there is one"""
+    with _prefetch_lock:
+        future = _prefetches.get(key)
+        if future is not None:
+            return future
+        future = _get_prefetch_executor().submit(get_hourly_generation_per_kwp, key)
+        _prefetches[key] = future
+    # Once finished the profile is in the cache, so stop holding on to it here
+    future.add_done_callback(lambda _: _forget_prefetch(key=key, future=future))
+    return future
+
+
+def prefetch_hourly_generation_per_kwp_for_keys(keys: List[pv_cache.ProfileKey]) -> List[Future]:
+    """ A future for each key. PVGIS has a fetch per key, but the local model works out all the keys not already
+    running in one batch on the prefetch pool. Either way errors end up in the futures rather than being raised"""
+    if not using_local_pv_model():
+        return [prefetch_hourly_generation_per_kwp(key=key) for key in keys]
+    with _prefetch_lock:
+        futures = {key: _prefetches.get(key) for key in keys}
+        to_calculate = [key for key, future in futures.items() if future is None]
+        for key in to_calculate:
+            futures[key] = _prefetches[key] = Future()
+        if to_calculate:
+            batch = _get_prefetch_executor().submit(calculate_with_local_model, to_calculate)
+    # Callbacks run straight away if already done, so add them without holding the lock
+    for key in to_calculate:
+        futures[key].add_done_callback(lambda future, key=key: _forget_prefetch(key=key, future=future))
+    if to_calculate:
+        batch.add_done_callback(lambda batch: _set_batch_results(batch=batch,
+                                                                 futures=[futures[key] for key in to_calculate]))
+    return [futures[key] for key in keys]
+
+
+def calculate_with_local_model(keys: List[pv_cache.ProfileKey]) -> List[np.ndarray]:
+    return pv_model.get_default_model().get_hourly_generation_per_kwp_for_keys(keys)
+
+
+def _set_batch_results(batch: Future, futures: List[Future]):
+    error = batch.exception()
+    for i, future in enumerate(futures):
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(batch.result()[i])
+
+
+def _get_prefetch_executor() -> ThreadPoolExecutor:
+    """ Call with _prefetch_lock held"""
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        _prefetch_executor = ThreadPoolExecutor(max_workers=SolarConstants.PV_PREFETCH_WORKERS,
+                                                thread_name_prefix='pv_prefetch')
+    return _prefetch_executor
+
+
+def _forget_prefetch(key: pv_cache.ProfileKey, future: Future):
+    with _prefetch_lock:
+        if _prefetches.get(key) is future:
+            del _prefetches[key]
+
+
+def calculate_centre(polygons: List[Polygon]) -> Tuple[float, float]:
+    """ lat, lng of the centre of the polygons, weighted by area. The first point if they have no area"""
+    geometry = calculate_geometry(polygons)
+    areas = geometry.areas
+    if not areas.sum() > 0:
+        return polygons[0].points[0]
+    lat, lng = (areas @ geometry.centroids / areas.sum()).tolist()
+    return lat, lng
+
+
+def convert_plan_value_to_value_along_pitch(value: float | np.ndarray, pitch: float | np.ndarray):
+    return value / np.cos(np.radians(pitch))
+
+
+def count_panels_in_polygons(geometry: PolygonGeometry, pitch: float | np.ndarray) -> np.ndarray:
+    """ Number of panels that fit on each polygon. Roughly rectangular (4 sided) polygons are filled row by row,
+    others fall back on their area. pitch can be one value per polygon"""
+    by_rectangle = count_panels_in_rectangles(width=geometry.average_widths,
+                                              plan_height=geometry.average_plan_heights, pitch=pitch)
+    by_area = count_panels_from_plan_areas(geometry.areas, pitch=pitch)
+    return np.where(geometry.number_of_sides == 4, by_rectangle, by_area)
+
+
+def count_panels_from_plan_areas(plan_areas: float | np.ndarray, pitch: float | np.ndarray) -> np.ndarray:
+    """ Very simplified assumptions to fall back on when shape not roughly rectangular"""
+    area = convert_plan_value_to_value_along_pitch(plan_areas, pitch=pitch)
+    usable_area = area * SolarConstants.PERCENT_SQUARE_USABLE
+    return np.floor(usable_area / SolarConstants.PANEL_AREA).astype(np.int64)
+
+
+def count_panels_in_rectangles(width: float | np.ndarray, plan_height: float | np.ndarray,
+                               pitch: float | np.ndarray) -> np.ndarray:
+    """ Assume shapes are rectangular. Try panels in either orientation"""
+    roof_height = convert_plan_value_to_value_along_pitch(plan_height, pitch=pitch)
+    # Typically, installers leave a bigger border on big roofs. Increase border if fit more than 2 rows height-wise
+    border = np.where(roof_height >= 2 * (SolarConstants.SMALL_PANEL_BORDER_M + SolarConstants.PANEL_HEIGHT_M),
+                      SolarConstants.BIG_PANEL_BORDER_M, SolarConstants.SMALL_PANEL_BORDER_M)
+    long_side_up_roof = count_panels_in_rectangles_with_border(side_1=width, side_2=roof_height, border=border)
+    short_side_up_roof = count_panels_in_rectangles_with_border(side_1=roof_height, side_2=width, border=border)
+    return np.maximum(long_side_up_roof, short_side_up_roof)
+
+
+def count_panels_in_rectangles_with_border(side_1: float | np.ndarray, side_2: float | np.ndarray,
+                                           border: float | np.ndarray) -> np.ndarray:
+    side_1, side_2 = np.asarray(side_1, dtype=np.float64), np.asarray(side_2, dtype=np.float64)
+    with np.errstate(invalid='ignore'):  # nan sides, e.g. for polygons that aren't 4 sided, fit no panels
+        fits = (side_1 >= border) & (side_2 >= border)
+        rows_axis_1 = np.floor((side_1 - border) / SolarConstants.PANEL_WIDTH_M)
+        rows_axis_2 = np.floor((side_2 - border) / SolarConstants.PANEL_HEIGHT_M)
+    return np.where(fits, rows_axis_1 * rows_axis_2, 0).astype(np.int64)
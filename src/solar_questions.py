@@ -1,11 +1,16 @@
+import dataclasses
+
 import streamlit as st
 
 from typing import Optional, List
 
-from constants import SolarConstants, CLASS_NAME_OF_SIDEBAR_DIV
+from constants import SolarConstants, CLASS_NAME_OF_SIDEBAR_DIV, Orientation
 import roof
 from solar import Solar
 
+FROM_DRAWING = "From my drawing"
+SAME_AS_ABOVE = "Same as above"
+
 
 def get_solar_install_from_session_state_if_exists_or_create_default():
     if "solar_install" not in st.session_state:
@@ -29,17 +34,24 @@ def render(solar_install: Solar) -> "Solar":
     )
 
     polygons = render_map()
-    orientation = render_orientation_questions(solar_install)
+    orientation = render_orientation_questions(solar_install, inferred_orientation=roof.infer_orientation(polygons))
+    plane_orientations = render_plane_orientation_questions(polygons)
 
-    # if polygons changed (figure out how to persist polygons when page changes)
-    if polygons != solar_install.polygons:
+    # if polygons changed (figure out how to persist polygons when page changes). Only compare the drawing: a change
+    # to the orientation of one plane is applied to the existing install, so it keeps its number of panels
+    if [polygon.points for polygon in polygons] != [polygon.points for polygon in solar_install.polygons]:
         print("Setting up solar install based on polygons")
-        solar_install = Solar(orientation=orientation, polygons=polygons)
+        solar_install = Solar(orientation=orientation, polygons=with_plane_orientations(polygons, plane_orientations))
+        if solar_install.roof_plan_area > 0:
+            solar_install.prefetch_generation_for_all_orientations()  # ready by the time the user gets to results
+            solar_install.prefetch_generation_for_planes()  # in case inferred from drawing
         st.session_state.number_of_panels = solar_install.number_of_panels
         st.session_state.number_of_panels_defined_by_dropdown = False
     else:
         print("Not changing default solar install as no polygons drawn")
         solar_install.orientation = orientation  # in case orientation changed
+        if plane_orientations != [polygon.orientation for polygon in solar_install.polygons]:
+            solar_install.polygons = with_plane_orientations(solar_install.polygons, plane_orientations)
 
     solar_install = render_solar_assumptions_sidebar(solar_install)
     solar_install = render_results(solar_install)
@@ -60,20 +72,53 @@ def render_map() -> Optional[List[roof.Polygon]]:
     return polygons
 
 
-def render_orientation_questions(solar_install: Solar):
+def render_orientation_questions(solar_install: Solar, inferred_orientation: Optional[Orientation] = None):
     st.subheader("Orientation")
     orientation_options = [name for name, _ in SolarConstants.ORIENTATIONS.items()]
-    if "orientation_name" not in st.session_state:
-        st.session_state.orientation_name = solar_install.orientation.name
+    if inferred_orientation is not None:
+        orientation_options = [FROM_DRAWING] + orientation_options
+    if "orientation_name" not in st.session_state or st.session_state.orientation_name not in orientation_options:
+        if inferred_orientation is not None:
+            st.session_state.orientation_name = FROM_DRAWING
+        else:
+            st.session_state.orientation_name = solar_install.orientation.name
     orientation_name: str = st.selectbox(label="Enter the orientation of the side of the roof you have drawn on",
                                          options=orientation_options,
                                          key="orientation_name",
+                                         format_func=lambda name: (f"{inferred_orientation.name}, from your drawing"
+                                                                   if name == FROM_DRAWING else name),
                                          help="The more south-facing your roof, the more energy your solar panels will "
-                                              "generate")
+                                              "generate. We guess from your drawing, assuming you've drawn on a roof "
+                                              "that is wider than it is deep")
+    if orientation_name == FROM_DRAWING:
+        return inferred_orientation
     orientation = SolarConstants.ORIENTATIONS[orientation_name]
     return orientation
 
 
+def render_plane_orientation_questions(polygons: List[roof.Polygon]) -> List[Optional[Orientation]]:
+    """ For roofs drawn as more than one polygon, e.g. east/west split roofs. The orientation of each polygon, or None
+    if it faces the same way as the rest"""
+    if len(polygons) < 2:
+        return [None] * len(polygons)
+    plane_orientations = []
+    with st.expander("My roof faces more than one way"):
+        options = [SAME_AS_ABOVE] + [name for name, _ in SolarConstants.ORIENTATIONS.items()]
+        for i in range(len(polygons)):
+            orientation_name = st.selectbox(label=f"Orientation of roof {i + 1}", options=options,
+                                            key=f"plane_orientation_name_{i}")
+            plane_orientations.append(None if orientation_name == SAME_AS_ABOVE
+                                      else SolarConstants.ORIENTATIONS[orientation_name])
+    return plane_orientations
+
+
+def with_plane_orientations(polygons: List[roof.Polygon],
+                            plane_orientations: List[Optional[Orientation]]) -> List[roof.Polygon]:
+    """ New polygons rather than changing them in place, as copies of the solar install share them"""
+    return [dataclasses.replace(polygon, orientation=orientation)
+            for polygon, orientation in zip(polygons, plane_orientations)]
+
+
 def render_solar_assumptions_sidebar(solar_install: 'Solar') -> 'Solar':
     with st.sidebar:
         st.header("Solar inputs")
@@ -0,0 +1,173 @@
+""" Rank a catalogue of tariffs for a house and each of its upgrade options.
+
+The catalogue for each fuel is compiled once into a tariffs x hours price matrix (flat tariffs are just a constant
+row), so the bills for every tariff come out of one matrix-vector product per house rather than one House
+evaluation per tariff.
+
+Catalogues are JSON (a list of tariffs) or CSV (one tariff per row), with fields:
+    name, fuel, p_per_day, p_per_unit_import, p_per_unit_export (optional),
+    import_bands and export_bands (optional): daily price bands, e.g. "0-7:9.5;16-19:38" in CSV, or a list of
+        {"start_hour": 0, "end_hour": 7, "p_per_unit": 9.5} in JSON. The p_per_unit_ prices apply outside the bands
+"""
+
+import csv
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import constants
+import time_of_use
+from building_model import House, Tariff
+from hourly_calendar import HourlyCalendar
+from time_of_use import PriceBand
+
+
+@dataclass
+class CatalogueEntry:
+    name: str
+    fuel: constants.Fuel
+    p_per_day: float
+    p_per_unit_import: float
+    p_per_unit_export: float = 0.0
+    import_bands: List[PriceBand] = field(default_factory=list)
+    export_bands: List[PriceBand] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, row: Dict) -> 'CatalogueEntry':
+        fuels = {fuel.name: fuel for fuel in constants.FUELS}
+        if row['fuel'] not in fuels:
+            raise ValueError(f"Tariff {row['name']} has unknown fuel {row['fuel']}")
+        export = row.get('p_per_unit_export')
+        return cls(name=row['name'],
+                   fuel=fuels[row['fuel']],
+                   p_per_day=float(row['p_per_day']),
+                   p_per_unit_import=float(row['p_per_unit_import']),
+                   p_per_unit_export=float(export) if export not in (None, '') else 0.0,
+                   import_bands=parse_bands(row.get('import_bands')),
+                   export_bands=parse_bands(row.get('export_bands')))
+
+    def hourly_import_prices(self, calendar: HourlyCalendar = constants.BASE_YEAR_CALENDAR) -> np.ndarray:
+        return time_of_use.make_hourly_prices_from_bands(bands=self.import_bands,
+                                                         default_p_per_unit=self.p_per_unit_import,
+                                                         calendar=calendar)
+
+    def hourly_export_prices(self, calendar: HourlyCalendar = constants.BASE_YEAR_CALENDAR) -> np.ndarray:
+        return time_of_use.make_hourly_prices_from_bands(bands=self.export_bands,
+                                                         default_p_per_unit=self.p_per_unit_export,
+                                                         calendar=calendar)
+
+    def to_tariff(self) -> Tariff:
+        """ To switch a house onto this tariff"""
+        if not self.import_bands and not self.export_bands:
+            return Tariff(fuel=self.fuel, p_per_day=self.p_per_day, p_per_unit_import=self.p_per_unit_import,
+                          p_per_unit_export=self.p_per_unit_export)
+        return Tariff.from_price_bands(fuel=self.fuel, p_per_day=self.p_per_day,
+                                       default_p_per_unit_import=self.p_per_unit_import,
+                                       import_bands=self.import_bands, p_per_unit_export=self.p_per_unit_export,
+                                       export_bands=self.export_bands if self.export_bands else None)
+
+
+def parse_bands(bands: Optional[str | List[Dict]]) -> List[PriceBand]:
+    """ From a list of dicts (JSON) or a string like "0-7:9.5;16-19:38" (CSV)"""
+    if not bands:
+        return []
+    if isinstance(bands, str):
+        parsed = []
+        for band in bands.split(';'):
+            hours, p_per_unit = band.split(':')
+            start_hour, end_hour = hours.split('-')
+            parsed.append(PriceBand(start_hour=int(start_hour), end_hour=int(end_hour), p_per_unit=float(p_per_unit)))
+        return parsed
+    return [PriceBand(start_hour=int(band['start_hour']), end_hour=int(band['end_hour']),
+                      p_per_unit=float(band['p_per_unit'])) for band in bands]
+
+
+@dataclass
+class CompiledTariffs:
+    """ All tariffs in a catalogue for one fuel, with a row of hourly prices per tariff"""
+    fuel: constants.Fuel
+    names: List[str]
+    p_per_day: np.ndarray  # (tariffs,)
+    prices: np.ndarray  # (tariffs, 2 * hours): import prices for each hour, then export prices for each hour
+
+    @classmethod
+    def from_entries(cls, fuel: constants.Fuel, entries: List[CatalogueEntry],
+                     calendar: HourlyCalendar = constants.BASE_YEAR_CALENDAR) -> 'CompiledTariffs':
+        prices = np.empty((len(entries), 2 * calendar.hours_in_year))
+        for i, entry in enumerate(entries):
+            prices[i, :calendar.hours_in_year] = entry.hourly_import_prices(calendar=calendar)
+            prices[i, calendar.hours_in_year:] = entry.hourly_export_prices(calendar=calendar)
+        prices.flags.writeable = False
+        return cls(fuel=fuel, names=[entry.name for entry in entries],
+                   p_per_day=np.array([entry.p_per_day for entry in entries]), prices=prices)
+
+    def calculate_annual_bills(self, imported_units: np.ndarray, exported_units: np.ndarray,
+                               days_in_year: float) -> np.ndarray:
+        """ Net annual bill in £ for each tariff, from hourly imports and exports in fuel units"""
+        units = np.concatenate([imported_units, -exported_units])  # so exports are paid for at the export price
+        return (days_in_year * self.p_per_day + self.prices @ units) / 100
+
+
+class TariffCatalogue:
+
+    def __init__(self, entries: List[CatalogueEntry], calendar: HourlyCalendar = constants.BASE_YEAR_CALENDAR):
+        self.entries = entries
+        self.calendar = calendar
+        # Compiled once for the catalogue, then reused for every house ranked against it
+        self.compiled: Dict[str, CompiledTariffs] = {}
+        for fuel in constants.FUELS:
+            fuel_entries = [entry for entry in entries if entry.fuel.name == fuel.name]
+            if fuel_entries:
+                self.compiled[fuel.name] = CompiledTariffs.from_entries(fuel=fuel, entries=fuel_entries,
+                                                                        calendar=calendar)
+
+    @classmethod
+    def from_file(cls, path: Path | str = constants.TARIFF_CATALOGUE_PATH) -> 'TariffCatalogue':
+        path = Path(path)
+        if path.suffix == '.json':
+            rows = json.loads(path.read_text())
+        else:
+            with open(path, newline='') as file:
+                rows = list(csv.DictReader(file))
+        return cls(entries=[CatalogueEntry.from_dict(row) for row in rows])
+
+    def entry(self, name: str) -> CatalogueEntry:
+        return next(entry for entry in self.entries if entry.name == name)
+
+    def calculate_annual_bills(self, house: House) -> Dict[str, pd.Series]:
+        """ Annual bill for each tariff in the catalogue, for each fuel the house uses"""
+        bills = {}
+        for fuel_name, consumption in house.consumption_per_fuel.items():
+            if fuel_name not in self.compiled:
+                continue
+            if consumption.overall.calendar is not self.calendar:
+                raise ValueError("House and catalogue must be on the same calendar")
+            fuel = consumption.fuel
+            bills[fuel_name] = pd.Series(
+                self.compiled[fuel_name].calculate_annual_bills(
+                    imported_units=fuel.convert_kwh_to_fuel_units(consumption.imported.values),
+                    exported_units=fuel.convert_kwh_to_fuel_units(consumption.exported.values),
+                    days_in_year=self.calendar.days_in_year),
+                index=self.compiled[fuel_name].names, name='annual_bill')
+        return bills
+
+    def rank(self, houses: Dict[str, House]) -> pd.DataFrame:
+        """ Every tariff for every fuel each house uses, cheapest first within each house and fuel"""
+        dfs = []
+        for scenario, house in houses.items():
+            for fuel_name, bills in self.calculate_annual_bills(house).items():
+                df = bills.sort_values().rename_axis('tariff').reset_index()
+                df.insert(0, 'fuel', fuel_name)
+                df.insert(0, 'scenario', scenario)
+                df['rank'] = np.arange(1, len(df) + 1)
+                dfs.append(df)
+        return pd.concat(dfs, ignore_index=True)
+
+    def best_tariffs(self, houses: Dict[str, House]) -> pd.DataFrame:
+        """ Cheapest tariff for each fuel each house uses"""
+        ranked = self.rank(houses)
+        return ranked[ranked['rank'] == 1].reset_index(drop=True)
@@ -0,0 +1,65 @@
+""" Hourly price arrays for time of use tariffs, e.g. Economy 7, cheap overnight windows or dynamic prices.
+
+Prices are worked out once, when the tariff is set up, as a read only array with one price per hour of the year.
+Billing is then a dot product of that array with hourly consumption."""
+
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+import constants
+from hourly_calendar import HourlyCalendar
+
+
+@dataclass(frozen=True)
+class PriceBand:
+    """ A price that applies every day from start_hour up to (not including) end_hour. Bands can wrap past
+    midnight, e.g. 23 to 6"""
+    start_hour: int
+    end_hour: int
+    p_per_unit: float
+
+    def __post_init__(self):
+        if not (0 <= self.start_hour < 24 and 0 <= self.end_hour <= 24):
+            raise ValueError("Band hours must be between 0 and 24")
+
+    def applies(self, hour_of_day: np.ndarray) -> np.ndarray:
+        if self.start_hour < self.end_hour:
+            return (hour_of_day >= self.start_hour) & (hour_of_day < self.end_hour)
+        return (hour_of_day >= self.start_hour) | (hour_of_day < self.end_hour)
+
+
+def freeze_prices(prices: np.ndarray) -> np.ndarray:
+    if is_frozen(prices):  # so setting prices to the array they already are isn't seen as a change
+        return prices
+    prices = np.array(prices, dtype=np.float64)  # own copy so it can't be changed from outside
+    prices.flags.writeable = False
+    return prices
+
+
+def is_frozen(prices: np.ndarray) -> bool:
+    """ A read only float64 array that owns its data, as made by freeze_prices"""
+    return (isinstance(prices, np.ndarray) and prices.dtype == np.float64 and prices.base is None
+            and not prices.flags.writeable)
+
+
+def make_hourly_prices_from_bands(bands: List[PriceBand], default_p_per_unit: float,
+                                  calendar: HourlyCalendar = constants.BASE_YEAR_CALENDAR) -> np.ndarray:
+    """ Default price outside all bands. Where bands overlap, the later one in the list wins"""
+    hour_of_day = calendar.index.hour.to_numpy()
+    prices = np.full(calendar.hours_in_year, default_p_per_unit, dtype=np.float64)
+    for band in bands:
+        prices[band.applies(hour_of_day)] = band.p_per_unit
+    return freeze_prices(prices)
+
+
+def make_hourly_prices_from_series(prices: pd.Series,
+                                   calendar: HourlyCalendar = constants.BASE_YEAR_CALENDAR) -> np.ndarray:
+    """ For dynamic tariffs with a price per hour, e.g. half hourly Agile prices averaged to hourly"""
+    if len(prices) != calendar.hours_in_year:
+        raise ValueError(f"Need one price for each of the {calendar.hours_in_year} hours in the year")
+    if prices.isna().any():
+        raise ValueError("Prices must not have gaps")
+    return freeze_prices(prices.to_numpy())
@@ -0,0 +1,49 @@
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .context import src
+import src.batch as batch
+
+HOMES = [
+    {'id': 'a', 'latitude': '52.195', 'longitude': '0.132', 'house_type': 'Terrace', 'heating_system': 'Gas boiler',
+     'number_of_panels': '10', 'orientation': 'Southwest', 'p_per_kwh_elec_import': '30'},
+    {'id': 'b', 'latitude': '51.5', 'longitude': '-0.12', 'house_type': 'Flat', 'heating_system': 'Oil boiler',
+     'annual_heat_demand_kwh': '5000', 'number_of_panels': '0'},
+    {'id': 'c', 'latitude': '51.5', 'longitude': '-0.12', 'house_type': 'Castle'},
+]
+
+
+def test_home_spec_from_csv_strings():
+    home = batch.HomeSpec.from_dict(HOMES[0])
+    assert home.latitude == 52.195
+    assert home.number_of_panels == 10
+    assert home.p_per_kwh_elec_import == 30.0
+    assert home.p_per_kwh_elec_export is None
+    assert home.heating_system == 'Gas boiler'
+
+
+def test_evaluate_home_matches_house_results():
+    row = batch.evaluate_home(batch.HomeSpec.from_dict(HOMES[1]))
+    house = batch.set_up_house(batch.HomeSpec.from_dict(HOMES[1]))
+    assert house.envelope.annual_heating_demand == 5000
+    np.testing.assert_almost_equal(row['current_annual_bill'], house.total_annual_bill, decimal=2)
+    assert row['solar_electricity_exported_kwh'] == 0  # no panels
+    assert set(row.keys()) == set(batch.output_columns())
+
+
+def test_evaluate_homes_streams_results_in_order_and_reports_errors():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(batch.evaluate_homes(rows=HOMES, executor=executor, window=2))
+    assert [result['id'] for result in results] == ['a', 'b', 'c']
+    assert results[0]['error'] == '' and results[1]['error'] == ''
+    assert results[2]['error'].startswith('KeyError')
+    assert results[0]['solar_electricity_exported_kwh'] > 0
+    assert results[0]['both_bill_savings'] > results[0]['heat_pump_bill_savings']
+
+    output = io.StringIO()
+    assert batch.write_results(results=results, file=output, output_format='csv') == 3
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert [row['id'] for row in rows] == ['a', 'b', 'c']
@@ -0,0 +1,83 @@
+import numpy as np
+
+from .context import src
+from src import battery
+
+
+def make_net_profile() -> np.ndarray:
+    """ Imports overnight, solar exports in the middle of the day"""
+    rng = np.random.default_rng(0)
+    hour = np.arange(8760) % 24
+    return 0.5 + 0.3 * rng.random(8760) - np.where((hour > 8) & (hour < 17), 3 * rng.random(8760), 0)
+
+
+def dispatch_hour_by_hour(net_kwh, capacity_kwh, power_kw, round_trip_efficiency, grid_charge_hours=None):
+    """ Straightforward version to check against"""
+    efficiency = np.sqrt(round_trip_efficiency)
+    state = 0.0
+    net_after, states = [], []
+    for hour, net in enumerate(net_kwh):
+        if grid_charge_hours is not None and grid_charge_hours[hour]:
+            stored = min(power_kw * efficiency, capacity_kwh - state)
+            state += stored
+            net_after.append(net + stored / efficiency)
+        elif net < 0:
+            stored = min(min(-net, power_kw) * efficiency, capacity_kwh - state)
+            state += stored
+            net_after.append(net + stored / efficiency)
+        else:
+            taken = min(min(net, power_kw) / efficiency, state)
+            state -= taken
+            net_after.append(net - taken * efficiency)
+        states.append(state)
+    return np.array(net_after), np.array(states)
+
+
+def test_dispatch_matches_hour_by_hour():
+    net = make_net_profile()
+    result = battery.Battery(capacity_kwh=5, power_kw=2.5, round_trip_efficiency=0.9).dispatch(net)
+    expected_net, expected_states = dispatch_hour_by_hour(net, capacity_kwh=5, power_kw=2.5, round_trip_efficiency=0.9)
+    np.testing.assert_array_almost_equal(result.net_kwh, expected_net)
+    np.testing.assert_array_almost_equal(result.state_of_charge_kwh, expected_states)
+
+    assert result.state_of_charge_kwh.max() <= 5 + 1e-9
+    assert result.state_of_charge_kwh.min() >= 0
+    assert result.charge_kwh.max() <= 2.5 / np.sqrt(0.9) + 1e-9  # power limit applies to stored energy
+    assert result.imported_kwh < np.where(net > 0, net, 0).sum()
+    assert result.exported_kwh < np.where(net < 0, -net, 0).sum()
+    # Energy balance: everything charged comes back out less losses, apart from what's left in the battery
+    np.testing.assert_almost_equal(result.discharge_kwh.sum(),
+                                   (result.charge_kwh.sum() * 0.9 ** 0.5 - result.state_of_charge_kwh[-1]) * 0.9 ** 0.5)
+
+
+def test_dispatch_charges_from_grid_when_cheap():
+    net = make_net_profile()
+    hour = np.arange(8760) % 24
+    prices = np.where(hour < 5, 9.0, 30.0)
+    install = battery.Battery(capacity_kwh=5, power_kw=2.5, hourly_p_per_unit_import=prices)
+    assert (install.grid_charge_hours == (hour < 5)).all()
+
+    result = install.dispatch(net)
+    expected_net, expected_states = dispatch_hour_by_hour(net, capacity_kwh=5, power_kw=2.5, round_trip_efficiency=0.9,
+                                                          grid_charge_hours=hour < 5)
+    np.testing.assert_array_almost_equal(result.net_kwh, expected_net)
+    np.testing.assert_array_almost_equal(result.state_of_charge_kwh, expected_states)
+    assert (result.net_kwh * prices).sum() < (battery.Battery(capacity_kwh=5, power_kw=2.5).dispatch(net).net_kwh
+                                              * prices).sum()
+
+    # Not worth charging from the grid if the saving doesn't cover the losses
+    flat_ish = np.where(hour < 5, 29.0, 30.0)
+    assert not battery.Battery(hourly_p_per_unit_import=flat_ish, round_trip_efficiency=0.9).grid_charge_hours.any()
+
+
+def test_dispatch_many_sizes_at_once():
+    net = make_net_profile()
+    capacities = np.arange(0, 21, 2.5)
+    results = battery.dispatch_batteries(net_kwh=net, capacity_kwh=capacities, power_kw=3)
+    assert results.net_kwh.shape == (len(capacities), len(net))
+    for i, capacity in enumerate(capacities):
+        expected_net, _ = dispatch_hour_by_hour(net, capacity_kwh=capacity, power_kw=3, round_trip_efficiency=0.9)
+        np.testing.assert_array_almost_equal(results[i].net_kwh, expected_net)
+
+    np.testing.assert_array_almost_equal(results.net_kwh[0], net)  # no battery
+    assert (np.diff(results.imported_kwh) <= 1e-9).all()  # bigger batteries never import more
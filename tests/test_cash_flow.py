@@ -0,0 +1,59 @@
+import numpy as np
+
+from .context import src
+from src import cash_flow
+
+
+def make_inputs() -> cash_flow.CashFlowInputs:
+    """ Solar only, heat pump only, and one that never pays back"""
+    return cash_flow.CashFlowInputs(upfront_cost=[5000, 3000, 10000],
+                                    first_year_bill_savings=[500, 200, 100],
+                                    first_year_solar_bill_savings=[500, 0, 0],
+                                    heating_replacement_cost=[0, 2000, 0],
+                                    heating_lifetime=[20, 20, 20])
+
+
+def test_npv_matches_sum_year_by_year():
+    results = cash_flow.calculate_cash_flows(make_inputs(), years=25, discount_rate=0.035, price_escalation=0.02,
+                                             solar_degradation=0.005)
+
+    npv = -5000 + sum(500 * 0.995 ** (year - 1) * 1.02 ** (year - 1) / 1.035 ** year for year in range(1, 26))
+    np.testing.assert_almost_equal(results.npv[0], npv)
+
+    npv = (-3000 + sum(200 * 1.02 ** (year - 1) / 1.035 ** year for year in range(1, 26))
+           - 2000 / 1.035 ** 20 + 2000 * 15 / 20 / 1.035 ** 25)
+    np.testing.assert_almost_equal(results.npv[1], npv)
+
+
+def test_irr_makes_npv_zero():
+    inputs = make_inputs()
+    irr = cash_flow.calculate_cash_flows(inputs).irr
+    assert irr[2] < 0  # never pays back
+
+    for i in range(3):
+        at_irr = cash_flow.calculate_cash_flows(inputs, discount_rate=irr[i])
+        np.testing.assert_almost_equal(at_irr.npv[i], 0, decimal=4)
+
+
+def test_discounted_payback():
+    results = cash_flow.calculate_cash_flows(make_inputs(), price_escalation=0, solar_degradation=0)
+    payback = results.discounted_payback
+
+    assert payback[0] > 5000 / 500  # discounting makes it longer than the simple payback
+    cumulative = np.cumsum(results.discounted_cash_flows[:, 0])
+    assert cumulative[int(payback[0])] < 0 <= cumulative[int(payback[0]) + 1]
+    assert np.isnan(payback[2])
+
+
+def test_discounted_payback_is_zero_if_nothing_to_pay_back():
+    inputs = cash_flow.CashFlowInputs(upfront_cost=[-100], first_year_bill_savings=[50],
+                                      first_year_solar_bill_savings=[0], heating_replacement_cost=[0],
+                                      heating_lifetime=[20])
+    assert cash_flow.calculate_cash_flows(inputs).discounted_payback[0] == 0
+
+
+def test_irr_is_nan_if_there_are_no_savings():
+    inputs = cash_flow.CashFlowInputs(upfront_cost=[1000], first_year_bill_savings=[0],
+                                      first_year_solar_bill_savings=[0], heating_replacement_cost=[0],
+                                      heating_lifetime=[20])
+    assert np.isnan(cash_flow.calculate_cash_flows(inputs).irr[0])
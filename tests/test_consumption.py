@@ -1,9 +1,12 @@
 import pandas as pd
 import numpy as np
+import pytest
 
 from .context import src
 from src import consumption
 from src import constants
+from src import fuels
+from src import profile_store
 from src.constants import BASE_YEAR_HOURLY_INDEX
 
 
@@ -56,6 +59,37 @@ def test_consumption_stream_tco2():
     assert stream_oil.annual_sum_tco2 == stream_oil.annual_sum_kwh * constants.OIL_TCO2_PER_KWH
 
 
+def test_consumption_tco2_with_hourly_intensity(tmp_path):
+    idx = constants.BASE_YEAR_HOURLY_INDEX
+    intensity = np.where((idx.hour >= 10) & (idx.hour < 16), 100, 300) / 10 ** 6  # cleaner in the middle of the day
+    profile_store.save_profile(directory=tmp_path, name='intensity', values=intensity, start=str(idx[0]))
+    fuel = fuels.Fuel(name='electricity', tco2_per_kwh=200 / 10 ** 6,
+                      hourly_tco2_per_kwh_file=tmp_path / 'intensity.npy')
+
+    profile_data = np.cos(idx.hour.to_numpy() * np.pi * 2 / 24)  # exports around midday, imports overnight
+    elec = consumption.Consumption(hourly_profile_kwh=pd.Series(index=idx, data=profile_data), fuel=fuel)
+    np.testing.assert_almost_equal(elec.overall.annual_sum_tco2, profile_data @ intensity)
+    # Exports are credited at the cleaner midday intensity, so the net isn't zero even though the kWh are
+    np.testing.assert_almost_equal(elec.overall.annual_sum_kwh, 0)
+    assert elec.overall.annual_sum_tco2 > 0
+    np.testing.assert_almost_equal(elec.imported.annual_sum_tco2 - elec.exported.annual_sum_tco2,
+                                   elec.overall.annual_sum_tco2)
+
+    # Loaded once per fuel and worked out once per stream
+    assert fuel.hourly_tco2_per_kwh is fuel.hourly_tco2_per_kwh
+    assert elec.overall._annual_sum_tco2 is not None
+    assert elec.overall.annual_sum_tco2 is elec.overall.annual_sum_tco2
+
+
+def test_consumption_tco2_uses_annual_average_without_hourly_file(tmp_path):
+    fuel = fuels.Fuel(name='electricity', tco2_per_kwh=200 / 10 ** 6,
+                      hourly_tco2_per_kwh_file=tmp_path / 'missing.npy')
+    stream = consumption.ConsumptionStream(hourly_profile_kwh=pd.Series(index=BASE_YEAR_HOURLY_INDEX, data=3),
+                                           fuel=fuel)
+    assert fuel.hourly_tco2_per_kwh is None
+    np.testing.assert_almost_equal(stream.annual_sum_tco2, stream.annual_sum_kwh * 200 / 10 ** 6)
+
+
 def test_consumption_import_only():
     profile = pd.Series(index=constants.BASE_YEAR_HOURLY_INDEX, data=0.5)
     consumption_gas = consumption.Consumption(hourly_profile_kwh=profile, fuel=constants.GAS)
@@ -88,3 +122,66 @@ def test_consumption_import_and_export():
     assert consumption_oil_added.imported.annual_sum_kwh == 2 * consumption_oil.imported.annual_sum_kwh
     assert (consumption_oil_added.overall.hourly_profile_fuel_units
             == 2 * consumption_oil_two.overall.hourly_profile_fuel_units).all()
+
+
+def test_consumption_streams_share_one_calendar():
+    stream_5 = consumption.ConsumptionStream(hourly_profile_kwh=pd.Series(index=BASE_YEAR_HOURLY_INDEX, data=5))
+    stream_2 = consumption.ConsumptionStream.from_array(values=np.full(len(BASE_YEAR_HOURLY_INDEX), 2.0))
+    assert stream_5.calendar is stream_2.calendar
+    assert stream_5.values.dtype == np.float64
+    assert stream_5.year == 2013
+    assert stream_5.days_in_year == 365
+    assert not stream_5.leap_year
+
+    # Series view is built over the same buffer rather than copied
+    assert (stream_2.hourly_profile_kwh.index == BASE_YEAR_HOURLY_INDEX).all()
+    assert np.shares_memory(stream_2.hourly_profile_kwh.to_numpy(), stream_2.values)
+
+    leap_year_index = pd.date_range(start="2020-01-01", end="2021-01-01", freq="1H", inclusive="left")
+    stream_leap = consumption.ConsumptionStream(hourly_profile_kwh=pd.Series(index=leap_year_index, data=1))
+    assert stream_leap.leap_year
+    assert stream_leap.calendar is not stream_5.calendar
+    with pytest.raises(ValueError):
+        stream_leap.add(stream_5)
+
+
+def test_calendar_is_not_reused_for_irregular_index():
+    # Same first and last hour and length as the base year, but out of order
+    reordered = BASE_YEAR_HOURLY_INDEX[[0, 2, 1] + list(range(3, len(BASE_YEAR_HOURLY_INDEX)))]
+    with pytest.raises(ValueError):
+        consumption.ConsumptionStream(hourly_profile_kwh=pd.Series(index=reordered, data=1))
+
+    # Without a freq, a regular index still gets the shared calendar
+    without_freq = pd.DatetimeIndex(list(BASE_YEAR_HOURLY_INDEX))
+    assert without_freq.freq is None
+    stream = consumption.ConsumptionStream(hourly_profile_kwh=pd.Series(index=without_freq, data=1))
+    assert stream.calendar is constants.BASE_YEAR_CALENDAR
+
+
+def test_consumption_split_matches_masking_approach_exactly():
+    idx = constants.BASE_YEAR_HOURLY_INDEX
+    rng = np.random.default_rng(seed=42)
+    profile = pd.Series(index=idx, data=rng.normal(loc=0.1, scale=1.0, size=len(idx)))
+    profile.iloc[:10] = 0  # include exact zeros
+    consumption_elec = consumption.Consumption(hourly_profile_kwh=profile, fuel=constants.ELECTRICITY)
+
+    # What the split used to do: copy the profile and mask it with .loc
+    expected_imported = profile.copy()
+    expected_imported.loc[expected_imported < 0] = 0
+    expected_exported = profile.copy()
+    expected_exported.loc[expected_exported > 0] = 0
+    expected_exported = expected_exported * -1
+
+    imported = consumption_elec.imported
+    exported = consumption_elec.exported
+    # compare bit patterns so that even the sign of zeros has to match
+    assert (imported.values.view(np.int64) == expected_imported.to_numpy().view(np.int64)).all()
+    assert (exported.values.view(np.int64) == expected_exported.to_numpy().view(np.int64)).all()
+    assert imported.annual_sum_kwh == expected_imported.sum()
+    assert exported.annual_sum_kwh == expected_exported.sum()
+    assert imported.annual_sum_tco2 == expected_imported.sum() * constants.ELEC_TCO2_PER_KWH
+
+    # split is done once and reused
+    assert consumption_elec.imported is imported
+    assert consumption_elec.exported is exported
+    assert not imported.values.flags.writeable
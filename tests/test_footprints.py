@@ -0,0 +1,63 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from .context import src
+import src.footprints as footprints
+from src import constants, roof, solar
+
+RINGS = [[[0.132377, 52.19524], [0.13242, 52.195234], [0.132428, 52.195252], [0.132384, 52.19526],
+          [0.132377, 52.19524]],
+         [[-0.106671, 51.453278], [-0.106848, 51.453054], [-0.106194, 51.452852], [-0.106014, 51.453074],
+          [-0.106671, 51.453278]],
+         [[0.132377, 52.19524], [0.13242, 52.195234], [0.132428, 52.195252], [0.132384, 52.19526],
+          [0.132382, 52.19525], [0.132377, 52.19524]]]
+
+FEATURES = [{'type': 'Feature', 'id': 'small', 'geometry': {'type': 'Polygon', 'coordinates': [RINGS[0]]}},
+            {'type': 'Feature', 'properties': {'id': 'lido', 'pitch': 10},
+             'geometry': {'type': 'Polygon', 'coordinates': [RINGS[1]]}},
+            {'type': 'Feature', 'geometry': {'type': 'MultiPolygon', 'coordinates': [[RINGS[0]], [RINGS[2]]]}},
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [0, 51]}},
+            {'type': 'Feature', 'geometry': {'type': 'Polygon',
+                                             'coordinates': [[[0, 51], [0.001, 51], [0.002, 51], [0, 51]]]}}]
+
+
+def test_read_feature_collection_in_small_reads():
+    text = json.dumps({'type': 'FeatureCollection', 'name': 'estate', 'features': FEATURES}, indent=1)
+    features = list(footprints.read_feature_collection(io.StringIO(text), read_size=7))
+    assert features == FEATURES
+
+
+def test_read_features_from_newline_delimited_file(tmp_path):
+    path = tmp_path / 'estate.geojsonl'
+    path.write_text('\n'.join(json.dumps(feature) for feature in FEATURES) + '\n')
+    assert list(footprints.read_features(path)) == FEATURES
+
+
+def test_estimate_panels_matches_solar_install():
+    rows = footprints.estimate_panels(FEATURES, default_pitch=30)
+
+    assert [row['id'] for row in rows] == ['small', 'lido', 2, 3, 4]
+    orientation = constants.ORIENTATION_OPTIONS['South']
+    for row, polygons, pitch in [(rows[0], [RINGS[0]], 30), (rows[1], [RINGS[1]], 10),
+                                 (rows[2], [RINGS[0], RINGS[2]], 30)]:
+        install = solar.Solar(orientation=orientation, polygons=[roof.Polygon(ring) for ring in polygons],
+                              pitch=pitch)
+        assert row['error'] == ''
+        assert row['number_of_polygons'] == len(polygons)
+        assert row['number_of_panels'] == install.number_of_panels
+        assert row['roof_plan_area_m2'] == round(install.roof_plan_area, 2)
+        assert row['capacity_kwp'] == round(install.capacity_kwp, 3)
+    assert rows[1]['number_of_panels'] > 0
+    assert rows[0]['azimuth_degrees'] == roof.Polygon(RINGS[0]).azimuth
+    assert 'Point' in rows[3]['error']
+    assert rows[4]['error'] == "ValueError: polygon has no area"
+    assert 'azimuth_degrees' not in rows[4]
+
+
+def test_estimate_panels_for_features_streams_rows_in_order():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        rows = list(footprints.estimate_panels_for_features(FEATURES * 3, executor=executor, window=2, chunk_size=5))
+    assert [row['id'] for row in rows] == ['small', 'lido', 2, 3, 4, 'small', 'lido', 7, 8, 9,
+                                           'small', 'lido', 12, 13, 14]
+    assert rows[:5] == footprints.estimate_panels(FEATURES)
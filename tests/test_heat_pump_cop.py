@@ -0,0 +1,50 @@
+import numpy as np
+
+from .context import src
+from src import building_model, constants, heat_pump_cop
+
+
+def test_cop_lookup_matches_curve():
+    temperatures = np.array([-7.3, -2, 0.25, 7, 12.6])
+    np.testing.assert_array_almost_equal(heat_pump_cop.calculate_hourly_cop(flow_temperature_c=45,
+                                                                            outdoor_temperature_c=temperatures),
+                                         heat_pump_cop.calculate_cop(flow_temperature_c=45,
+                                                                     outdoor_temperature_c=temperatures), decimal=3)
+    # Staffell curve at a 40C temperature difference
+    np.testing.assert_almost_equal(heat_pump_cop.calculate_cop(flow_temperature_c=45, outdoor_temperature_c=5),
+                                   6.81 - 0.121 * 40 + 0.000630 * 40 ** 2)
+    assert heat_pump_cop.get_cop_lookup_table(45.0) is heat_pump_cop.get_cop_lookup_table(45.0)
+
+
+def test_cop_lower_when_colder_and_at_higher_flow_temperatures():
+    cop = heat_pump_cop.calculate_hourly_cop(flow_temperature_c=45)
+    temperatures = constants.load_hourly_outdoor_temperature().to_numpy()
+    assert len(cop) == 8760
+    assert cop[temperatures.argmin()] == cop.min()
+    assert (heat_pump_cop.calculate_hourly_cop(flow_temperature_c=55) < cop).all()
+    # Held at the end of the fitted range rather than extrapolated
+    assert heat_pump_cop.calculate_cop(flow_temperature_c=35, outdoor_temperature_c=30) == \
+        heat_pump_cop.calculate_cop(flow_temperature_c=35, outdoor_temperature_c=20)
+
+
+def test_heat_pump_consumption_with_flow_temperature():
+    heat_pump = building_model.HeatingSystem.from_constants(name='Heat pump',
+                                                           parameters=constants.DEFAULT_HEATING_CONSTANTS['Heat pump'])
+    assert heat_pump.flow_temperature_c is None and heat_pump.hourly_efficiency is None
+    heat_pump.flow_temperature_c = 45
+
+    consumption = heat_pump.calculate_consumption(annual_space_heating_demand_kwh=10000)
+    np.testing.assert_almost_equal(consumption.overall.annual_sum_kwh,
+                                   heat_pump.calculate_annual_consumption_kwh(annual_space_heating_demand_kwh=10000))
+    np.testing.assert_almost_equal(consumption.overall.annual_sum_kwh, 10000 / heat_pump.seasonal_efficiency)
+    # Cold hours take more electricity per unit of heat
+    heat = heat_pump.hourly_normalized_demand_profile.to_numpy() * 10000
+    electricity_per_heat = consumption.overall.values / heat
+    temperatures = constants.load_hourly_outdoor_temperature().to_numpy()
+    assert electricity_per_heat[temperatures.argmin()] > electricity_per_heat[temperatures.argmax()]
+
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    house = building_model.House(envelope=envelope, heating_system=heat_pump)
+    bill = house.total_annual_bill
+    heat_pump.flow_temperature_c = 35
+    assert house.total_annual_bill < bill  # recalculated on change
@@ -71,15 +71,17 @@ def test_tariff_calculate_annual_cost():
                                     + cheapo.p_per_unit_import * space_heating_consumption.overall.annual_sum_kwh)
                                    / 100)
 
-    # Check consumption with export behaves as you expect
-    consumption_with_export = space_heating_consumption
-    consumption_with_export.overall.hourly_profile_kwh.iloc[0] -= 100
+    # Check consumption with export behaves as you expect. Profiles are read only, so set up a new consumption
+    profile_with_export = space_heating_consumption.overall.hourly_profile_kwh.copy()
+    profile_with_export.iloc[0] -= 100
+    consumption_with_export = building_model.Consumption(hourly_profile_kwh=profile_with_export,
+                                                         fuel=constants.ELECTRICITY)
     assert consumption_with_export.overall.annual_sum_kwh == 10 * consumption_with_export.overall.hours_in_year - 100
     assert consumption_with_export.imported.annual_sum_kwh == 10 * consumption_with_export.overall.hours_in_year - 10
     assert consumption_with_export.exported.annual_sum_kwh == 90
 
     # Check cost with export
-    annual_cost_with_export = cheapo.calculate_annual_net_cost(consumption=space_heating_consumption)
+    annual_cost_with_export = cheapo.calculate_annual_net_cost(consumption=consumption_with_export)
     assert annual_cost_with_export < annual_cost
     np.testing.assert_almost_equal(annual_cost_with_export,
                                    (cheapo.p_per_day * consumption_with_export.overall.days_in_year
@@ -88,6 +90,48 @@ def test_tariff_calculate_annual_cost():
                                     ) / 100)
 
 
+def test_time_of_use_tariff_cost_matches_hour_by_hour_sum():
+    economy_7 = building_model.Tariff.from_price_bands(
+        fuel=constants.ELECTRICITY, p_per_day=50, default_p_per_unit_import=30.0,
+        import_bands=[building_model.time_of_use.PriceBand(start_hour=0, end_hour=7, p_per_unit=10.0)],
+        p_per_unit_export=5.0,
+        export_bands=[building_model.time_of_use.PriceBand(start_hour=22, end_hour=2, p_per_unit=1.0)])
+    assert economy_7.is_time_of_use
+    np.testing.assert_almost_equal(economy_7.p_per_unit_import, (7 * 10 + 17 * 30) / 24)
+    assert not economy_7.hourly_p_per_unit_import.flags.writeable
+
+    rng = np.random.default_rng(seed=1)
+    profile = pd.Series(index=constants.BASE_YEAR_HOURLY_INDEX, data=rng.normal(loc=0.5, size=8760))
+    consumption = building_model.Consumption(hourly_profile_kwh=profile, fuel=constants.ELECTRICITY)
+
+    expected_import_p = 0
+    expected_export_p = 0
+    for timestamp, kwh in profile.items():
+        if kwh > 0:
+            expected_import_p += kwh * (10.0 if timestamp.hour < 7 else 30.0)
+        else:
+            expected_export_p += -kwh * (1.0 if timestamp.hour >= 22 or timestamp.hour < 2 else 5.0)
+    np.testing.assert_almost_equal(economy_7.calculate_annual_import_cost(consumption),
+                                   (365 * 50 + expected_import_p) / 100)
+    np.testing.assert_almost_equal(economy_7.calculate_annual_export_cost(consumption), expected_export_p / 100)
+
+    # Changing the prices is a change to the tariff
+    version = economy_7._version
+    prices = np.full(8760, 20.0)
+    economy_7.hourly_p_per_unit_import = prices
+    assert economy_7._version > version
+    np.testing.assert_almost_equal(economy_7.calculate_annual_import_cost(consumption),
+                                   (365 * 50 + 20 * consumption.imported.annual_sum_kwh) / 100)
+
+    # Prices set after construction are frozen too, and setting the same prices again isn't a change
+    assert not economy_7.hourly_p_per_unit_import.flags.writeable
+    prices[:] = 0
+    assert economy_7.hourly_p_per_unit_import[0] == 20
+    version = economy_7._version
+    economy_7.hourly_p_per_unit_import = economy_7.hourly_p_per_unit_import
+    assert economy_7._version == version
+
+
 def test_set_up_house_from_heating_name():
     envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
 
@@ -191,3 +235,147 @@ def test_upgrade_buildings():
     assert round(both_house.percent_self_use_of_solar, 3) == 0.914
 
     return hp_house, solar_house, both_house
+
+
+def test_house_only_recalculates_what_depends_on_a_change():
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    gas_house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name='Gas boiler')
+    base_consumption = gas_house.base_consumption
+    heating_consumption = gas_house.heating_consumption
+    consumption_per_fuel = gas_house.consumption_per_fuel
+    bill = gas_house.total_annual_bill
+    assert gas_house.consumption_per_fuel is consumption_per_fuel  # cached
+
+    # Tariff change: bills recalculated, energy reused
+    gas_house.tariffs['gas'].p_per_unit_import = 2 * gas_house.tariffs['gas'].p_per_unit_import
+    assert gas_house.consumption_per_fuel is consumption_per_fuel
+    assert gas_house.total_annual_bill > bill
+
+    # Setting a tariff to the value it already has is not a change
+    bill = gas_house.total_annual_bill
+    energy_and_bills_df = gas_house.energy_and_bills_df
+    gas_house.tariffs['gas'].p_per_unit_import = gas_house.tariffs['gas'].p_per_unit_import
+    assert gas_house.energy_and_bills_df is energy_and_bills_df
+
+    # Efficiency change: heating consumption and its dependents recalculated, base consumption reused
+    gas_house.heating_system.efficiency = 0.5
+    assert gas_house.base_consumption is base_consumption
+    assert gas_house.heating_consumption is not heating_consumption
+    np.testing.assert_almost_equal(gas_house.heating_consumption.overall.annual_sum_kwh,
+                                   envelope.annual_heating_demand / 0.5)
+    assert gas_house.total_annual_bill > bill
+
+    # Grants don't affect energy use
+    heating_consumption = gas_house.heating_consumption
+    gas_house.heating_system.grant = 100
+    assert gas_house.heating_consumption is heating_consumption
+
+    # Replacing a component altogether
+    gas_house.envelope = building_model.BuildingEnvelope.from_building_type_constants(
+        constants.BUILDING_TYPE_OPTIONS['Detached'])
+    assert gas_house.base_consumption is not base_consumption
+    assert gas_house.base_consumption.overall.annual_sum_kwh > base_consumption.overall.annual_sum_kwh
+
+
+def test_with_changes_shares_unchanged_components_and_results():
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Flat'])
+    gas_house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name='Gas boiler')
+    gas_house.heating_system_upfront_cost = 1200
+    base_consumption = gas_house.base_consumption
+    gas_bill = gas_house.total_annual_bill
+
+    heat_pump = building_model.HeatingSystem.from_constants(name='Heat pump',
+                                                            parameters=constants.DEFAULT_HEATING_CONSTANTS['Heat pump'])
+    hp_house = gas_house.with_changes(heating_system=heat_pump)
+    assert hp_house.envelope is not gas_house.envelope  # copied on write
+    assert hp_house.tariffs is not gas_house.tariffs
+    assert hp_house.base_consumption is base_consumption  # reused rather than recalculated
+    assert hp_house.heating_system is heat_pump
+    assert list(hp_house.consumption_per_fuel.keys()) == ['electricity']
+    assert hp_house.heating_system_upfront_cost != 1200  # overwrite was for the old heating system
+
+    # the original house is untouched
+    assert gas_house.heating_system.name == 'Gas boiler'
+    assert gas_house.total_annual_bill == gas_bill
+    assert list(gas_house.consumption_per_fuel.keys()) == ['electricity', 'gas']
+
+    tariff_house = gas_house.with_changes(tariffs=building_model.Tariff.set_up_standard_tariffs(constants.GAS))
+    assert tariff_house.heating_system_upfront_cost == 1200
+    assert tariff_house.consumption_per_fuel is gas_house.consumption_per_fuel
+
+
+def test_with_changes_variants_dont_change_the_baseline():
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Flat'])
+    gas_house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name='Gas boiler')
+    gas_house.battery = building_model.Battery(capacity_kwh=5, power_kw=3)
+    gas_bill = gas_house.total_annual_bill
+    electricity_price = gas_house.tariffs['electricity'].p_per_unit_import
+
+    variant = gas_house.with_changes()
+    assert variant.consumption_per_fuel is gas_house.consumption_per_fuel  # shared until one of them changes
+    variant.tariffs['electricity'].p_per_unit_import = 2 * electricity_price
+    variant.envelope.annual_heating_demand *= 2
+    variant.battery.capacity_kwh = 10
+    assert variant.total_annual_bill > gas_bill
+    assert gas_house.tariffs['electricity'].p_per_unit_import == electricity_price
+    assert gas_house.battery.capacity_kwh == 5
+    assert gas_house.total_annual_bill == gas_bill
+
+    # and the other way round
+    gas_house.heating_system.efficiency /= 2
+    assert variant.heating_system.efficiency == gas_house.heating_system.efficiency * 2
+    assert gas_house.total_annual_bill > gas_bill
+
+    assert gas_house.with_changes(battery=None).battery is None
+
+
+def test_battery_reduces_imports_and_exports():
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name='Heat pump')
+    house.solar_install = solar.Solar.from_location(latitude=52.195, longitude=0.132,
+                                                    orientation=SolarConstants.ORIENTATIONS['South'],
+                                                    number_of_panels=12)
+    assert house.battery is None and house.battery_dispatch is None
+
+    battery_house = house.with_changes(battery=building_model.Battery(capacity_kwh=5, power_kw=3))
+    without = house.consumption_per_fuel['electricity']
+    with_battery = battery_house.consumption_per_fuel['electricity']
+    assert with_battery.imported.annual_sum_kwh < without.imported.annual_sum_kwh
+    assert with_battery.exported.annual_sum_kwh < without.exported.annual_sum_kwh
+    assert battery_house.percent_self_use_of_solar > house.percent_self_use_of_solar
+    assert battery_house.upfront_cost == house.upfront_cost + battery_house.battery.upfront_cost
+
+    # Changing the battery dispatches again
+    imported = with_battery.imported.annual_sum_kwh
+    battery_house.battery.capacity_kwh = 10
+    assert battery_house.consumption_per_fuel['electricity'].imported.annual_sum_kwh < imported
+
+
+def test_house_without_solar_uses_annual_totals():
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    for heating_name in ['Gas boiler', 'Oil boiler', 'Heat pump']:
+        house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name=heating_name)
+        assert house.uses_annual_totals
+        total_annual_bill = house.total_annual_bill
+        total_annual_tco2 = house.total_annual_tco2
+        df = house.energy_and_bills_df
+        assert 'consumption_per_fuel' not in house._dependent_cache  # no hourly profiles needed
+
+        # Same as working it out hour by hour
+        hourly_bill = sum(house.tariffs[fuel_name].calculate_annual_net_cost(consumption)
+                          for fuel_name, consumption in house.consumption_per_fuel.items())
+        hourly_tco2 = sum(consumption.overall.annual_sum_tco2 for consumption in house.consumption_per_fuel.values())
+        np.testing.assert_almost_equal(total_annual_bill, hourly_bill)
+        np.testing.assert_almost_equal(total_annual_tco2, hourly_tco2)
+        for fuel_name, consumption in house.consumption_per_fuel.items():
+            np.testing.assert_almost_equal(house.annual_consumption_per_fuel_kwh[fuel_name],
+                                           consumption.overall.annual_sum_kwh)
+        assert (df.loc[df['fuel'] == 'electricity exports'].iloc[0, 1:] == 0).all()
+
+    # Time of use tariffs still need the hourly profile
+    house.tariffs['electricity'] = building_model.Tariff.from_price_bands(
+        fuel=house.tariffs['electricity'].fuel, p_per_day=50, default_p_per_unit_import=30,
+        import_bands=[building_model.time_of_use.PriceBand(start_hour=0, end_hour=7, p_per_unit=10)])
+    np.testing.assert_almost_equal(
+        house.total_annual_bill, house.tariffs['electricity'].calculate_annual_net_cost(
+            house.consumption_per_fuel['electricity']))
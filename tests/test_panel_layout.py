@@ -0,0 +1,69 @@
+import numpy as np
+
+from .context import src
+from src import panel_layout, roof, solar
+from src.constants import ORIENTATION_OPTIONS
+
+
+def make_rectangle(east_m: float, north_m: float) -> roof.Polygon:
+    """ Drawn near the equator, where a degree of longitude and latitude are about the same length"""
+    east, north = east_m / 111320, north_m / 111000
+    return roof.Polygon([[0, 0], [east, 0], [east, north], [0, north], [0, 0]])
+
+
+def panels_overlap(panels: np.ndarray) -> bool:
+    x, y, width, height = panels.T
+    overlap_x = (x[:, np.newaxis] < x + width - 1e-9) & (x[:, np.newaxis] + width[:, np.newaxis] > x + 1e-9)
+    overlap_y = (y[:, np.newaxis] < y + height - 1e-9) & (y[:, np.newaxis] + height[:, np.newaxis] > y + 1e-9)
+    overlaps = overlap_x & overlap_y
+    np.fill_diagonal(overlaps, False)
+    return overlaps.any()
+
+
+def test_rectangle_matches_simple_count():
+    for east_m, north_m in [(10, 5), (6, 4), (12, 8)]:
+        polygon = make_rectangle(east_m, north_m)
+        layout = panel_layout.make_panel_layout(polygon.dimensions, pitch=0)
+        simple = solar.count_panels_in_rectangles(width=polygon.average_width,
+                                                  plan_height=polygon.average_plan_height, pitch=0)
+        # Can mix portrait and landscape rows, so never worse than the same orientation all over
+        assert layout.number_of_panels >= simple
+        assert not panels_overlap(layout.panels)
+
+
+def test_panels_stay_inside_the_border_of_a_concave_roof():
+    # L shaped: 10m along the bottom, 4m up on the left, 2m deep elsewhere
+    east, north = 1 / 111320, 1 / 111000
+    polygon = roof.Polygon([[0, 0], [10 * east, 0], [10 * east, 2 * north], [4 * east, 2 * north],
+                            [4 * east, 6 * north], [0, 6 * north], [0, 0]])
+    layout = panel_layout.make_panel_layout(polygon.dimensions, pitch=0)
+
+    assert layout.number_of_panels > 0
+    assert 0 < layout.number_in_portrait < layout.number_of_panels  # mixes the two
+    assert not panels_overlap(layout.panels)
+    half_border = layout.border / 2
+    x, y, width, height = layout.panels.T
+    in_bottom_arm = (y >= half_border - 1e-9) & (y + height <= 2 - half_border + 1e-9)
+    in_left_arm = (x >= half_border - 1e-9) & (x + width <= 4 - half_border + 1e-9)
+    assert (in_bottom_arm | in_left_arm).all()
+    assert (x + width <= 10 - half_border + 1e-9).all() and (y + height <= 6 - half_border + 1e-9).all()
+
+
+def test_layouts_are_memoised_by_shape_and_pitch():
+    polygon = make_rectangle(8, 4)
+    layout = panel_layout.make_panel_layout(polygon.dimensions, pitch=30)
+    same_shape = roof.Polygon([list(point) for point in polygon._points])
+    assert panel_layout.make_panel_layout(same_shape.dimensions, pitch=30) is layout
+    assert panel_layout.make_panel_layout(polygon.dimensions, pitch=40) is not layout
+
+
+def test_zero_area_roof_has_no_panels():
+    layout = panel_layout.make_panel_layout(roof.Polygon.make_zero_area_instance().dimensions, pitch=30)
+    assert layout.number_of_panels == 0
+
+
+def test_solar_counts_panels_from_layouts(monkeypatch):
+    polygon = make_rectangle(10, 5)
+    monkeypatch.setenv("PANEL_COUNT_METHOD", "layout")
+    install = solar.Solar(orientation=ORIENTATION_OPTIONS['South'], polygons=[polygon, polygon], pitch=30)
+    assert install.number_of_panels == 2 * install.panel_layouts[0].number_of_panels
@@ -0,0 +1,44 @@
+import numpy as np
+
+from .context import src
+from src import building_model, constants, panel_sweep, solar
+from src.constants import SolarConstants
+
+
+def set_up_house(heating_name: str, number_of_panels: int) -> 'building_model.House':
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name=heating_name)
+    return house.with_changes(solar_install=solar.Solar.from_location(
+        latitude=52.195, longitude=0.132, orientation=SolarConstants.ORIENTATIONS['South'],
+        number_of_panels=number_of_panels))
+
+
+def test_sweep_matches_house_by_house_evaluation():
+    for heating_name in ['Gas boiler', 'Heat pump']:
+        house = set_up_house(heating_name=heating_name, number_of_panels=14)
+        sweep = panel_sweep.sweep_number_of_panels(house)
+        assert list(sweep.number_of_panels) == list(range(15))
+
+        for number_of_panels in [0, 3, 14]:
+            variant = set_up_house(heating_name=heating_name, number_of_panels=number_of_panels)
+            electricity = variant.consumption_per_fuel['electricity']
+            np.testing.assert_almost_equal(sweep.electricity_imported_kwh[number_of_panels],
+                                           electricity.imported.annual_sum_kwh)
+            np.testing.assert_almost_equal(sweep.electricity_exported_kwh[number_of_panels],
+                                           electricity.exported.annual_sum_kwh)
+            np.testing.assert_almost_equal(sweep.total_annual_bill[number_of_panels], variant.total_annual_bill)
+            np.testing.assert_almost_equal(sweep.total_annual_tco2[number_of_panels], variant.total_annual_tco2)
+            np.testing.assert_almost_equal(sweep.percent_self_use_of_solar[number_of_panels],
+                                           variant.percent_self_use_of_solar)
+            assert sweep.solar_upfront_cost[number_of_panels] == variant.solar_install.upfront_cost
+
+
+def test_sweep_curves():
+    house = set_up_house(heating_name='Heat pump', number_of_panels=10)
+    df = panel_sweep.sweep_number_of_panels(house, max_number_of_panels=30).to_df()
+    assert len(df) == 31
+    assert df.loc[0, 'bill_savings'] == 0
+    assert np.isnan(df.loc[0, 'simple_payback_years'])
+    assert (np.diff(df['bill_savings']) > 0).all()  # each panel saves something, if less once exporting
+    assert (np.diff(df['percent_self_use_of_solar'].iloc[1:]) <= 0).all()
+    assert (np.diff(df['electricity_exported_kwh']) >= 0).all()
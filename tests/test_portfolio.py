@@ -0,0 +1,69 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .context import src
+import src.batch as batch
+import src.building_model as building_model
+import src.constants as constants
+import src.portfolio as portfolio
+
+
+def make_house(house_type: str, heating_name: str) -> building_model.House:
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(
+        constants.BUILDING_TYPE_OPTIONS[house_type])
+    return building_model.House.set_up_from_heating_name(envelope=envelope, heating_name=heating_name)
+
+
+def test_aggregator_matches_summing_every_house():
+    houses = [make_house('Terrace', 'Gas boiler'), make_house('Detached', 'Oil boiler'),
+              make_house('Flat', 'Direct electric')]
+    aggregator = portfolio.PortfolioAggregator()
+    for house in houses:
+        aggregator.add_house(scenario='Current', house=house)
+
+    expected_imports = sum(house.consumption_per_fuel['electricity'].imported.values for house in houses)
+    np.testing.assert_allclose(aggregator.totals['Current'].imported, expected_imports)
+    summary = aggregator.summary('Current')
+    assert summary.number_of_homes == 3
+    np.testing.assert_almost_equal(summary.peak_import_kw, expected_imports.max())
+    assert summary.peak_import_time == str(constants.BASE_YEAR_HOURLY_INDEX[expected_imports.argmax()])
+    np.testing.assert_almost_equal(summary.annual_heating_fuel_kwh['gas'],
+                                   houses[0].consumption_per_fuel['gas'].overall.annual_sum_kwh)
+    assert set(summary.annual_heating_fuel_kwh.keys()) == {'gas', 'oil'}
+    assert summary.diversity_factor >= 1
+
+    curve = aggregator.load_duration_curve('Current')
+    assert curve[0] == summary.peak_import_kw
+    assert (np.diff(curve) <= 0).all()
+    assert len(aggregator.hourly_totals_df().columns) == 4
+
+
+def test_merged_aggregators_match_one_aggregator():
+    houses = [make_house('Terrace', 'Gas boiler'), make_house('Semi-detached', 'Gas boiler')]
+    one = portfolio.PortfolioAggregator()
+    parts = [portfolio.PortfolioAggregator(), portfolio.PortfolioAggregator()]
+    for house, part in zip(houses, parts):
+        one.add_house(scenario='Current', house=house)
+        part.add_house(scenario='Current', house=house)
+    # as if sent back from worker processes
+    merged = portfolio.PortfolioAggregator.merge_all(pickle.loads(pickle.dumps(part)) for part in parts)
+    assert merged.summary('Current') == one.summary('Current')
+
+
+def test_batch_aggregates_in_chunks():
+    homes = [{'id': str(i), 'latitude': '52', 'longitude': '0', 'house_type': house_type}
+             for i, house_type in enumerate(['Terrace', 'Flat', 'Detached', 'Terrace', 'Flat'])]
+    aggregator = portfolio.PortfolioAggregator()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(batch.evaluate_homes(rows=homes, executor=executor, window=2, chunk_size=2,
+                                            aggregator=aggregator))
+    assert [result['id'] for result in results] == [home['id'] for home in homes]
+    assert aggregator.scenarios == list(batch.SCENARIO_NAMES.values())
+    current = aggregator.summary('Current')
+    assert current.number_of_homes == 5
+    np.testing.assert_almost_equal(current.annual_import_kwh,
+                                   sum(result['current_electricity_imported_kwh'] for result in results), decimal=0)
+    # Heat pumps add to the peak
+    assert aggregator.summary('Heat pump').peak_import_kw > current.peak_import_kw
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from .context import src
+import src.profile_store as profile_store
+import src.constants as constants
+
+
+def test_profiles_are_lazy_and_memory_mapped():
+    assert 'NORMALIZED_HOURLY_BASE_DEMAND' not in vars(constants)  # loaded on first use, not at import
+
+    base_demand = constants.NORMALIZED_HOURLY_BASE_DEMAND
+    assert isinstance(base_demand, pd.Series)
+    assert isinstance(base_demand.values.base, np.memmap) or isinstance(base_demand.values, np.memmap)
+    assert not base_demand.values.flags.writeable
+    assert constants.NORMALIZED_HOURLY_BASE_DEMAND is base_demand  # only loaded once
+    assert (base_demand.index == constants.BASE_YEAR_HOURLY_INDEX).all()
+    np.testing.assert_almost_equal(base_demand.sum(), 1.0)
+
+    heat_demand = constants.NORMALIZED_HOURLY_HEAT_DEMAND_DF
+    np.testing.assert_almost_equal(heat_demand.sum().to_numpy(), [1.0, 1.0, 1.0])
+    heat_pump = constants.DEFAULT_HEATING_CONSTANTS['Heat pump']
+    pd.testing.assert_series_equal(heat_pump.normalized_hourly_heat_demand_profile,
+                                   heat_demand['Normalised_ASHP_heat'])
+
+    with pytest.raises(AttributeError):
+        constants.NOT_A_PROFILE
+
+
+def test_save_and_load_round_trip(tmp_path):
+    values = np.arange(8760 * 2, dtype=np.float64).reshape(8760, 2)
+    profile_store.save_profile(directory=tmp_path, name='test', values=values, start='2013-01-01 00:00:00',
+                               columns=['a', 'b'])
+    loaded, entry = profile_store.load_profile(directory=tmp_path, name='test')
+    np.testing.assert_array_equal(loaded, values)
+    assert entry['columns'] == ['a', 'b']
+
+    with pytest.raises(profile_store.ProfileStoreError):
+        profile_store.load_profile(directory=tmp_path, name='missing')
+
+
+def test_load_checks_checksum_only_if_asked(tmp_path):
+    profile_store.save_profile(directory=tmp_path, name='test', values=np.zeros(8760), start='2013-01-01 00:00:00')
+    np.save(tmp_path / 'test.npy', np.ones(8760))
+    with pytest.raises(profile_store.ProfileStoreError):
+        profile_store.load_profile(directory=tmp_path, name='test', verify=True)
+    with pytest.raises(profile_store.ProfileStoreError):
+        profile_store.verify_profiles(directory=tmp_path)
+    loaded, _ = profile_store.load_profile(directory=tmp_path, name='test')
+    assert loaded.sum() == 8760
+
+    np.save(tmp_path / 'test.npy', np.ones(24))
+    with pytest.raises(profile_store.ProfileStoreError):
+        profile_store.load_profile(directory=tmp_path, name='test')
+
+
+def test_bundled_profiles_match_their_checksums():
+    profile_store.verify_profiles(directory=constants.PROFILES_PATH)
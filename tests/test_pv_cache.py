@@ -0,0 +1,75 @@
+import numpy as np
+
+from .context import src
+import src.pv_cache as pv_cache
+from src.constants import SolarConstants
+
+KEY = pv_cache.make_key(latitude=52.1952412, longitude=0.1323771, pitch=30, aspect=45)
+
+
+def make_profile(scale: float = 1.0) -> np.ndarray:
+    hours = np.arange(8760)
+    return np.clip(np.sin((hours % 24 - 6) / 12 * np.pi), 0, None) * scale
+
+
+def test_make_key_rounds_nearby_points_together():
+    assert KEY == (52.195, 0.132, 30, 45, SolarConstants.SYSTEM_LOSS, SolarConstants.API_YEAR)
+    assert pv_cache.make_key(latitude=52.19521, longitude=0.13241, pitch=30.01, aspect=45) == KEY
+
+
+def test_get_or_fetch_only_fetches_once_and_persists(tmp_path):
+    cache = pv_cache.PVProfileCache(path=tmp_path / 'pv.sqlite')
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return make_profile()
+
+    profile = cache.get_or_fetch(key=KEY, fetch=fetch)
+    assert cache.get_or_fetch(key=KEY, fetch=fetch) is profile
+    assert len(fetches) == 1
+    assert not profile.flags.writeable
+    assert cache.cache_info() == pv_cache.CacheInfo(hits=1, misses=1, evictions=0, entries=1,
+                                                    size_bytes=8760 * 8)
+
+    # a new instance (e.g. after a restart or in another worker) reads it back from disk
+    reopened = pv_cache.PVProfileCache(path=tmp_path / 'pv.sqlite')
+    np.testing.assert_array_equal(reopened.get_or_fetch(key=KEY, fetch=fetch), make_profile())
+    assert len(fetches) == 1
+    assert reopened.cache_info().hits == 1
+    assert reopened.cache_info().misses == 0
+
+
+def test_least_recently_used_profiles_evicted_over_size_limit(tmp_path):
+    cache = pv_cache.PVProfileCache(path=tmp_path / 'pv.sqlite', max_bytes=2 * 8760 * 8, memory_entries=1)
+    keys = [pv_cache.make_key(latitude=52, longitude=0, pitch=30, aspect=aspect) for aspect in (0, 90, 180)]
+    cache.put(keys[0], make_profile(1))
+    cache.put(keys[1], make_profile(2))
+    assert cache.get(keys[0]) is not None  # now more recently used than keys[1]
+    cache.put(keys[2], make_profile(3))
+
+    assert cache.cache_info().evictions == 1
+    assert cache.cache_info().entries == 2
+    assert cache.size_bytes <= cache.max_bytes
+    assert cache.get(keys[1]) is None
+    np.testing.assert_array_equal(cache.get(keys[0]), make_profile(1))
+
+
+def test_profiles_read_from_memory_are_not_evicted_first(tmp_path):
+    cache = pv_cache.PVProfileCache(path=tmp_path / 'pv.sqlite', max_bytes=2 * 8760 * 8, touch_interval_seconds=0)
+    keys = [pv_cache.make_key(latitude=52, longitude=0, pitch=30, aspect=aspect) for aspect in (0, 90, 180)]
+    cache.put(keys[0], make_profile(1))
+    cache.put(keys[1], make_profile(2))
+    assert cache.get(keys[0]) is not None  # from memory, but still more recently used than keys[1]
+    cache.put(keys[2], make_profile(3))
+
+    assert cache.get(keys[1]) is None
+    np.testing.assert_array_equal(cache.get(keys[0]), make_profile(1))
+
+
+def test_clear(tmp_path):
+    cache = pv_cache.PVProfileCache(path=tmp_path / 'pv.sqlite')
+    cache.put(KEY, make_profile())
+    cache.clear()
+    assert cache.get(KEY) is None
+    assert cache.cache_info().entries == 0
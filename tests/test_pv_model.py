@@ -0,0 +1,146 @@
+import time
+
+import numpy as np
+import pytest
+
+from .context import src
+import src.pv_model as pv_model
+import src.pv_cache as pv_cache
+import src.profile_store as profile_store
+from src.constants import ORIENTATION_OPTIONS, SolarConstants
+
+LATITUDE = 52.195
+LONGITUDE = 0.132
+
+
+def make_clear_sky_dataset() -> pv_model.IrradianceDataset:
+    """ Two by two grid with a crude clear sky: the same in every cell"""
+    zenith, _ = pv_model.solar_position(latitude=LATITUDE, longitude=LONGITUDE, hours_in_year=8760)
+    cos_zenith = np.clip(np.cos(zenith), 0, None)
+    dni = 800 * (cos_zenith > 0.05)
+    dhi = 100 * cos_zenith
+    ghi = dni * cos_zenith + dhi
+    temp_air = 10 + 5 * cos_zenith
+
+    def grid(values):
+        return np.broadcast_to(values, (2, 2, 8760))
+
+    return pv_model.IrradianceDataset(year=2013, latitudes=np.array([52.0, 52.25]), longitudes=np.array([0.0, 0.25]),
+                                      ghi=grid(ghi), dni=grid(dni), dhi=grid(dhi), temp_air=grid(temp_air))
+
+
+def test_solar_position():
+    zenith, azimuth = pv_model.solar_position(latitude=LATITUDE, longitude=LONGITUDE, hours_in_year=8760)
+    # Midsummer noon UTC (near the Greenwich meridian): sun high and passing due south between 11.30 and 12.30
+    midsummer_noon = 171 * 24 + 12
+    np.testing.assert_allclose(np.degrees(zenith[midsummer_noon]), LATITUDE - 23.44, atol=2)
+    assert azimuth[midsummer_noon - 1] < 0 < azimuth[midsummer_noon]
+    # Morning sun is in the east (negative), evening sun in the west
+    assert np.degrees(azimuth[midsummer_noon - 6]) < -45
+    assert np.degrees(azimuth[midsummer_noon + 6]) > 45
+    # Dark at midnight
+    assert (np.degrees(zenith[np.arange(365) * 24]) > 90).all()
+
+
+def test_dataset_is_memory_mapped_from_profile_store(tmp_path):
+    dataset = make_clear_sky_dataset()
+    for name in pv_model.IRRADIANCE_DATASET_ARRAYS:
+        profile_store.save_profile(directory=tmp_path, name=name, values=getattr(dataset, name),
+                                   start='2013-01-01 00:00')
+
+    loaded = pv_model.IrradianceDataset.from_profile_store(directory=tmp_path)
+    assert loaded.year == 2013
+    assert isinstance(loaded.ghi, np.memmap)
+    assert not loaded.ghi.flags.writeable
+    np.testing.assert_array_equal(loaded.dni, dataset.dni)
+    assert loaded.nearest_cell(latitude=LATITUDE, longitude=LONGITUDE) == (1, 1)
+
+
+def test_missing_dataset_says_how_to_make_it(tmp_path):
+    with pytest.raises(FileNotFoundError, match='prep_irradiance_dataset.py'):
+        pv_model.IrradianceDataset.from_profile_store(directory=tmp_path)
+
+
+def test_all_orientations_in_one_batch_match_single_calls():
+    model = pv_model.LocalPVModel(dataset=make_clear_sky_dataset())
+    profiles = model.get_hourly_generation_per_kwp_all_orientations(latitude=LATITUDE, longitude=LONGITUDE, pitch=30)
+    assert list(profiles.keys()) == list(ORIENTATION_OPTIONS.keys())
+
+    for name, orientation in ORIENTATION_OPTIONS.items():
+        key = pv_cache.make_key(latitude=LATITUDE, longitude=LONGITUDE, pitch=30,
+                                aspect=orientation.azimuth_degrees)
+        np.testing.assert_allclose(model.get_hourly_generation_per_kwp(key=key), profiles[name])
+
+    annual_kwh = {name: profile.sum() for name, profile in profiles.items()}
+    assert max(annual_kwh, key=annual_kwh.get) == 'South'
+    assert min(annual_kwh, key=annual_kwh.get) == 'North'
+    np.testing.assert_allclose(annual_kwh['East'], annual_kwh['West'], rtol=0.02)
+    assert (profiles['South'] >= 0).all()
+    assert profiles['South'].max() < 1  # per kWp, with losses
+
+
+def test_generation_per_kwp_losses():
+    poa_irradiance = np.array([1000.0])
+    # At 1000 W/m2 and a cell temperature of 25 C only system losses apply
+    temp_air = 25 - 1000 * (SolarConstants.PV_NOCT_C - 20) / 800
+    np.testing.assert_allclose(pv_model.generation_per_kwp(poa_irradiance, temp_air=temp_air, loss=14), 0.86)
+    # Hotter cells produce less
+    assert pv_model.generation_per_kwp(poa_irradiance, temp_air=30, loss=14) < 0.86
+
+
+def test_batch_is_fast():
+    model = pv_model.LocalPVModel(dataset=make_clear_sky_dataset())
+    model.get_hourly_generation_per_kwp_all_orientations(latitude=LATITUDE, longitude=LONGITUDE)
+    start = time.perf_counter()
+    model.get_hourly_generation_per_kwp_all_orientations(latitude=LATITUDE, longitude=LONGITUDE, pitch=40)
+    assert time.perf_counter() - start < 0.05
+
+
+def test_profiles_are_memoised():
+    model = pv_model.LocalPVModel(dataset=make_clear_sky_dataset(), memory_entries=10)
+    profiles = model.get_hourly_generation_per_kwp_all_orientations(latitude=LATITUDE, longitude=LONGITUDE)
+    key = pv_cache.make_key(latitude=LATITUDE, longitude=LONGITUDE, pitch=SolarConstants.ROOF_PITCH_DEGREES,
+                            aspect=ORIENTATION_OPTIONS['South'].azimuth_degrees)
+    assert model.get_hourly_generation_per_kwp(key=key) is profiles['South']
+    assert not profiles['South'].flags.writeable
+
+    # Least recently used are dropped, so South, which was just used, is kept
+    model.get_hourly_generation_per_kwp_all_orientations(latitude=LATITUDE, longitude=LONGITUDE, pitch=40)
+    assert len(model._profiles) == 10
+    kept = [profile for profile in profiles.values() if any(profile is value for value in model._profiles.values())]
+    assert len(kept) == 2
+    assert any(profile is profiles['South'] for profile in kept)
+
+
+def test_solar_uses_local_model_when_selected(monkeypatch):
+    import src.solar as solar
+    from src.roof import Polygon
+    monkeypatch.setenv("PV_BACKEND", "local")
+    model = solar.pv_model.LocalPVModel(dataset=make_clear_sky_dataset())
+    monkeypatch.setattr(solar.pv_model, '_default_model', model)
+    polygon = Polygon(_points=[[LONGITUDE, LATITUDE], [LONGITUDE + 0.0001, LATITUDE],
+                               [LONGITUDE + 0.0001, LATITUDE + 0.0001], [LONGITUDE, LATITUDE + 0.0001]])
+    solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['South'], polygons=[polygon], pitch=30)
+    profile = model.get_hourly_generation_per_kwp(key=solar_install.pv_cache_key)
+    np.testing.assert_allclose(solar_install.generation.exported.annual_sum_kwh,
+                               profile.sum() * solar_install.peak_capacity_kw_out_per_kw_in_per_m2)
+
+    # Prefetching every orientation is one batch on the prefetch pool, which generation then reuses
+    futures = solar_install.prefetch_generation_for_all_orientations()
+    assert futures['South'].result() is profile
+    solar_install.orientation = ORIENTATION_OPTIONS['East']
+    assert solar_install.get_hourly_generation_per_kwp() is futures['East'].result()
+
+
+def test_local_prefetch_stores_errors_in_futures(monkeypatch):
+    import src.solar as solar
+    monkeypatch.setenv("PV_BACKEND", "local")
+    monkeypatch.setattr(solar.pv_model, '_default_model', pv_model.LocalPVModel())  # loads the dataset when used
+
+    def load_missing_dataset(cls):
+        raise FileNotFoundError("No irradiance dataset")
+    monkeypatch.setattr(pv_model.IrradianceDataset, 'from_profile_store', classmethod(load_missing_dataset))
+    keys = [pv_cache.make_key(latitude=LATITUDE, longitude=LONGITUDE, pitch=30, aspect=aspect) for aspect in (0, 90)]
+    futures = solar.prefetch_hourly_generation_per_kwp_for_keys(keys)  # doesn't raise
+    for future in futures:
+        assert isinstance(future.exception(), FileNotFoundError)
@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pytest
+import requests
+
+from .context import src
+import src.pvgis as pvgis
+import src.pv_cache as pv_cache
+
+KEY = pv_cache.make_key(latitude=52.195, longitude=0.132, pitch=30, aspect=45)
+
+
+def make_pvgis_json(params: dict) -> bytes:
+    """ Same layout as the seriescalc output, with a made up daily cycle in W"""
+    hours = np.arange(8760)
+    power_w = np.clip(np.sin((hours % 24 - 6) / 12 * np.pi), 0, None) * float(params['peakpower'][0]) * 500
+    hourly = [{"time": f"2013{i:04d}", "P": round(p, 2), "G(i)": 0.0, "H_sun": 0.0, "T2m": 10.0, "WS10m": 1.0,
+               "Int": 0.0} for i, p in enumerate(power_w)]
+    return json.dumps({"inputs": {}, "outputs": {"hourly": hourly}, "meta": {}}).encode()
+
+
+@pytest.fixture
+def pvgis_server():
+    """ Local stand in for PVGIS that counts requests and responds slowly enough for them to overlap"""
+    requests_received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            requests_received.append(url)
+            time.sleep(0.2)
+            if url.path != '/seriescalc':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = make_pvgis_json(parse_qs(url.query))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", requests_received
+    server.shutdown()
+    server.server_close()
+
+
+def test_client_parses_pvgis_response(pvgis_server):
+    base_url, requests_received = pvgis_server
+    client = pvgis.PVGISClient(base_url=base_url)
+    profile = client.get_hourly_generation_per_kwp(key=KEY)
+    assert len(profile) == 8760
+    np.testing.assert_almost_equal(profile.max(), 0.5)  # 1 kWp requested, W converted to kW
+    query = parse_qs(requests_received[0].query)
+    assert query['peakpower'] == ['1']
+    assert query['lat'] == ['52.195']
+    assert query['aspect'] == ['45']
+
+
+def test_concurrent_identical_requests_share_one_call(pvgis_server):
+    base_url, requests_received = pvgis_server
+    client = pvgis.PVGISClient(base_url=base_url)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        profiles = list(executor.map(lambda _: client.get_hourly_generation_per_kwp(key=KEY), range(8)))
+    assert len(requests_received) == 1
+    assert client.calls_made == 1
+    assert all(profile is profiles[0] for profile in profiles)
+
+    # once finished, the next request is a new call
+    client.get_hourly_generation_per_kwp(key=KEY)
+    assert len(requests_received) == 2
+
+
+def test_errors_are_passed_to_everyone_waiting(pvgis_server):
+    base_url, requests_received = pvgis_server
+    client = pvgis.PVGISClient(base_url=base_url + '/not_pvgis')
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(client.get_hourly_generation_per_kwp, KEY) for _ in range(4)]
+        for future in futures:
+            with pytest.raises(requests.ConnectionError):
+                future.result()
+    assert len(requests_received) == 1
+
+
+def test_token_bucket_limits_rate():
+    bucket = pvgis.TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start >= 4 / 20 * 0.9
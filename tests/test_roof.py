@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 from .context import src
 from src import roof
 
@@ -35,4 +37,67 @@ def test_make_zero_area_instance():
     no_area = roof.Polygon.make_zero_area_instance()
     assert no_area.area == 0
     assert no_area.average_width == 0
-    assert no_area.average_plan_height == 0
\ No newline at end of file
+    assert no_area.average_plan_height == 0
+
+
+def test_polygon_geometry_batch_matches_one_at_a_time():
+    polygons = [roof.Polygon([(-0.106671, 51.453278), (-0.106848, 51.453054), (-0.106194, 51.452852),
+                              (-0.106014, 51.453074), (-0.106671, 51.453278)]),
+                roof.Polygon([[0.132377, 52.19524], [0.13242, 52.195234], [0.132428, 52.195252],
+                              [0.132384, 52.19526], [0.132377, 52.19524]]),
+                roof.Polygon([[-2.0, 53.0], [-1.9999, 53.0], [-1.99995, 53.0001], [-2.0, 53.0]]),
+                roof.Polygon.make_zero_area_instance()]
+    geometry = roof.calculate_geometry(polygons)
+
+    assert len(geometry) == 4
+    assert list(geometry.number_of_sides) == [4, 4, 3, 4]
+    for i, polygon in enumerate(polygons):
+        assert math.isclose(geometry.areas[i], polygon.area)
+        assert math.isclose(polygon.area, roof.shoelace(polygon.dimensions), abs_tol=1e-9)
+        assert geometry[i].side_lengths.tolist() == polygon.side_lengths
+        assert geometry.centroids[i].tolist() == list(polygon.centroid)
+    assert math.isclose(geometry.average_widths[0], polygons[0].average_width)
+    assert math.isnan(geometry.average_widths[2])  # not four sided
+    assert geometry.average_plan_heights[3] == 0
+
+
+def test_polygon_bearings_and_centroid():
+    # Drawn anticlockwise from the south west corner of a small square
+    square = roof.Polygon([[0, 51], [0.001, 51], [0.001, 51.001], [0, 51.001], [0, 51]])
+    # Side i ends at point i, so side 0 is the one that closes the shape, heading south
+    bearings = [round(bearing) for bearing in square.bearings]
+    assert bearings == [180, 90, 0, 270]
+    lat, lng = square.centroid
+    assert math.isclose(lat, 51.0005)
+    assert math.isclose(lng, 0.0005)
+
+
+def make_rotated_rectangle(ridge_bearing_degrees: float, along_m: float = 10, across_m: float = 5):
+    """ Rectangle with its long sides at the given bearing, near the equator where degrees of lat and lng are about
+    the same length"""
+    along = np.array([np.cos(np.radians(ridge_bearing_degrees)), np.sin(np.radians(ridge_bearing_degrees))])
+    across = np.array([-along[1], along[0]])
+    corners_north_east = [np.zeros(2), along * along_m, along * along_m + across * across_m, across * across_m]
+    points = [[east / 111320, north / 111000] for north, east in corners_north_east]
+    return roof.Polygon(points + [points[0]])
+
+
+def test_azimuth_inferred_from_ridge():
+    # Ridge bearing and azimuth of the side facing closest to south
+    for ridge_bearing, azimuth in [(90, 0), (45, -45), (135, 45), (100, 10), (92, 0), (10, -80)]:
+        polygon = make_rotated_rectangle(ridge_bearing)
+        assert math.isclose(polygon.ridge_bearing, ridge_bearing, abs_tol=0.1)
+        assert polygon.azimuth == azimuth
+
+
+def test_infer_orientation_from_several_polygons():
+    orientation = roof.infer_orientation([make_rotated_rectangle(90), make_rotated_rectangle(100, along_m=4)])
+    assert orientation.azimuth_degrees == 0
+    assert orientation.name == 'South'
+
+    orientation = roof.infer_orientation([make_rotated_rectangle(100)])
+    assert orientation.azimuth_degrees == 10
+    assert orientation.name.startswith('South (10')
+    assert roof.infer_orientation([make_rotated_rectangle(100)]) is orientation  # same object each time
+
+    assert roof.infer_orientation([roof.Polygon.make_zero_area_instance()]) is None
@@ -0,0 +1,129 @@
+import numpy as np
+
+from .context import src
+from src import building_model, solar, constants, roof, retrofit, scenarios
+from src.constants import SolarConstants
+
+
+def set_up_four_houses(heating_name: str):
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    house = building_model.House.set_up_from_heating_name(envelope=envelope, heating_name=heating_name)
+    upgrade_heating = building_model.HeatingSystem.from_constants(name='Heat pump',
+                                                                  parameters=constants.DEFAULT_HEATING_CONSTANTS[
+                                                                      'Heat pump'])
+    test_polygon = roof.Polygon(_points=[[0.132377, 52.19524],
+                                         [0.13242, 52.195234],
+                                         [0.132428, 52.195252],
+                                         [0.132384, 52.19526],
+                                         [0.132377, 52.19524]])
+    solar_install = solar.Solar(orientation=SolarConstants.ORIENTATIONS['South'], polygons=[test_polygon])
+    solar_install.number_of_panels = 12  # big enough to export
+    solar_house, hp_house, both_house = retrofit.upgrade_buildings(baseline_house=house,
+                                                                   solar_install=solar_install,
+                                                                   upgrade_heating=upgrade_heating)
+    return {"Current ": house, "Solar panels ": solar_house, "Heat pump ": hp_house, "Both ": both_house}
+
+
+def test_evaluate_scenarios_matches_house_by_house_evaluation():
+    for heating_name in ['Gas boiler', 'Oil boiler', 'Direct electric']:
+        houses = set_up_four_houses(heating_name=heating_name)
+        results = scenarios.evaluate_scenarios(houses)
+        assert results.names == list(houses.keys())
+
+        for name, house in houses.items():
+            result = results[name]
+            electricity = house.consumption_per_fuel['electricity']
+            np.testing.assert_almost_equal(result.electricity_imported_kwh, electricity.imported.annual_sum_kwh)
+            np.testing.assert_almost_equal(result.electricity_exported_kwh, electricity.exported.annual_sum_kwh)
+            np.testing.assert_almost_equal(result.total_annual_bill, house.total_annual_bill)
+            np.testing.assert_almost_equal(result.total_annual_tco2, house.total_annual_tco2)
+            np.testing.assert_almost_equal(result.percent_self_use_of_solar, house.percent_self_use_of_solar)
+            assert result.upfront_cost == house.upfront_cost
+            assert result.has_multiple_fuels == house.has_multiple_fuels
+            np.testing.assert_array_almost_equal(result.energy_and_bills_df.drop(columns='fuel').to_numpy(),
+                                                 house.energy_and_bills_df.drop(columns='fuel').to_numpy())
+            assert list(result.energy_and_bills_df['fuel']) == list(house.energy_and_bills_df['fuel'])
+
+        np.testing.assert_array_almost_equal(results.total_annual_bill,
+                                             [house.total_annual_bill for house in houses.values()])
+
+
+def test_scenario_results_can_be_used_in_place_of_houses():
+    houses = set_up_four_houses(heating_name='Gas boiler')
+    results = scenarios.evaluate_scenarios(houses)
+
+    from_results = retrofit.Retrofit(baseline_house=results["Current "], upgrade_house=results["Both "])
+    from_houses = retrofit.Retrofit(baseline_house=houses["Current "], upgrade_house=houses["Both "])
+    np.testing.assert_almost_equal(from_results.bill_savings_absolute, from_houses.bill_savings_absolute)
+    np.testing.assert_almost_equal(from_results.carbon_savings_pct, from_houses.carbon_savings_pct)
+    np.testing.assert_almost_equal(from_results.simple_payback, from_houses.simple_payback)
+
+    keys = list(houses.keys())
+    results_df = retrofit.combine_results_dfs_multiple_houses([results[key] for key in keys], keys)
+    houses_df = retrofit.combine_results_dfs_multiple_houses(list(houses.values()), keys)
+    assert results_df.shape == houses_df.shape
+    assert (results_df['fuel'] == houses_df['fuel']).all()
+    assert (results_df['Upgrade option'] == houses_df['Upgrade option']).all()
+
+
+def test_evaluate_scenarios_with_time_of_use_tariffs():
+    houses = set_up_four_houses(heating_name='Gas boiler')
+    overnight = building_model.Tariff.from_price_bands(
+        fuel=constants.ELECTRICITY, p_per_day=45, default_p_per_unit_import=35.0,
+        import_bands=[building_model.time_of_use.PriceBand(start_hour=0, end_hour=4, p_per_unit=9.0)],
+        p_per_unit_export=15.0,
+        export_bands=[building_model.time_of_use.PriceBand(start_hour=16, end_hour=19, p_per_unit=25.0)])
+    houses["Heat pump "].tariffs = {'electricity': overnight}
+    houses["Both "].tariffs = {'electricity': overnight}
+    results = scenarios.evaluate_scenarios(houses)
+    for name, house in houses.items():
+        np.testing.assert_almost_equal(results[name].total_annual_bill, house.total_annual_bill)
+        np.testing.assert_almost_equal(results[name].electricity_bill_exported,
+                                       house.annual_bill_import_and_export_per_fuel['electricity']['exported'])
+
+
+def test_evaluate_scenarios_with_hourly_carbon_intensity(monkeypatch):
+    idx = constants.BASE_YEAR_HOURLY_INDEX
+    intensity = np.where((idx.hour >= 10) & (idx.hour < 16), 100, 300) / 10 ** 6
+    # the electricity fuel the app modules use, rather than the test's own import of constants
+    monkeypatch.setattr(scenarios.constants.ELECTRICITY, '_hourly_tco2_per_kwh', intensity)
+
+    houses = set_up_four_houses(heating_name='Gas boiler')
+    results = scenarios.evaluate_scenarios(houses)
+    for name, house in houses.items():
+        electricity = house.consumption_per_fuel['electricity']
+        np.testing.assert_almost_equal(results[name].electricity_imported_tco2,
+                                       electricity.imported.values @ intensity)
+        np.testing.assert_almost_equal(results[name].electricity_exported_tco2,
+                                       electricity.exported.values @ intensity)
+        np.testing.assert_almost_equal(results[name].total_annual_tco2, house.total_annual_tco2)
+
+
+def test_evaluate_scenarios_with_battery():
+    houses = set_up_four_houses(heating_name='Direct electric')
+    houses = {name + 'with battery': house.with_changes(battery=building_model.Battery(capacity_kwh=5, power_kw=3))
+              for name, house in houses.items()} | houses
+    results = scenarios.evaluate_scenarios(houses)
+    for name, house in houses.items():
+        electricity = house.consumption_per_fuel['electricity']
+        np.testing.assert_almost_equal(results[name].electricity_imported_kwh, electricity.imported.annual_sum_kwh)
+        np.testing.assert_almost_equal(results[name].total_annual_bill, house.total_annual_bill)
+        np.testing.assert_almost_equal(results[name].percent_self_use_of_solar, house.percent_self_use_of_solar)
+        assert results[name].upfront_cost == house.upfront_cost
+    assert results['Both with battery'].total_annual_bill < results['Both '].total_annual_bill
+
+
+def test_lifetime_finances_batched_match_one_at_a_time():
+    houses = set_up_four_houses(heating_name='Gas boiler')
+    results = scenarios.evaluate_scenarios(houses)
+    upgrades = retrofit.generate_all_retrofit_cases(results["Current "], results["Solar panels "],
+                                                    results["Heat pump "], results["Both "])
+    finances = retrofit.calculate_lifetime_finances(list(upgrades))
+
+    for i, upgrade in enumerate(upgrades):
+        one_at_a_time = retrofit.Retrofit(baseline_house=upgrade.baseline_house, upgrade_house=upgrade.upgrade_house,
+                                          solar_bill_savings=upgrade.solar_bill_savings)
+        np.testing.assert_almost_equal(one_at_a_time.npv, finances.npv[i])
+        np.testing.assert_equal(one_at_a_time.discounted_payback, finances.discounted_payback[i])
+        if not np.isnan(upgrade.discounted_payback) and upgrade.incremental_cost > 0:
+            assert upgrade.discounted_payback >= upgrade.simple_payback
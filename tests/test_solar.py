@@ -1,6 +1,7 @@
 import pandas as pd
 import plotly.express as px
 import numpy as np
+import pytest
 
 from .context import src
 import src.solar as solar
@@ -24,6 +25,14 @@ TEST_POLYGONS = [Polygon(_points=[[0.132377, 52.19524],
                                   [0.132306, 52.195271]])]
 
 
+@pytest.fixture
+def pv_profile_cache(tmp_path, monkeypatch) -> solar.pv_cache.PVProfileCache:
+    """ Empty cache used as the default for the test only, so hits and misses don't depend on other tests"""
+    cache = solar.pv_cache.PVProfileCache(path=tmp_path / 'pv_profiles.sqlite')
+    monkeypatch.setattr(solar.pv_cache, '_default_cache', cache)
+    return cache
+
+
 def test_roof_area_returns_expected_type_and_value_one_polygon():
     pitch = 45
     solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['South'],
@@ -130,43 +139,101 @@ def test_solar_install_polygon_does_not_have_4_vertices():
     assert solar_install.number_of_panels == solar_install.get_number_of_panels_from_polygon_area(test_polygon)
 
 
-def test_cache_on_get_hourly_radiation_from_eu_api():
+def test_cache_on_get_hourly_radiation_from_eu_api(pv_profile_cache, tmp_path, monkeypatch):
     solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['Southwest'],
                                 polygons=TEST_POLYGONS,
                                 pitch=30)
 
     # check works when getting property
-    solar.Solar.get_hourly_radiation_from_eu_api.cache_clear()
+    cache = pv_profile_cache
     solar_install.generation.overall.annual_sum_kwh
     solar_install.generation.imported.annual_sum_kwh
     solar_install.generation.exported.days_in_year
     solar_install.generation.fuel.name
-    print(solar.Solar.get_hourly_radiation_from_eu_api.cache_info())
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().hits == 3
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().misses == 1
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().currsize == 1
+    print(cache.cache_info())
+    assert cache.cache_info().hits == 3
+    assert cache.cache_info().misses == 1
+    assert cache.cache_info().entries == 1
 
     # check also works on copy - should hit
     solar_install_two = solar_install
     solar_install_two.generation.overall.annual_sum_kwh
     assert hash(solar_install) == hash(solar_install_two)
-    print(solar.Solar.get_hourly_radiation_from_eu_api.cache_info())
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().hits == 4
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().misses == 1
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().currsize == 1
+    print(cache.cache_info())
+    assert cache.cache_info().hits == 4
+    assert cache.cache_info().misses == 1
+    assert cache.cache_info().entries == 1
 
-    # Change number of panels - should miss
+    # Change number of panels - should hit as profiles are stored per kWp
+    generation_kwh_per_panel = solar_install_two.generation.overall.annual_sum_kwh / solar_install_two.number_of_panels
     solar_install_two.number_of_panels = 1
-    solar_install_two.generation.overall.annual_sum_kwh
-    print(solar.Solar.get_hourly_radiation_from_eu_api.cache_info())
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().hits == 4
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().misses == 2
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().currsize == 2
+    np.testing.assert_almost_equal(solar_install_two.generation.overall.annual_sum_kwh, generation_kwh_per_panel)
+    print(cache.cache_info())
+    assert cache.cache_info().hits == 6
+    assert cache.cache_info().misses == 1
+    assert cache.cache_info().entries == 1
 
     # Change orientation - should miss
     solar_install.orientation = ORIENTATION_OPTIONS['South']
     solar_install.generation.overall.annual_sum_kwh
-    print(solar.Solar.get_hourly_radiation_from_eu_api.cache_info())
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().hits == 4
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().misses == 3
-    assert solar.Solar.get_hourly_radiation_from_eu_api.cache_info().currsize == 3
+    print(cache.cache_info())
+    assert cache.cache_info().hits == 6
+    assert cache.cache_info().misses == 2
+    assert cache.cache_info().entries == 2
+
+    # Profiles persist between processes
+    monkeypatch.setattr(solar.pv_cache, '_default_cache',
+                        solar.pv_cache.PVProfileCache(path=tmp_path / 'pv_profiles.sqlite'))
+    solar_install.generation.overall.annual_sum_kwh
+    assert solar.pv_cache.get_default_cache().cache_info().hits == 1
+    assert solar.pv_cache.get_default_cache().cache_info().misses == 0
+
+
+def test_prefetch_generation_for_all_orientations(pv_profile_cache):
+    cache = pv_profile_cache
+    solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['Southwest'],
+                                polygons=TEST_POLYGONS,
+                                pitch=30)
+
+    futures = solar_install.prefetch_generation_for_all_orientations()
+    assert list(futures.keys()) == list(ORIENTATION_OPTIONS.keys())
+    # asking again while running reuses the same fetches
+    prefetch_again = solar_install.prefetch_generation_for_all_orientations()['South']
+    assert prefetch_again is futures['South'] or futures['South'].done()
+    for future in futures.values():
+        assert len(future.result()) == 8760
+    assert cache.cache_info().entries == len(ORIENTATION_OPTIONS)
+
+    # results come from the prefetch, with no further fetches
+    misses = cache.cache_info().misses
+    for orientation in ORIENTATION_OPTIONS.values():
+        solar_install.orientation = orientation
+        assert solar_install.generation.overall.annual_sum_kwh < 0
+    assert cache.cache_info().misses == misses
+
+
+def test_generation_of_roof_with_several_planes_is_weighted_sum_of_planes(pv_profile_cache):
+    east, west = [Polygon(_points=polygon._points, orientation=ORIENTATION_OPTIONS[name], pitch=pitch)
+                  for polygon, name, pitch in [(TEST_POLYGONS[0], 'East', 35), (TEST_POLYGONS[2], 'West', 20)]]
+    split_roof = solar.Solar(orientation=ORIENTATION_OPTIONS['South'], polygons=[east, west])
+
+    assert split_roof.has_multiple_planes
+    shares = split_roof.pv_cache_keys_and_shares
+    assert len(shares) == 2
+    np.testing.assert_almost_equal(sum(shares.values()), 1)
+
+    planes = [solar.Solar(orientation=polygon.orientation, polygons=[polygon], pitch=polygon.pitch)
+              for polygon in [east, west]]
+    panels = [plane.number_of_panels for plane in planes]
+    assert split_roof.number_of_panels == sum(panels)
+    expected = sum(number / sum(panels) * solar.get_hourly_generation_per_kwp(
+        solar.pv_cache.make_key(latitude=split_roof.latitude, longitude=split_roof.longitude, pitch=polygon.pitch,
+                                aspect=polygon.orientation.azimuth_degrees))
+                   for number, polygon in zip(panels, [east, west]))
+    np.testing.assert_array_almost_equal(split_roof.get_hourly_generation_per_kwp(), expected)
+
+
+def test_polygons_without_their_own_orientation_share_the_install_profile():
+    solar_install = solar.Solar(orientation=ORIENTATION_OPTIONS['Southwest'], polygons=TEST_POLYGONS, pitch=30)
+    assert not solar_install.has_multiple_planes
+    assert solar_install.pv_cache_keys_and_shares == {solar_install.pv_cache_key: 1.0}
@@ -0,0 +1,56 @@
+import numpy as np
+
+from .context import src
+from src import building_model, constants, tariff_catalogue
+
+
+def make_house(heating_name: str) -> building_model.House:
+    envelope = building_model.BuildingEnvelope.from_building_type_constants(constants.BUILDING_TYPE_OPTIONS['Terrace'])
+    return building_model.House.set_up_from_heating_name(envelope=envelope, heating_name=heating_name)
+
+
+def test_catalogue_bills_match_house_on_each_tariff():
+    catalogue = tariff_catalogue.TariffCatalogue.from_file()
+    house = make_house('Gas boiler')
+    bills = catalogue.calculate_annual_bills(house)
+    assert set(bills.keys()) == {'electricity', 'gas'}
+    assert len(bills['electricity']) == 6
+
+    for fuel_name, fuel_bills in bills.items():
+        for entry_name, bill in fuel_bills.items():
+            tariff = catalogue.entry(entry_name).to_tariff()
+            expected = tariff.calculate_annual_net_cost(house.consumption_per_fuel[fuel_name])
+            np.testing.assert_almost_equal(bill, expected)
+
+
+def test_rank_finds_cheapest_tariff_per_scenario():
+    catalogue = tariff_catalogue.TariffCatalogue.from_file()
+    gas_house = make_house('Gas boiler')
+    heat_pump = building_model.HeatingSystem.from_constants(name='Heat pump',
+                                                            parameters=constants.DEFAULT_HEATING_CONSTANTS['Heat pump'])
+    houses = {'Current': gas_house, 'Heat pump': gas_house.with_changes(heating_system=heat_pump)}
+    ranked = catalogue.rank(houses)
+    assert list(ranked.columns) == ['scenario', 'fuel', 'tariff', 'annual_bill', 'rank']
+    heat_pump_bills = ranked[ranked['scenario'] == 'Heat pump']
+    assert set(heat_pump_bills['fuel']) == {'electricity'}
+    assert heat_pump_bills['annual_bill'].is_monotonic_increasing
+
+    best = catalogue.best_tariffs(houses)
+    assert len(best) == 3  # current electricity and gas, heat pump electricity
+    for _, row in best.iterrows():
+        house_bills = catalogue.calculate_annual_bills(houses[row['scenario']])[row['fuel']]
+        assert row['annual_bill'] == house_bills.min()
+
+
+def test_csv_catalogue_with_bands(tmp_path):
+    path = tmp_path / 'catalogue.csv'
+    path.write_text("name,fuel,p_per_day,p_per_unit_import,p_per_unit_export,import_bands\n"
+                    "Flat,electricity,50,30,,\n"
+                    "Two rate,electricity,50,30,5,0-7:10;22-24:20\n")
+    catalogue = tariff_catalogue.TariffCatalogue.from_file(path)
+    two_rate = catalogue.entry('Two rate')
+    assert two_rate.import_bands == [tariff_catalogue.PriceBand(0, 7, 10.0), tariff_catalogue.PriceBand(22, 24, 20.0)]
+    prices = catalogue.compiled['electricity'].prices
+    assert prices.shape == (2, 2 * 8760)
+    np.testing.assert_array_equal(prices[1, :24], [10] * 7 + [30] * 15 + [20] * 2)
+    np.testing.assert_array_equal(prices[0, 8760:], 0)